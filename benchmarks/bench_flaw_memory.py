@@ -0,0 +1,58 @@
+# Purpose:  Benchmark for the compact flaw results
+#
+# Notes:    Parses a synthetic detailed report (see bench_report_parser.py) and reports the bytes per flaw held
+#           by the parsed results, and the time to write them as JSON, for the compact results (Flaw records,
+#           shared strings, IssueIds arrays) and for the same results as plain dicts and lists of strings (what
+#           the parser produced before).
+#
+#           python benchmarks/bench_flaw_memory.py [flaws]
+
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.report_parser import parse_detailed_report
+from helpers.report_parser import to_json
+from bench_report_parser import write_report
+
+
+def retained(func):
+    """Returns (result, bytes still allocated by func once it has returned)."""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def serialize(results):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as f:
+        json.dump(results, f, indent=4, sort_keys=True, default=to_json)
+    return time.perf_counter() - start
+
+
+def main():
+    flaws = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    report = io.BytesIO()
+    written = write_report(report, flaws)
+    report = report.getvalue()
+
+    compact, compact_size = retained(lambda: parse_detailed_report(report))
+    """ json.loads makes a separate string object for every value, like the old dict per flaw """
+    text = json.dumps(compact, default=to_json)
+    plain, plain_size = retained(lambda: json.loads(text))
+    del text
+
+    print("{:10} : {} flaws".format("report", written))
+    for name, results, size in (("dicts", plain, plain_size), ("compact", compact, compact_size)):
+        print("{:10} : {:.0f} bytes per flaw, json.dump in {:.2f}s".format(name, size / written, serialize(results)))
+
+
+if __name__ == "__main__":
+    main()
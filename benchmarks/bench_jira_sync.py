@@ -0,0 +1,133 @@
+# Purpose:  Benchmark for the JIRA synchronisation
+#
+# Notes:    Syncs the flaws of a synthetic scan (4,000 by default) to the stub JIRA server (tests/jira_stub.py) three
+#           times: a first sync that creates a ticket for every flaw, then, after a quarter of the flaws have been
+#           fixed, a second sync that updates or closes every ticket, and a third sync with nothing changed. Each
+#           sync is run the way the legacy SynchroniseJIRA handler made its calls (one at a time: a create per
+#           ticket, a get before each update and a get plus a transitions lookup before each close) and with
+#           helpers.jira_sync.JiraSync and a SyncLedger. Both honour Retry-After. Reports the time and number of
+#           JIRA calls of each.
+#
+#           python benchmarks/bench_jira_sync.py [flaws] [--latency 0.01] [--throttle-every 500] [--no-baseline]
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+from helpers.jira_sync import JiraClient
+from helpers.jira_sync import JiraSync
+from helpers.report_parser import parse_detailed_report
+from helpers.sync_ledger import SyncLedger
+from helpers.tickets import TicketPlanner
+from bench_report_parser import write_report
+from jira_stub import start_stub
+
+PROJECT = "VC"
+APP_ID = "1"
+
+
+class LegacyClient:
+    """ the calls of the legacy handler, made one after another on one session """
+    def __init__(self, base_url):
+        self.base_url = base_url + "rest/api/2/"
+        self.session = requests.Session()
+        self.session.auth = ("user", "token")
+
+    def call(self, method, path, body=None):
+        while True:
+            r = self.session.request(method, self.base_url + path, json=body)
+            if r.status_code == 429:
+                time.sleep(float(r.headers.get("Retry-After", 1)))
+                continue
+            r.raise_for_status()
+            return r.json() if len(r.content) > 0 else None
+
+    def sync(self, jira, actions):
+        keys = {}
+        for action in actions:
+            if action["type"] == "create":
+                issue = self.call("POST", "issue", {"fields": jira.create_fields(action)})
+                keys[action["issueid"]] = issue["key"]
+            elif action["type"] == "update":
+                self.call("GET", f'issue/{action["issue_key"]}')
+                self.call("PUT", f'issue/{action["issue_key"]}', {"fields": {"summary": jira.summary(action),
+                                                                             "description": jira.description(action)}})
+            elif action["type"] == "close":
+                self.call("GET", f'issue/{action["issue_key"]}')
+                transitions = self.call("GET", f'issue/{action["issue_key"]}/transitions')["transitions"]
+                done = next(t["id"] for t in transitions if t["name"] == "Done")
+                self.call("POST", f'issue/{action["issue_key"]}/transitions', {"transition": {"id": done}})
+        return keys
+
+
+def fix_quarter(results):
+    for i, flaw in enumerate(results["flaws"].values()):
+        if i % 4 == 0:
+            flaw.remediation_status = "Fixed"
+
+
+def run(name, flaws, args, engine):
+    """ the three syncs against a fresh stub server """
+    server, base_url = start_stub(latency=args.latency, throttle_every=args.throttle_every)
+    report = io.BytesIO()
+    write_report(report, flaws)
+    results = parse_detailed_report(report.getvalue())
+    planner = TicketPlanner()
+    try:
+        for sync in ("first", "second", "third"):
+            if sync == "second":
+                fix_quarter(results)
+            before = server.state.requests
+            start = time.perf_counter()
+            counts = engine(base_url, results, planner)
+            elapsed = time.perf_counter() - start
+            print("{:10} : {} sync {:.2f}s, {} JIRA calls ({} throttled so far) {}".format(
+                name, sync, elapsed, server.state.requests - before, server.state.throttled, counts))
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("flaws", type=int, nargs="?", default=4000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--throttle-every", dest="throttle_every", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-baseline", dest="no_baseline", action="store_true")
+    args = parser.parse_args()
+    print("{:10} : {} flaws, {}s latency per call".format("stub", args.flaws, args.latency))
+
+    def legacy(base_url, results, planner):
+        jira = JiraSync(None, PROJECT, APP_ID)
+        legacy.keys = getattr(legacy, "keys", {})
+        actions = planner.plan(results, legacy.keys)
+        legacy.keys.update(LegacyClient(base_url).sync(jira, actions))
+        return {"actions": len(actions)}
+
+    ledger_dir = tempfile.TemporaryDirectory()
+
+    def engine(base_url, results, planner):
+        ledger = SyncLedger(os.path.join(ledger_dir.name, "sync-ledger.db"))
+        jira = JiraSync(JiraClient(base_url, "user", "token", workers=args.workers), PROJECT, APP_ID,
+                        workers=args.workers, ledger=ledger)
+        actions = planner.plan(results, jira.prefetch())
+        summary = jira.sync(actions)
+        ledger.close()
+        return {"created": len(summary["created"]), "updated": summary["updated"], "closed": summary["closed"],
+                "unchanged": summary["unchanged"], "errors": len(summary["errors"])}
+
+    if not args.no_baseline:
+        run("legacy", args.flaws, args, legacy)
+    run("jira_sync", args.flaws, args, engine)
+    ledger_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Purpose:  Benchmark for the throttled progress output
+#
+# Notes:    Parses a synthetic detailed report (50k flaws by default, see bench_report_parser.py) three times:
+#           printing a line for every flaw (as static results used to), reporting through a Progress, and with
+#           no output at all. The console output goes to a temporary file, like a CI log, or to this terminal
+#           with --tty. Reports the parse time of each.
+#
+#           python benchmarks/bench_progress.py [flaws] [--tty]
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.output import Out
+from helpers.report_parser import parse_detailed_report
+from bench_report_parser import write_report
+
+
+def per_flaw(report, stream):
+    def parsed(issue_id, flaw):
+        print(f'{"info":10} : parsing flaw {issue_id}', file=stream)
+    parse_detailed_report(report, on_flaw=parsed)
+
+
+def progress(report, stream):
+    with Out(stream=stream).progress("parsing", unit="flaws") as flaws:
+        parse_detailed_report(report, on_flaw=lambda issue_id, flaw: flaws.update())
+
+
+def silent(report, stream):
+    parse_detailed_report(report)
+
+
+def main():
+    flaws = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 50000
+    report = io.BytesIO()
+    written = write_report(report, flaws)
+    report = report.getvalue()
+    timings = []
+    with tempfile.TemporaryFile("w") as log:
+        stream = sys.stdout if "--tty" in sys.argv else log
+        for name, func in (("per flaw", per_flaw), ("progress", progress), ("silent", silent)):
+            start = time.perf_counter()
+            func(report, stream)
+            timings.append((name, time.perf_counter() - start))
+    print("{:10} : {} flaws".format("report", written))
+    for name, elapsed in timings:
+        print("{:10} : {:.2f}s".format(name, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Purpose:  Benchmark for the streaming detailed report parser
+#
+# Notes:    Writes a synthetic detailedreport.do payload with 100k flaws (by default) to a temporary file and
+#           compares converting it with xmltodict (what static results used to do before walking the dict tree)
+#           against helpers.report_parser.parse_detailed_report() reading from the file. Reports the time taken
+#           and the peak memory allocated (tracemalloc) for each.
+#
+#           python benchmarks/bench_report_parser.py [flaws] [--no-baseline]
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.report_parser import parse_detailed_report
+
+SEVERITIES = 6
+CATEGORIES = 4
+CWES = 5
+
+
+def write_report(f, flaws):
+    """Writes a report with the flaws spread over every severity, category and cwe."""
+    f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+            b'<detailedreport xmlns="https://www.veracode.com/schema/reports/export/1.0" report_format_version="1.5" '
+            b'app_name="benchmark" app_id="1" sandbox_id="2" policy_name="Veracode Recommended High" '
+            b'version="build 1" policy_compliance_status="Did Not Pass">\n')
+    per_cwe = max(1, flaws // (SEVERITIES * CATEGORIES * CWES))
+    issue_id = 0
+    for level in range(SEVERITIES - 1, -1, -1):
+        f.write(b'<severity level="%d">\n' % level)
+        for category in range(CATEGORIES):
+            f.write(b'<category categoryid="%d" categoryname="Category %d" pcirelated="true">\n'
+                    b'<desc><para text="Description of category %d."/></desc>\n'
+                    b'<recommendations><para text="Fix it."><bulletitem text="Really."/></para></recommendations>\n'
+                    % (category, category, category))
+            for cwe in range(CWES):
+                cwe_id = category * CWES + cwe
+                f.write(b'<cwe cweid="%d" cwename="CWE %d" pcirelated="true" owasp="1027" sans="800">\n'
+                        b'<description><text text="Description of CWE %d."/></description>\n<staticflaws>\n'
+                        % (cwe_id, cwe_id, cwe_id))
+                for i in range(per_cwe):
+                    issue_id += 1
+                    f.write(b'<flaw severity="%d" categoryname="Category %d" count="1" issueid="%d" module="app.jar" '
+                            b'type="java.sql.Statement.executeQuery" description="This call contains a SQL injection '
+                            b'flaw. The argument to the function is constructed using untrusted input." note="" '
+                            b'cweid="%d" remediationeffort="3" exploitLevel="0" categoryid="%d" pcirelated="true" '
+                            b'date_first_occurrence="2020-01-01 00:00:00 UTC" remediation_status="New" '
+                            b'cia_impact="ppp" grace_period_expires="2020-02-01 00:00:00 UTC" '
+                            b'affects_policy_compliance="true" mitigation_status="none" mitigation_status_desc="Not '
+                            b'Mitigated" sourcefile="Dao%d.java" sourcefilepath="com/example/dao/" scope="Dao" '
+                            b'functionprototype="void find(java.lang.String)" functionrelativelocation="42" line="%d">'
+                            b'<annotations><annotation action="comment" description="Seen" user="a" '
+                            b'date="2020-01-02 00:00:00 UTC"/></annotations></flaw>\n'
+                            % (level, category, issue_id, cwe_id, category, i % 500, i % 1000))
+                f.write(b'</staticflaws>\n</cwe>\n')
+            f.write(b'</category>\n')
+        f.write(b'</severity>\n')
+    f.write(b'</detailedreport>\n')
+    return issue_id
+
+
+def measure(func):
+    """ time and memory are measured in separate runs, tracemalloc slows down every allocation """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    flaws = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 100000
+    with tempfile.NamedTemporaryFile(suffix=".xml") as f:
+        written = write_report(f, flaws)
+        f.flush()
+        size = f.tell()
+        print("{:10} : {} flaws, {:.1f} MB".format("report", written, size / (1024 * 1024)))
+
+        def streaming():
+            with open(f.name, "rb") as report:
+                return parse_detailed_report(report)
+
+        def baseline():
+            import xmltodict
+            with open(f.name, "rb") as report:
+                return xmltodict.parse(report.read())["detailedreport"]
+
+        runs = [("streaming", streaming)]
+        if "--no-baseline" not in sys.argv:
+            runs.append(("xmltodict", baseline))
+        for name, func in runs:
+            result, elapsed, peak = measure(func)
+            print("{:10} : {:.2f}s, peak {:.1f} MB".format(name, elapsed, peak / (1024 * 1024)))
+            if name == "streaming":
+                assert len(result["flaws"]) == written
+
+
+if __name__ == "__main__":
+    main()
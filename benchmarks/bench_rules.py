@@ -0,0 +1,47 @@
+# Purpose:  Benchmark for the static decision rules
+#
+# Notes:    Evaluates a set of decision rules over the flaws of a synthetic detailed report (100k flaws by
+#           default, see bench_report_parser.py), both as the parser's Flaw records and as the plain dicts of
+#           a JSON context, and reports the time per evaluation.
+#
+#           python benchmarks/bench_rules.py [flaws]
+
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.report_parser import parse_detailed_report
+from helpers.report_parser import to_json
+from helpers.rules import compile_rules
+from bench_report_parser import write_report
+
+STATIC_CONFIG = {"decide_max_severity": {"5": 0, "4": 10},
+                 "decide_banned_cwes": [89, 78, 3],
+                 "decide_grace_period_expired": True,
+                 "decide_policy_affecting_only": True}
+RUNS = 10
+
+
+def main():
+    flaws = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    report = io.BytesIO()
+    written = write_report(report, flaws)
+    records = parse_detailed_report(report.getvalue())["flaws"]
+    dicts = json.loads(json.dumps(records, default=to_json))
+    rules = compile_rules(STATIC_CONFIG)
+    print("{:10} : {} flaws".format("report", written))
+    for name, flaw_set in (("records", records), ("dicts", dicts)):
+        start = time.perf_counter()
+        for run in range(RUNS):
+            decision = rules.evaluate(flaw_set)
+        elapsed = (time.perf_counter() - start) / RUNS
+        print("{:10} : {:.1f}ms per evaluation ({}, {} violations)".format(name, elapsed * 1000, decision["decision"],
+                                                                          len(decision["violations"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Purpose:  Benchmark for the start up time of veracode-cli
+#
+# Notes:    Runs veracode-cli.py --help, static --help and readme in a new interpreter (5 times each by default)
+#           and, for comparison, an interpreter that imports everything the CLI used to import before parsing the
+#           command line (every helper and service module, GitPython, etc.). Reports the median wall time of each
+#           against the 150ms target for --help, then the slowest imports of --help from python -X importtime.
+#
+#           python benchmarks/bench_startup.py [runs] [--top 10]
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+VERACODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode")
+CLI = os.path.join(VERACODE, "veracode-cli.py")
+""" where the commands are run, as veracode-cli writes veracode-cli.output into the current directory """
+WORKDIR = tempfile.mkdtemp()
+TARGET = 0.150
+
+EAGER = """
+import os, sys, importlib
+sys.path.insert(0, {veracode!r})
+from git import Repo
+for package in ("helpers", "services"):
+    for module in sorted(os.listdir(os.path.join({veracode!r}, package))):
+        if module != "__init__.py" and module.endswith(".py"):
+            importlib.import_module(package + "." + module[:-3])
+""".format(veracode=VERACODE)
+
+
+def run(command, runs):
+    """ the median wall time of the command """
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=WORKDIR)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def importtime(top):
+    """ the imports of --help with the longest cumulative time, in seconds """
+    result = subprocess.run([sys.executable, "-X", "importtime", CLI, "--help"], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, cwd=WORKDIR, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            fields = line[len("import time:"):].split("|")
+            if fields[1].strip().isdigit():
+                imports.append((int(fields[1]) / 1e6, fields[2].rstrip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", type=int, nargs="?", default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    """ veracode-cli.py has a SyntaxWarning that would otherwise be printed on every run """
+    os.environ["PYTHONWARNINGS"] = "ignore"
+
+    """ warm up: the file system cache, the .pyc files and the services manifest """
+    run([sys.executable, CLI, "--help"], 1)
+    baseline = run([sys.executable, "-c", "pass"], args.runs)
+    print("{:10} : {:.3f}s".format("python", baseline))
+    for name, command in (("--help", [sys.executable, CLI, "--help"]),
+                          ("static -h", [sys.executable, CLI, "static", "--help"]),
+                          ("readme", [sys.executable, CLI, "readme"]),
+                          ("eager", [sys.executable, "-c", EAGER])):
+        elapsed = run(command, args.runs)
+        target = " (target {:.3f}s: {})".format(TARGET, "met" if elapsed < TARGET else "missed") \
+            if name == "--help" else ""
+        print("{:10} : {:.3f}s{}".format(name, elapsed, target))
+    print()
+    for seconds, module in importtime(args.top):
+        print("{:10} : {:.3f}s {}".format("import", seconds, module))
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Purpose:  Benchmark for the ticket action planner
+#
+# Notes:    Writes a synthetic detailed report with 50k flaws (by default), a third of them with a "JIRA Issue Key"
+#           comment and some of those fixed, then plans the ticket actions two ways: the legacy
+#           BaseSynchroniser.get_flaw_actions() approach (lxml, with an XPath query built and run for every flaw to
+#           find its issue key comment) and helpers.tickets.TicketPlanner over the parsed results. Reports the time
+#           taken by each, in total and without parsing the report, and the action counts.
+#
+#           python benchmarks/bench_tickets.py [flaws] [--no-baseline]
+
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.report_parser import parse_detailed_report
+from helpers.tickets import TicketPlanner
+from bench_report_parser import write_report
+
+TICKET_TYPE = "JIRA"
+
+
+def with_tickets(report):
+    """ every third flaw has a ticket, and every other one of those has been fixed """
+    def flaw(match):
+        issue_id = int(match.group(1))
+        xml = match.group(0)
+        if issue_id % 3 == 0:
+            xml = xml.replace(b'<annotations>', b'<annotations><annotation action="comment" description="'
+                              b'JIRA Issue Key: VC-%d" user="a" date="2020-01-03 00:00:00 UTC"/>' % issue_id)
+            if issue_id % 6 == 0:
+                xml = xml.replace(b'remediation_status="New"', b'remediation_status="Fixed"')
+        return xml
+    return re.sub(rb'<flaw [^>]*issueid="(\d+)".*?</flaw>', flaw, report)
+
+
+def legacy(report):
+    """ BaseSynchroniser.get_flaw_actions() without the API call """
+    from lxml import etree
+    ns = {'vc': 'https://www.veracode.com/schema/reports/export/1.0'}
+    root = etree.fromstring(report)
+    parsed = time.perf_counter()
+    actions = []
+    for category_node in root.xpath("./vc:severity/vc:category[vc:cwe/vc:staticflaws/vc:flaw]", namespaces=ns):
+        for flaw_node in category_node.xpath("./vc:cwe/vc:staticflaws/vc:flaw", namespaces=ns):
+            remediation_status = flaw_node.attrib.get("remediation_status")
+            mitigation_status = flaw_node.attrib.get("mitigation_status")
+            query = "./vc:annotations/vc:annotation[starts-with(@description, '" + TICKET_TYPE + " Issue Key: ')]"
+            issue_key_nodes = flaw_node.xpath(query, namespaces=ns)
+            issue_key = None
+            if len(issue_key_nodes) > 0:
+                issue_key = str(issue_key_nodes[0].attrib.get("description")).split(TICKET_TYPE + " Issue Key: ", 1)[1]
+            action = {"issueid": flaw_node.attrib.get("issueid"), "issue_key": issue_key}
+            if issue_key is not None:
+                action["type"] = "close" if remediation_status == "Fixed" or mitigation_status == "accepted" else \
+                    "update"
+            elif remediation_status != "Fixed" and mitigation_status != "accepted":
+                action["type"] = "create"
+            actions.append(action)
+    return actions, parsed
+
+
+def counts(actions):
+    result = {}
+    for action in actions:
+        result[action.get("type")] = result.get(action.get("type"), 0) + 1
+    return result
+
+
+def main():
+    flaws = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 50000
+    report = io.BytesIO()
+    written = write_report(report, flaws)
+    report = with_tickets(report.getvalue())
+    print("{:10} : {} flaws".format("report", written))
+    planner = TicketPlanner(TICKET_TYPE)
+
+    if "--no-baseline" not in sys.argv:
+        start = time.perf_counter()
+        actions, parsed = legacy(report)
+        end = time.perf_counter()
+        print("{:10} : {:.2f}s (queries {:.3f}s) {}".format("xpath", end - start, end - parsed, counts(actions)))
+
+    start = time.perf_counter()
+    results = parse_detailed_report(report)
+    parsed = time.perf_counter()
+    actions = planner.plan(results)
+    end = time.perf_counter()
+    print("{:10} : {:.2f}s (plan {:.3f}s) {}".format("planner", end - start, end - parsed, counts(actions)))
+
+
+if __name__ == "__main__":
+    main()
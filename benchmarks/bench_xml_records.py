@@ -0,0 +1,69 @@
+# Purpose:  Benchmark for the typed XML response records
+#
+# Notes:    Builds a synthetic getbuildlist.do response of about 10 MB and compares extracting the build_ids
+#           with the old regex over str(bytes) against helpers.records.iter_records(), reporting the time taken
+#           and the peak memory allocated (tracemalloc) for each.
+#
+#           python benchmarks/bench_xml_records.py [size_mb]
+
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.records import iter_records
+
+
+def build_list_xml(size_mb):
+    header = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<buildlist xmlns="https://analysiscenter.veracode.com/schema/2.0/buildlist" buildlist_version="1.3" '
+              'account_id="12345" app_id="67890" app_name="benchmark">\n')
+    rows = []
+    size = len(header)
+    i = 0
+    while size < size_mb * 1024 * 1024:
+        row = ('   <build build_id="{0}" version="{1} build {0} (Jenkins #{0})" policy_updated_date="'
+               '2020-01-01T00:00:00-05:00"/>\n').format(1000000 + i, "2020-01-01 00:00:00")
+        rows.append(row)
+        size += len(row)
+        i += 1
+    return (header + "".join(rows) + "</buildlist>\n").encode("utf-8")
+
+
+def regex_build_ids(xml):
+    return [str(build_id) for build_id in re.findall('build_id="(.*?)"', str(xml))]
+
+
+def records_build_ids(xml):
+    return [build.build_id for build in iter_records(xml, "build")]
+
+
+def measure(func, xml):
+    """ time and memory are measured in separate runs, tracemalloc slows down every allocation """
+    start = time.perf_counter()
+    result = func(xml)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(xml)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    xml = build_list_xml(size_mb)
+    print("{:10} : {:.1f} MB".format("response", len(xml) / (1024 * 1024)))
+    results = {}
+    for name, func in (("regex", regex_build_ids), ("records", records_build_ids)):
+        results[name], elapsed, peak = measure(func, xml)
+        print("{:10} : {} builds in {:.3f}s, peak {:.1f} MB".format(name, len(results[name]), elapsed,
+                                                                    peak / (1024 * 1024)))
+    assert results["regex"] == results["records"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Purpose:  pytest configuration
+#
+# Notes:    The CLI imports its modules from veracode/ (helpers.x, services.x), so that is put on the path the same
+#           way the benchmarks do it. The fixtures build the flaws and results the ticketing tests plan from: as
+#           the dicts of a JSON context (flaw, results) or parsed from a detailed report (report).
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "veracode"))
+
+from helpers.report_parser import parse_detailed_report
+from helpers.tickets import issue_key_comment
+
+CATEGORIES = {"1": {"name": "SQL Injection"}}
+CWES = {"89": {"name": "CWE 89"}}
+
+
+def new_flaw(remediation_status="New", mitigation_status="none", affects_policy_compliance="true", comments=(),
+             issue_key=None, description="SQL injection"):
+    """Returns a flaw as the dict of a JSON context. comments are newest first, an issue_key adds the newest."""
+    if issue_key is not None:
+        comments = [issue_key_comment("JIRA", issue_key)] + list(comments)
+    return {"affects_policy_compliance": affects_policy_compliance, "remediation_status": remediation_status,
+            "mitigation_status": mitigation_status, "category_id": "1", "cwe_id": "89", "severity": "4",
+            "type": "java.sql.Statement.executeQuery", "description": description, "module": "app.jar",
+            "scope": "Dao", "sourcefile": "Dao.java", "sourcefile_path": "com/example/",
+            "comments": [{"description": description} for description in comments]}
+
+
+def new_results(flaws):
+    """Returns the results of a dict of issue_id to flaw (from new_flaw())."""
+    return {"flaws": flaws, "categories": CATEGORIES, "cwes": CWES}
+
+
+def parse_report(*flaws):
+    """Returns the parsed detailed report with a flaw for each (issue_id, remediation_status, mitigation_status,
+    affects_policy_compliance, comments), comments oldest first as in the report."""
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<detailedreport xmlns="https://www.veracode.com/schema/reports/export/1.0" app_id="1" sandbox_id="2">\n'
+           '<severity level="4"><category categoryid="1" categoryname="SQL Injection" pcirelated="true">\n'
+           '<cwe cweid="89" cwename="CWE 89" pcirelated="true"><staticflaws>\n')
+    for issue_id, remediation, mitigation, affects_policy, comments in flaws:
+        annotations = "".join(f'<annotation action="comment" description="{description}" user="a" date="d"/>'
+                              for description in comments)
+        xml += (f'<flaw severity="4" categoryname="SQL Injection" issueid="{issue_id}" module="app.jar" '
+                f'type="java.sql.Statement.executeQuery" description="SQL injection" cweid="89" categoryid="1" '
+                f'remediation_status="{remediation}" mitigation_status="{mitigation}" '
+                f'affects_policy_compliance="{affects_policy}" sourcefile="Dao.java" '
+                f'sourcefilepath="com/example/" scope="Dao"><annotations>{annotations}</annotations></flaw>\n')
+    xml += '</staticflaws></cwe></category></severity></detailedreport>\n'
+    return parse_detailed_report(xml.encode("utf-8"))
+
+
+@pytest.fixture
+def flaw():
+    return new_flaw
+
+
+@pytest.fixture
+def results():
+    return new_results
+
+
+@pytest.fixture
+def report():
+    return parse_report
@@ -0,0 +1,200 @@
+# Purpose:  Stub JIRA server
+#
+# Notes:    An in-memory JIRA REST API (v2) with just the calls the JIRA synchronisation makes (and the ones the
+#           legacy SynchroniseJIRA handler made): search, create, bulk create, get, update and transitions. Every
+#           request is delayed by latency seconds to stand in for the network and JIRA itself, and every
+#           throttle_every-th request is answered with a 429 and a Retry-After, like a rate limited JIRA Cloud.
+#
+#           Used by the JIRA sync tests and benchmarks/bench_jira_sync.py, or run on its own to point a
+#           veracode.config at:
+#
+#           python tests/jira_stub.py [--port 8090] [--latency 0.01] [--throttle-every 0]
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+
+STATUSES = {"1": {"id": "1", "name": "Open", "statusCategory": {"key": "new"}},
+            "3": {"id": "3", "name": "In Progress", "statusCategory": {"key": "indeterminate"}},
+            "10001": {"id": "10001", "name": "Done", "statusCategory": {"key": "done"}}}
+TRANSITIONS = [{"id": "11", "name": "Start Progress", "to": "3"},
+               {"id": "31", "name": "Done", "to": "10001"}]
+ISSUE_TYPES = {"Bug": "10004", "Task": "10002"}
+MAX_RESULTS = 100
+MAX_BULK = 50
+
+
+class JiraState:
+    def __init__(self, latency=0.0, throttle_every=0, retry_after=1):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.issues = {}
+        self.ids = itertools.count(1)
+        self.requests = 0
+        self.throttled = 0
+        self.calls = {}
+
+    def count(self, call):
+        """ returns True if the request should be throttled """
+        with self.lock:
+            self.requests += 1
+            self.calls[call] = self.calls.get(call, 0) + 1
+            if self.throttle_every > 0 and self.requests % self.throttle_every == 0:
+                self.throttled += 1
+                return True
+        return False
+
+    def create(self, fields):
+        if "summary" not in fields or "project" not in fields:
+            return None, {"summary": "Summary is required"}
+        with self.lock:
+            key = f'{fields["project"].get("key", "VC")}-{next(self.ids)}'
+            self.issues[key] = {"key": key,
+                                "fields": {"summary": fields.get("summary"),
+                                           "description": fields.get("description"),
+                                           "labels": list(fields.get("labels", [])),
+                                           "issuetype": {"id": ISSUE_TYPES.get(fields.get("issuetype", {})
+                                                                               .get("name"), "10004")},
+                                           "status": STATUSES["1"]}}
+        return key, None
+
+    def issue(self, key, fields=None):
+        issue = self.issues[key]
+        if fields:
+            return {"key": key, "fields": {name: value for name, value in issue["fields"].items() if name in fields}}
+        return issue
+
+    def search(self, jql, start_at, max_results, fields):
+        labels = re.findall(r'labels = "([^"]+)"', jql)
+        with self.lock:
+            found = [key for key, issue in self.issues.items()
+                     if all(label in issue["fields"]["labels"] for label in labels)]
+        max_results = min(max_results, MAX_RESULTS)
+        return {"startAt": start_at, "maxResults": max_results, "total": len(found),
+                "issues": [self.issue(key, fields) for key in found[start_at:start_at + max_results]]}
+
+
+class JiraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    """ the headers and the body are separate writes, without this each response waits for a delayed ACK """
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None, headers=None):
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length > 0 else {}
+
+    def handle_call(self, method):
+        state = self.server.state
+        path = self.path.split("?", 1)[0]
+        match = re.fullmatch(r'/rest/api/2/(search|issue/bulk|issue|issue/([^/]+)(/transitions)?)', path)
+        body = self.body()
+        if match is None:
+            return self.reply(404, {"errorMessages": [f'No {method} {path}']})
+        key = match.group(2)
+        call = method + " " + (match.group(1) if key is None else "issue/{key}" + (match.group(3) or ""))
+        time.sleep(state.latency)
+        if state.count(call):
+            return self.reply(429, {"errorMessages": ["Rate limit exceeded"]},
+                              {"Retry-After": str(state.retry_after)})
+        if key is not None and key not in state.issues:
+            return self.reply(404, {"errorMessages": [f'Issue {key} does not exist']})
+        if call == "POST search":
+            return self.reply(200, state.search(body.get("jql", ""), body.get("startAt", 0),
+                                                body.get("maxResults", 50), body.get("fields")))
+        if call == "POST issue/bulk":
+            updates = body.get("issueUpdates", [])
+            if len(updates) > MAX_BULK:
+                return self.reply(400, {"errorMessages": [f'At most {MAX_BULK} issues can be created at once']})
+            issues, errors = [], []
+            for i, update in enumerate(updates):
+                key, error = state.create(update.get("fields", {}))
+                if key is None:
+                    errors.append({"status": 400, "elementErrors": {"errors": error}, "failedElementNumber": i})
+                else:
+                    issues.append({"id": key.rsplit("-", 1)[1], "key": key})
+            return self.reply(201 if len(issues) > 0 else 400, {"issues": issues, "errors": errors})
+        if call == "POST issue":
+            key, error = state.create(body.get("fields", {}))
+            if key is None:
+                return self.reply(400, {"errors": error})
+            return self.reply(201, {"id": key.rsplit("-", 1)[1], "key": key})
+        if call == "GET issue/{key}":
+            return self.reply(200, state.issue(key))
+        if call == "PUT issue/{key}":
+            with state.lock:
+                fields = state.issues[key]["fields"]
+                fields.update((name, value) for name, value in body.get("fields", {}).items()
+                              if name in ("summary", "description", "labels"))
+                for operation in body.get("update", {}).get("labels", []):
+                    if "add" in operation and operation["add"] not in fields.setdefault("labels", []):
+                        fields["labels"].append(operation["add"])
+            return self.reply(204)
+        if call == "GET issue/{key}/transitions":
+            return self.reply(200, {"transitions": [{"id": t["id"], "name": t["name"], "to": STATUSES[t["to"]]}
+                                                    for t in TRANSITIONS]})
+        if call == "POST issue/{key}/transitions":
+            transition = next((t for t in TRANSITIONS if t["id"] == body.get("transition", {}).get("id")), None)
+            if transition is None:
+                return self.reply(400, {"errorMessages": ["Invalid transition"]})
+            with state.lock:
+                state.issues[key]["fields"]["status"] = STATUSES[transition["to"]]
+            return self.reply(204)
+        return self.reply(405, {"errorMessages": [f'No {call}']})
+
+    def do_GET(self):
+        self.handle_call("GET")
+
+    def do_POST(self):
+        self.handle_call("POST")
+
+    def do_PUT(self):
+        self.handle_call("PUT")
+
+
+def start_stub(port=0, latency=0.0, throttle_every=0, retry_after=1):
+    """Starts the stub server on a background thread and returns (server, base_url). server.state holds the
+    issues and the request counts."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), JiraHandler)
+    server.daemon_threads = True
+    server.state = JiraState(latency, throttle_every, retry_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub JIRA server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--throttle-every", dest="throttle_every", type=int, default=0)
+    args = parser.parse_args()
+    server, base_url = start_stub(args.port, args.latency, args.throttle_every)
+    print(f'Stub JIRA listening on {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
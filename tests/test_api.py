@@ -0,0 +1,89 @@
+# Purpose:  Tests for the Veracode API client (helpers.api)
+
+import pytest
+from helpers.api import VeracodeAPI
+from helpers.cache import ResponseCache
+from helpers.exceptions import VeracodeAPIError
+from helpers.exceptions import VeracodeAPIStatusError
+from helpers.index import MISS_REFRESH_INTERVAL
+from helpers.index import NameIndex
+
+
+def failing_api(error):
+    """Returns a VeracodeAPI whose requests all fail with error, and the list of the requests made."""
+    api = VeracodeAPI(vid="a" * 32, vkey="00" * 64, upload_retries=3, backoff_factor=0)
+    requests_made = []
+
+    def request(method, url, **kwargs):
+        requests_made.append(url)
+        raise error
+    api._request = request
+    return api, requests_made
+
+
+@pytest.mark.parametrize("error, attempts", [(VeracodeAPIStatusError(400), 1),
+                                             (VeracodeAPIStatusError(413), 1),
+                                             (VeracodeAPIStatusError(429), 4),
+                                             (VeracodeAPIStatusError(502), 4),
+                                             (VeracodeAPIError("Connection reset"), 4)])
+def test_upload_retries(tmp_path, error, attempts):
+    upload = tmp_path / "app.jar"
+    upload.write_bytes(b"x" * 1024)
+    api, requests_made = failing_api(error)
+    with pytest.raises(VeracodeAPIError):
+        api.upload_file("1", str(upload))
+    assert len(requests_made) == attempts
+
+
+def listing_api(tmp_path, index=None):
+    """Returns a VeracodeAPI with a response cache whose requests return the lists in its responses dict, and
+    the list of the requests made."""
+    api = VeracodeAPI(vid="a" * 32, vkey="00" * 64, cache=ResponseCache(str(tmp_path / "cache")), index=index)
+    api.responses = {}
+    requests_made = []
+
+    def request(method, url, params=None, parse=None, **kwargs):
+        requests_made.append(url.rsplit("/", 1)[-1])
+        content = api.responses[url.rsplit("/", 1)[-1]]
+        return content if parse is None else parse(content)
+    api._request = request
+    return api, requests_made
+
+
+def sandbox_list(*names):
+    return b"<sandboxlist>" + b"".join(b'<sandbox sandbox_id="%d" sandbox_name="%s"/>' % (i, name.encode())
+                                       for i, name in enumerate(names, 1)) + b"</sandboxlist>"
+
+
+def app_list(*names):
+    return b"<applist>" + b"".join(b'<app app_id="%d" app_name="%s"/>' % (i, name.encode())
+                                   for i, name in enumerate(names, 1)) + b"</applist>"
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_missing_sandbox_bypasses_the_cache(tmp_path, indexed):
+    index = NameIndex("a" * 32, str(tmp_path / "index.json")) if indexed else None
+    api, requests_made = listing_api(tmp_path, index)
+    api.responses["getsandboxlist.do"] = sandbox_list("feature")
+    assert api.get_sandbox_id("1", "feature") == "1"
+    """ another runner creates a sandbox while the list is still cached """
+    api.responses["getsandboxlist.do"] = sandbox_list("feature", "release")
+    if indexed:
+        index.sandboxes["1"]["refreshed"] -= MISS_REFRESH_INTERVAL + 1
+    assert api.get_sandbox_id("1", "release") == "2"
+    assert api.get_sandbox_id("1", "feature") == "1"
+    assert requests_made == ["getsandboxlist.do", "getsandboxlist.do"]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_missing_app_bypasses_the_cache(tmp_path, indexed):
+    index = NameIndex("a" * 32, str(tmp_path / "index.json")) if indexed else None
+    api, requests_made = listing_api(tmp_path, index)
+    api.responses["getapplist.do"] = app_list("app")
+    assert api.get_app_id_by_name("app") == "1"
+    api.responses["getapplist.do"] = app_list("app", "new app")
+    if indexed:
+        index.apps["refreshed"] -= MISS_REFRESH_INTERVAL + 1
+    assert api.get_app_id_by_name("new app") == "2"
+    assert api.get_app_id_by_name("app") == "1"
+    assert requests_made == ["getapplist.do", "getapplist.do"]
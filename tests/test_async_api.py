@@ -0,0 +1,126 @@
+# Purpose:  Smoke test of the VeracodeAPI methods that AsyncVeracodeAPI inherits, against a local stub server
+
+import asyncio
+import inspect
+import io
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import pytest
+from helpers.api import VeracodeAPI
+from helpers.async_api import AsyncVeracodeAPI
+
+BUILD = b'<build build_id="5" version="build 5" results_ready="true" policy_updated_date="2020-01-01">' \
+        b'<analysis_unit status="Results Ready"/></build>'
+FILE_LIST = b'<filelist><file file_id="1" file_name="app.jar" file_status="Uploaded"/></filelist>'
+RESPONSES = {"getapplist.do": b'<applist><app app_id="1" app_name="app"/></applist>',
+             "createapp.do": b'<appinfo><application app_id="4" app_name="new"/></appinfo>',
+             "getappinfo.do": b'<appinfo><application app_id="1" app_name="app"/></appinfo>',
+             "getsandboxlist.do": b'<sandboxlist><sandbox sandbox_id="2" sandbox_name="sandbox"/></sandboxlist>',
+             "createsandbox.do": b'<sandboxinfo><sandbox sandbox_id="3" sandbox_name="new"/></sandboxinfo>',
+             "createbuild.do": b'<buildinfo app_id="1">' + BUILD + b'</buildinfo>',
+             "getbuildinfo.do": b'<buildinfo app_id="1">' + BUILD + b'</buildinfo>',
+             "getbuildlist.do": b'<buildlist app_id="1">' + BUILD + b'</buildlist>',
+             "getappbuilds.do": b'<applicationbuilds><application app_id="1">' + BUILD + b'</application>'
+                                b'</applicationbuilds>',
+             "getprescanresults.do": b'<prescanresults><module id="7" name="app.jar" has_fatal_errors="false"/>'
+                                     b'</prescanresults>',
+             "beginprescan.do": b'<buildinfo app_id="1">' + BUILD + b'</buildinfo>',
+             "uploadfile.do": FILE_LIST,
+             "getfilelist.do": FILE_LIST,
+             "removefile.do": FILE_LIST,
+             "updatemitigationinfo.do": b'<mitigationinfo build_id="5"/>',
+             "detailedreport.do": b'<detailedreport app_id="1"/>',
+             "createteam.do": b'<teaminfo team_id="8"/>',
+             "getpolicylist.do": b'<policylist/>',
+             "getuserlist.do": b'<userlist/>',
+             "getuserinfo.do": b'<userinfo/>'}
+
+
+class VeracodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > 0:
+            self.rfile.read(length)
+        body = RESPONSES.get(self.path.split("?", 1)[0].rsplit("/", 1)[-1], b'<error>Unknown call</error>')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = reply
+    do_POST = reply
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), VeracodeHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/api'
+    server.shutdown()
+
+
+def calls(tmp_path):
+    """Returns the arguments to call each public VeracodeAPI method with."""
+    upload = tmp_path / "app.jar"
+    upload.write_bytes(b"x" * 1024)
+    return {"upload_file": ("1", str(upload), "2", threading.Event()),
+            "get_file_list": ("1", "5", "2"),
+            "remove_file": ("1", "1", "2"),
+            "create_team": ("team", "user"),
+            "create_app": ("new", "", "High", "Veracode Recommended High", "team"),
+            "get_sandbox_id": ("1", "sandbox"),
+            "create_sandbox": ("1", "new"),
+            "create_build": ("1", "build 6", "2"),
+            "begin_prescan": ("1", "true", "2"),
+            "get_modules": ("1", "5", "2"),
+            "results_ready": ("1", "5", "2"),
+            "add_comment": ("5", ["1", "2"], "JIRA Issue Key: VC-1"),
+            "get_latest_published_build_id": ("1", "2"),
+            "get_latest_build_id": ("1", "2"),
+            "get_app_list": (),
+            "get_app_id_by_name": ("app",),
+            "get_app_builds": ("01/01/2020",),
+            "get_app_info": ("1",),
+            "get_sandbox_list": ("1",),
+            "get_build_list": ("1", "2"),
+            "get_build_info": ("1", "5", "2"),
+            "get_build_status": ("1", "5", "2"),
+            "get_detailed_report": ("5",),
+            "download_detailed_report": ("5", io.BytesIO()),
+            "get_policy_list": (),
+            "get_user_list": (),
+            "get_user_info": ("user",)}
+
+
+def test_every_method_is_covered(tmp_path):
+    methods = {name for name, method in inspect.getmembers(VeracodeAPI, inspect.isfunction)
+               if not name.startswith("_") and name != "get_stats"}
+    assert methods == set(calls(tmp_path))
+
+
+def test_inherited_methods(base_url, tmp_path):
+    async def call_all():
+        async with AsyncVeracodeAPI(None, "a" * 32, "00" * 64) as api:
+            api.baseurl = base_url
+            return {name: await getattr(api, name)(*args) for name, args in calls(tmp_path).items()}
+
+    results = asyncio.run(call_all())
+    assert results["get_sandbox_id"] == "2"
+    assert results["create_sandbox"] == "3"
+    assert results["create_app"] == "4"
+    assert results["create_build"] == "5"
+    assert results["get_modules"] == {"app.jar": "7"}
+    assert results["results_ready"] is True
+    assert results["get_latest_published_build_id"] == "5"
+    assert results["get_build_status"].policy_updated_date == "2020-01-01"
+    assert results["get_app_id_by_name"] == "1"
+    assert results["upload_file"] == FILE_LIST
+    assert results["download_detailed_report"] == len(RESPONSES["detailedreport.do"])
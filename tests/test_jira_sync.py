@@ -0,0 +1,215 @@
+# Purpose:  Tests for the JIRA synchronisation (helpers.jira_sync) against the stub JIRA server
+
+import pytest
+import requests
+from jira_stub import start_stub
+from helpers.exceptions import TicketingError
+from helpers.jira_sync import JiraClient
+from helpers.jira_sync import JiraSync
+from helpers.jira_sync import create_jira_sync
+from helpers.sync_ledger import SyncLedger
+from helpers.tickets import TicketPlanner
+
+APP_ID = "1234"
+
+
+@pytest.fixture
+def plan(results):
+    def plan(flaws, tickets=None):
+        return TicketPlanner().plan(results(flaws), tickets)
+    return plan
+
+
+@pytest.fixture
+def stub():
+    server, base_url = start_stub(retry_after=0)
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = SyncLedger(str(tmp_path / "sync-ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def jira_sync(base_url, ledger=None):
+    return JiraSync(JiraClient(base_url, "user", "token", workers=4, backoff_factor=0), "VC", APP_ID,
+                    workers=4, ledger=ledger)
+
+
+@pytest.fixture
+def sync(plan):
+    def sync(base_url, flaws, ledger=None):
+        """Returns the summary of a sync of the flaws, planned with the tickets the search finds."""
+        jira = jira_sync(base_url, ledger)
+        return jira.sync(plan(flaws, jira.prefetch()))
+    return sync
+
+
+def test_create_update_close(stub, flaw, sync):
+    server, base_url = stub
+    summary = sync(base_url, {"1": flaw(), "2": flaw(), "3": flaw()})
+    assert sorted(summary["created"]) == ["1", "2", "3"]
+    assert summary["errors"] == []
+    issues = server.state.issues
+    assert sorted(issues) == sorted(summary["created"].values())
+    assert issues[summary["created"]["1"]]["fields"]["labels"] == ["veracode-app-" + APP_ID, "veracode-flaw-1"]
+
+    """ the search finds the tickets, so nothing is created twice """
+    summary = sync(base_url, {"1": flaw(description="Still SQL injection"), "2": flaw(), "3": flaw("Fixed")})
+    assert summary["created"] == {}
+    assert (summary["updated"], summary["closed"], summary["errors"]) == (2, 1, [])
+    assert len(issues) == 3
+    key = [issue_key for issue_key, issue in issues.items() if "veracode-flaw-1" in issue["fields"]["labels"]][0]
+    assert issues[key]["fields"]["description"].endswith("Still SQL injection")
+    closed = [issue for issue in issues.values() if "veracode-flaw-3" in issue["fields"]["labels"]][0]
+    assert closed["fields"]["status"]["name"] == "Done"
+
+    """ a ticket that is already done is skipped """
+    summary = sync(base_url, {"3": flaw("Fixed")})
+    assert (summary["closed"], summary["skipped"]) == (0, 1)
+
+
+def test_bulk_create_chunks(stub, flaw, sync):
+    server, base_url = stub
+    summary = sync(base_url, {str(issue_id): flaw() for issue_id in range(1, 121)})
+    assert len(summary["created"]) == 120
+    assert len(set(summary["created"].values())) == 120
+    assert server.state.calls["POST issue/bulk"] == 3
+
+
+def test_throttled_requests_are_retried(stub, flaw, sync):
+    server, base_url = stub
+    server.state.throttle_every = 3
+    assert len(sync(base_url, {str(issue_id): flaw() for issue_id in range(1, 121)})["created"]) == 120
+    summary = sync(base_url, {str(issue_id): flaw("Fixed") for issue_id in range(1, 121)})
+    assert server.state.throttled > 0
+    assert (summary["closed"], summary["errors"]) == (120, [])
+
+
+def test_ledger_skips_unchanged_tickets(stub, ledger, flaw, sync):
+    server, base_url = stub
+    flaws = {"1": flaw(), "2": flaw()}
+    sync(base_url, flaws, ledger)
+
+    """ a sync with no changes only searches """
+    requests_made = server.state.requests
+    summary = sync(base_url, flaws, ledger)
+    assert (summary["updated"], summary["unchanged"]) == (0, 2)
+    assert server.state.requests == requests_made + 1
+
+    """ changed content and state are written again """
+    flaws = {"1": flaw(description="Still SQL injection"), "2": flaw("Fixed")}
+    summary = sync(base_url, flaws, ledger)
+    assert (summary["updated"], summary["closed"], summary["unchanged"]) == (1, 1, 0)
+    assert sync(base_url, flaws, ledger)["unchanged"] == 2
+
+    """ a closed ticket that was opened again in JIRA is closed again """
+    for issue in server.state.issues.values():
+        issue["fields"]["status"] = {"id": "1", "name": "Open", "statusCategory": {"key": "new"}}
+    summary = sync(base_url, flaws, ledger)
+    assert (summary["closed"], summary["unchanged"]) == (1, 1)
+
+    """ without the ledger every ticket is written """
+    summary = sync(base_url, {"1": flaw(description="Still SQL injection")})
+    assert (summary["updated"], summary["unchanged"]) == (1, 0)
+
+
+def test_ledger_knows_tickets_the_search_does_not_find_yet(stub, ledger, flaw, sync):
+    server, base_url = stub
+    created = sync(base_url, {"1": flaw()}, ledger)["created"]
+    """ e.g. a search index that hasn't caught up with the new ticket """
+    server.state.issues[created["1"]]["fields"]["labels"] = []
+    jira = jira_sync(base_url, ledger)
+    assert jira.prefetch() == created
+
+
+def test_pending_keys(stub, ledger, flaw, plan, sync):
+    server, base_url = stub
+    created = sync(base_url, {"1": flaw(), "2": flaw()}, ledger)["created"]
+    jira = jira_sync(base_url, ledger)
+    """ a sync that stopped before writing the keys back still has them pending the next time """
+    assert jira.pending_keys() == created
+    jira.keys_written(["1"])
+    assert jira.pending_keys() == {"2": created["2"]}
+    jira.sync(plan({"1": flaw(), "2": flaw()}, jira.prefetch()))
+    assert jira.pending_keys() == {"2": created["2"]}
+    jira.keys_written(["2"])
+    assert jira_sync(base_url, ledger).pending_keys() == {}
+
+
+def test_legacy_tickets_are_labelled(stub, ledger, flaw, plan):
+    server, base_url = stub
+    """ a ticket created by the legacy synchroniser, only linked to its flaw by the comment """
+    key = server.state.create({"project": {"key": "VC"}, "summary": "Veracode Flaw 1"})[0]
+    jira = jira_sync(base_url, ledger)
+    assert jira.prefetch() == {}
+    summary = jira.sync(plan({"1": flaw(issue_key=key)}, {}))
+    assert (summary["updated"], summary["errors"]) == (1, [])
+    assert server.state.issues[key]["fields"]["labels"] == ["veracode-app-" + APP_ID, "veracode-flaw-1"]
+
+    """ the recorded update isn't taken as unchanged until the search has found the ticket """
+    jira = jira_sync(base_url, ledger)
+    assert jira.prefetch() == {"1": key}
+    assert jira.sync(plan({"1": flaw(issue_key=key)}, {}))["unchanged"] == 1
+
+
+def test_create_errors_are_reported(stub, flaw, plan):
+    server, base_url = stub
+    jira = jira_sync(base_url)
+    jira.create_fields = lambda action: {"project": {"key": "VC"}} if action["issueid"] == "2" else \
+        JiraSync.create_fields(jira, action)
+    summary = jira.sync(plan({"1": flaw(), "2": flaw(), "3": flaw()}, jira.prefetch()))
+    assert sorted(summary["created"]) == ["1", "3"]
+    assert [(error["type"], error["issueid"]) for error in summary["errors"]] == [("create", "2")]
+
+
+def unavailable(client):
+    """Makes every request of the client get a 503 and returns the list of the methods requested."""
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        r = requests.models.Response()
+        r.status_code = 503
+        r._content = b""
+        r.headers["Retry-After"] = "0"
+        return r
+    client.session.request = request
+    return calls
+
+
+def test_bulk_create_is_not_retried_when_unavailable():
+    client = JiraClient("http://jira.invalid/", "user", "token", retries=3, backoff_factor=0)
+    calls = unavailable(client)
+    with pytest.raises(TicketingError):
+        client.create_issues([{"summary": "Veracode Flaw 1"}])
+    assert calls == ["POST"]
+
+
+def test_search_is_retried_when_unavailable():
+    client = JiraClient("http://jira.invalid/", "user", "token", retries=3, backoff_factor=0)
+    calls = unavailable(client)
+    with pytest.raises(TicketingError):
+        client.search('project = "VC"')
+    assert calls == ["POST"] * 4
+
+
+def test_create_jira_sync(monkeypatch):
+    monkeypatch.setenv("JIRA_USER", "user")
+    monkeypatch.setenv("JIRA_TOKEN", "token")
+    config = {"jira_base_url": "http://jira.invalid/", "jira_project": "VC"}
+    assert create_jira_sync({}, APP_ID) is None
+    assert create_jira_sync(dict(config, type="ADO"), APP_ID) is None
+    jira = create_jira_sync(config, APP_ID)
+    assert jira.app_label == "veracode-app-" + APP_ID
+    for app_id in (None, ""):
+        with pytest.raises(TicketingError):
+            create_jira_sync(config, app_id)
+    with pytest.raises(TicketingError):
+        create_jira_sync({"jira_base_url": "http://jira.invalid/"}, APP_ID)
+    monkeypatch.delenv("JIRA_USER")
+    with pytest.raises(TicketingError):
+        create_jira_sync(config, APP_ID)
@@ -0,0 +1,38 @@
+# Purpose:  Tests for the polling of builds (helpers.polling)
+
+from helpers.builds import BuildStates
+from helpers.polling import DONE
+from helpers.polling import wait_for_builds
+from helpers.records import Build
+
+
+def build(build_id, ready):
+    return Build(build_id, "build " + build_id, "1", None, ready, None, "Results Ready" if ready else "Scan In Process",
+                 None)
+
+
+class BuildsAPI:
+    """getappbuilds.do and getbuildinfo.do of the API"""
+
+    def __init__(self, builds):
+        self.builds = BuildStates()
+        self.builds.changed_since = "01/01/2020"
+        self.app_builds = builds
+        self.build_status_calls = 0
+
+    def get_app_builds(self, report_changed_since=None, parse=None):
+        return list(self.app_builds)
+
+    def get_build_status(self, app_id, build_id, sandbox_id=None):
+        self.build_status_calls += 1
+        return build(build_id, True)
+
+
+def test_wait_for_builds_records_every_build():
+    api = BuildsAPI([build("1", True), build("2", True), build("3", False)])
+    assert wait_for_builds(api, [("1", None, "1"), ("1", None, "4")]) == {"1": DONE, "4": DONE}
+    assert api.build_status_calls == 1
+    """ the builds that aren't being waited for are recorded too, without moving the watermark """
+    assert api.builds.ready == {"1", "2"}
+    assert api.builds.not_ready == {"3"}
+    assert api.builds.changed_since == "01/01/2020"
@@ -0,0 +1,56 @@
+# Purpose:  Tests for the detailed report cache (helpers.report_cache)
+
+import os
+import time
+import pytest
+from helpers.exceptions import VeracodeAPIError
+from helpers.report_cache import ReportCache
+
+
+class ReportAPI:
+    """download_detailed_report() of the API, a report of size bytes for every build"""
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.downloads = []
+
+    def download_detailed_report(self, build_id, output):
+        self.downloads.append(build_id)
+        content = b'<detailedreport build_id="%s">' % str(build_id).encode() + os.urandom(self.size)
+        output.write(content)
+        return len(content)
+
+
+def test_open(tmp_path):
+    cache, api = ReportCache(str(tmp_path)), ReportAPI()
+    with cache.open(api, "1", "2020-01-01") as report:
+        assert report.read().startswith(b'<detailedreport build_id="1">')
+    with cache.open(api, "1", "2020-01-01"):
+        pass
+    """ a new policy_updated_date is a new report, which replaces the old one """
+    with cache.open(api, "1", "2020-02-01"):
+        pass
+    assert api.downloads == ["1", "1"]
+    assert cache.entries("1") == [cache.get("1", "2020-02-01")]
+
+
+def test_error_response_is_not_cached(tmp_path):
+    class ErrorAPI:
+        def download_detailed_report(self, build_id, output):
+            output.write(b"<error>No report</error>")
+            return 24
+    cache = ReportCache(str(tmp_path))
+    with pytest.raises(VeracodeAPIError):
+        cache.open(ErrorAPI(), "1", "2020-01-01")
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_least_recently_used_reports_are_evicted(tmp_path):
+    """ random bytes don't compress, so each report takes up a little over 10000 bytes """
+    cache, api = ReportCache(str(tmp_path), max_bytes=35000), ReportAPI()
+    for build_id in ("1", "2", "3"):
+        cache.open(api, build_id, "2020-01-01").close()
+        time.sleep(0.01)
+    cache.open(api, "1", "2020-01-01").close()
+    cache.open(api, "4", "2020-01-01").close()
+    assert [build_id for build_id in ("1", "2", "3", "4") if cache.get(build_id, "2020-01-01")] == ["1", "3", "4"]
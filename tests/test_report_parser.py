@@ -0,0 +1,26 @@
+# Purpose:  Tests for the detailed report parser (helpers.report_parser)
+
+import io
+import pytest
+from helpers.exceptions import VeracodeError
+from helpers.report_cache import report_error
+from helpers.report_parser import parse_detailed_report
+
+ERROR = b'<?xml version="1.0" encoding="UTF-8"?>\n<error>Could not find a build with id 1</error>\n'
+EMPTY = b'<detailedreport xmlns="https://www.veracode.com/schema/reports/export/1.0" app_id="1"/>'
+
+
+def test_error_response_is_not_a_report():
+    with pytest.raises(VeracodeError):
+        parse_detailed_report(ERROR)
+
+
+def test_report_without_flaws():
+    results = parse_detailed_report(EMPTY)
+    assert results["scan"]["app_id"] == "1"
+    assert "flaws" not in results
+
+
+def test_report_error():
+    assert report_error(io.BytesIO(ERROR), len(ERROR)) == "Could not find a build with id 1"
+    assert report_error(io.BytesIO(EMPTY), len(EMPTY)) is None
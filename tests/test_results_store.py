@@ -0,0 +1,55 @@
+# Purpose:  Tests for the local results store (helpers.results_store)
+
+import time
+import pytest
+from helpers.report_parser import parse_detailed_report
+from helpers.report_parser import to_json
+from helpers.results_store import ResultsStore
+
+
+@pytest.fixture
+def results():
+    flaws = "".join(f'<flaw severity="{severity}" issueid="{issue_id}" module="app.jar" cweid="89" categoryid="1" '
+                    f'remediation_status="New" mitigation_status="none" affects_policy_compliance="true" '
+                    f'sourcefile="Dao.java" sourcefilepath="com/example/"/>'
+                    for issue_id, severity in ((1, 4), (2, 4), (3, 4)))
+    return parse_detailed_report(('<detailedreport app_id="1"><severity level="4"><category categoryid="1">'
+                                  '<cwe cweid="89"><staticflaws>' + flaws + '</staticflaws></cwe></category>'
+                                  '</severity></detailedreport>').encode("utf-8"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.db"), max_builds=3)
+    yield store
+    store.close()
+
+
+def test_ingest_and_load(store, results):
+    store.ingest("1", None, "5", results, "2020-01-01")
+    loaded = store.load("5")
+    assert list(loaded["flaws"]) == list(results["flaws"])
+    assert loaded["flaws"]["1"] == results["flaws"]["1"].as_dict()
+    assert [to_json(entry["flaws"]) for entry in loaded["severities"].values()] == \
+        [to_json(entry["flaws"]) for entry in results["severities"].values()]
+
+
+def test_has_build(store, results):
+    store.ingest("1", None, "5", results, "2020-01-01")
+    assert store.has_build("5", "2020-01-01")
+    assert not store.has_build("5", "2020-02-01")
+    assert not store.has_build("6", "2020-01-01")
+    """ without the date the stored results may be out of date """
+    assert not store.has_build("5", None)
+
+
+def test_prune(store, results):
+    for build_id in ("1", "2", "3", "4"):
+        store.ingest("1", None, build_id, results, "2020-01-01")
+    assert store.load("1") is None
+    assert store.query(build_id="1") == []
+    assert all(store.has_build(build_id, "2020-01-01") for build_id in ("2", "3", "4"))
+    store.max_age = 0.1
+    time.sleep(0.2)
+    store.ingest("1", None, "5", results, "2020-01-01")
+    assert [build_id for build_id in ("2", "3", "4", "5") if store.load(build_id) is not None] == ["5"]
@@ -0,0 +1,24 @@
+# Purpose:  Tests for the service discovery (services)
+
+import ast
+import services
+
+
+def parser_name(source):
+    return services._parser_name(ast.parse(source).body[0])
+
+
+def test_parser_name():
+    assert parser_name('def add_parser(self, parsers):\n'
+                       '    parser = parsers.add_parser("static", help="static scans")\n') == ("static", "static scans")
+    assert parser_name('def add_parser(self, parsers):\n'
+                       '    parser = parsers.add_parser("static", help=HELP)\n') == ("static", None)
+    assert parser_name('def add_parser(self, parsers):\n'
+                       '    parser = parsers.add_parser(NAME)\n') == (None, None)
+    assert parser_name('def add_parser(self):\n    pass\n') == (None, None)
+
+
+def test_scan():
+    manifest = services.scan()
+    assert manifest["static"] == {"module": "static", "class": "static", "help": manifest["static"]["help"]}
+    assert all(entry["help"] for entry in manifest.values())
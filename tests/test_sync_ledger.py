@@ -0,0 +1,34 @@
+# Purpose:  Tests for the ticket sync ledger (helpers.sync_ledger)
+
+import pytest
+from helpers.sync_ledger import CLOSED
+from helpers.sync_ledger import OPEN
+from helpers.sync_ledger import SyncLedger
+
+SCOPE = "http://jira/rest/api/2/|VC|1"
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = SyncLedger(str(tmp_path / "sync-ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def test_record(ledger):
+    ledger.record_many(SCOPE, [(1, "VC-1", "a", OPEN), ("2", "VC-2", "b", OPEN)])
+    ledger.record(SCOPE, "2", "VC-2", "c", CLOSED)
+    assert ledger.entries(SCOPE) == {"1": ("VC-1", "a", OPEN), "2": ("VC-2", "c", CLOSED)}
+    assert ledger.entries("another scope") == {}
+
+
+def test_pending_keys(ledger):
+    ledger.record_many(SCOPE, [("1", "VC-1", "a", OPEN), ("2", "VC-2", "a", OPEN)], key_pending=True)
+    """ an update of the same ticket leaves its key pending, a different ticket takes the new state """
+    ledger.record_many(SCOPE, [("1", "VC-1", "b", OPEN), ("2", "VC-3", "b", OPEN)])
+    assert ledger.pending_keys(SCOPE) == {"1": "VC-1"}
+    ledger.keys_written(SCOPE, ["1"])
+    assert ledger.pending_keys(SCOPE) == {}
+    ledger.record(SCOPE, "1", "VC-1", "c", CLOSED, key_pending=True)
+    assert ledger.pending_keys(SCOPE) == {"1": "VC-1"}
+    assert ledger.entries(SCOPE)["1"] == ("VC-1", "c", CLOSED)
@@ -0,0 +1,123 @@
+# Purpose:  Tests for the ticket action planner (helpers.tickets)
+
+import pytest
+from helpers.tickets import TicketPlanner
+from helpers.tickets import issue_key_comment
+from helpers.tickets import issue_keys_comment
+from helpers.tickets import plan_tickets
+
+
+def types(actions):
+    return {action["issueid"]: (action["type"], action["issue_key"]) for action in actions}
+
+
+def test_plan_dict_flaws(flaw, results):
+    actions = TicketPlanner().plan(results({
+        "1": flaw(),
+        "2": flaw(issue_key="VC-2"),
+        "3": flaw(remediation_status="Fixed", issue_key="VC-3"),
+        "4": flaw(remediation_status="Fixed"),
+        "5": flaw(remediation_status="Cannot Reproduce", issue_key="VC-5")}))
+    assert types(actions) == {"1": ("create", None), "2": ("update", "VC-2"), "3": ("close", "VC-3"),
+                              "5": ("close", "VC-5")}
+    assert actions[0]["category_name"] == "SQL Injection"
+    assert actions[0]["cwe_name"] == "CWE 89"
+    assert actions[0]["file"] == "Dao.java"
+
+
+def test_plan_flaw_records(report):
+    parsed = report(("1", "New", "none", "true", ()),
+                    ("2", "Open", "none", "true", ["Seen", issue_key_comment("JIRA", "VC-2")]),
+                    ("3", "Fixed", "none", "true", [issue_key_comment("JIRA", "VC-3")]),
+                    ("4", "Fixed", "none", "true", ()))
+    actions = TicketPlanner().plan(parsed)
+    assert types(actions) == {"1": ("create", None), "2": ("update", "VC-2"), "3": ("close", "VC-3")}
+    assert actions[0]["category_name"] == "SQL Injection"
+    assert actions[0]["path"] == "com/example/"
+
+
+def test_plan_dict_and_flaw_records_agree(flaw, results, report):
+    flaws = [("1", "New", "none", "false", ()),
+             ("2", "Open", "accepted", "true", [issue_key_comment("JIRA", "VC-2")]),
+             ("3", "Fixed", "none", "true", [issue_key_comment("JIRA", "VC-3")])]
+    parsed = report(*flaws)
+    as_dicts = results({issue_id: flaw(remediation, mitigation, affects_policy, comments)
+                        for issue_id, remediation, mitigation, affects_policy, comments in flaws})
+    for planner in (TicketPlanner(), TicketPlanner(sync_filter="policy_affecting"),
+                    TicketPlanner(mitigation_handling=False)):
+        assert types(planner.plan(parsed)) == types(planner.plan(as_dicts))
+
+
+def test_newest_issue_key_comment_wins(flaw, results, report):
+    parsed = report(("1", "Open", "none", "true", [issue_key_comment("JIRA", "VC-1"),
+                                                   issue_key_comment("JIRA", "VC-9")]))
+    assert types(TicketPlanner().plan(parsed)) == {"1": ("update", "VC-9")}
+    as_dicts = results({"1": flaw(comments=[issue_key_comment("JIRA", "VC-1")], issue_key="VC-9")})
+    assert types(TicketPlanner().plan(as_dicts)) == {"1": ("update", "VC-9")}
+
+
+def test_policy_affecting(flaw, results):
+    flaws = results({"1": flaw(), "2": flaw(affects_policy_compliance="false")})
+    assert [action["issueid"] for action in TicketPlanner(sync_filter="all").plan(flaws)] == ["1", "2"]
+    assert [action["issueid"] for action in TicketPlanner(sync_filter="policy_affecting").plan(flaws)] == ["1"]
+
+
+def test_unknown_sync_filter():
+    with pytest.raises(ValueError):
+        TicketPlanner(sync_filter="some")
+
+
+def test_mitigation_handling(flaw, results):
+    flaws = results({"1": flaw(mitigation_status="accepted", issue_key="VC-1"),
+                     "2": flaw(mitigation_status="accepted"),
+                     "3": flaw(mitigation_status="proposed", issue_key="VC-3")})
+    assert types(TicketPlanner(mitigation_handling=True).plan(flaws)) == {"1": ("close", "VC-1"),
+                                                                          "3": ("update", "VC-3")}
+    assert types(TicketPlanner(mitigation_handling=False).plan(flaws)) == {"1": ("update", "VC-1"),
+                                                                           "2": ("create", None),
+                                                                           "3": ("update", "VC-3")}
+
+
+def test_batch_issue_keys_comment(flaw, results):
+    shared = issue_keys_comment("JIRA", {"1": "VC-1", "2": "VC-2"})
+    assert shared == "JIRA Issue Keys: 1=VC-1 2=VC-2"
+    flaws = results({"1": flaw(comments=[shared]),
+                     "2": flaw(remediation_status="Fixed", comments=[shared]),
+                     "3": flaw(comments=[shared])})
+    planner = TicketPlanner()
+    assert types(planner.plan(flaws)) == {"1": ("update", "VC-1"), "2": ("close", "VC-2"), "3": ("create", None)}
+    """ the shared comment is only split up once """
+    assert list(planner.batch_keys) == [shared]
+
+
+def test_batch_issue_keys_comment_flaw_records(report):
+    shared = issue_keys_comment("JIRA", {"1": "VC-1", "2": "VC-2"})
+    parsed = report(("1", "Open", "none", "true", [shared]),
+                    ("2", "Open", "none", "true", [issue_key_comment("JIRA", "VC-7"), shared]),
+                    ("3", "Open", "none", "true", [shared]))
+    assert types(TicketPlanner().plan(parsed)) == {"1": ("update", "VC-1"), "2": ("update", "VC-2"),
+                                                   "3": ("create", None)}
+
+
+def test_issue_key_comment_of_another_ticket_type(flaw, results):
+    flaws = results({"1": flaw(comments=[issue_key_comment("ADO", "42")])})
+    assert types(TicketPlanner("JIRA").plan(flaws)) == {"1": ("create", None)}
+    assert types(TicketPlanner("ADO").plan(flaws)) == {"1": ("update", "42")}
+
+
+def test_tickets_take_precedence(flaw, results):
+    flaws = results({"1": flaw(issue_key="VC-1"), "2": flaw()})
+    assert types(TicketPlanner().plan(flaws, {1: "VC-100", "2": "VC-200"})) == {"1": ("update", "VC-100"),
+                                                                                "2": ("update", "VC-200")}
+
+
+def test_plan_tickets_settings(flaw, results):
+    flaws = results({"1": flaw(affects_policy_compliance="false"),
+                     "2": flaw(mitigation_status="accepted", issue_key="VC-2")})
+    assert types(plan_tickets({}, flaws)) == {"1": ("create", None), "2": ("close", "VC-2")}
+    assert types(plan_tickets({"sync_filter": "policy_affecting", "mitigation_handling": False}, flaws)) == \
+        {"2": ("update", "VC-2")}
+
+
+def test_plan_empty_results():
+    assert TicketPlanner().plan({}) == []
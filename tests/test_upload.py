@@ -0,0 +1,50 @@
+# Purpose:  Tests for the concurrent uploads (helpers.upload)
+
+import threading
+import pytest
+from helpers.exceptions import VeracodeError
+from helpers.upload import upload_files
+
+FILE_LIST = b'<filelist><file file_name="{}" file_id="1" file_status="Uploaded"/></filelist>'
+
+
+class UploadAPI:
+    """upload_file() of the API, rejecting the files in rejected with an <error> body"""
+
+    def __init__(self, rejected=()):
+        self.rejected = rejected
+        self.uploaded = []
+        self.lock = threading.Lock()
+
+    def upload_file(self, app_id, filename, sandbox_id=None, stop=None):
+        if filename in self.rejected:
+            return b'<?xml version="1.0" encoding="UTF-8"?>\n<error>File is not a supported type</error>\n'
+        with self.lock:
+            self.uploaded.append(filename)
+        return FILE_LIST
+
+
+def files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f'app{i}.jar'
+        path.write_bytes(b"x" * (count - i))
+        paths.append(str(path))
+    return paths
+
+
+def test_upload_files(tmp_path):
+    filenames = files(tmp_path, 3)
+    uploaded = []
+    summary = upload_files(UploadAPI(), "1", filenames, workers=2, on_uploaded=uploaded.append)
+    assert sorted(uploaded) == sorted(filenames)
+    assert (summary["files"], summary["bytes"]) == (3, 6)
+
+
+def test_rejected_file_fails_the_upload(tmp_path):
+    filenames = files(tmp_path, 3)
+    uploaded = []
+    with pytest.raises(VeracodeError) as err:
+        upload_files(UploadAPI(rejected=filenames[:1]), "1", filenames, workers=1, on_uploaded=uploaded.append)
+    assert "File is not a supported type" in str(err.value)
+    assert filenames[0] not in uploaded
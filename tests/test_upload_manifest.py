@@ -0,0 +1,85 @@
+# Purpose:  Tests for the upload deduplication (helpers.upload_manifest)
+
+import hashlib
+import os
+import pytest
+import helpers.upload_manifest
+from helpers.upload_manifest import UPLOADED_STATUS
+from helpers.upload_manifest import UploadManifest
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(helpers.upload_manifest, "veracode_path", lambda *parts: str(tmp_path.joinpath(*parts)))
+    (tmp_path / "uploads").mkdir()
+    return UploadManifest("1")
+
+
+def local_file(tmp_path, path, content):
+    path = tmp_path.joinpath(*path.split("/"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def server_file(file_id, file_name, content=None, status=UPLOADED_STATUS):
+    return {"file_id": file_id, "file_name": file_name, "file_status": status,
+            "file_md5": None if content is None else hashlib.md5(content).hexdigest()}
+
+
+def test_reconcile(tmp_path, manifest):
+    same = local_file(tmp_path, "a/same.jar", b"same")
+    changed = local_file(tmp_path, "a/changed.jar", b"new")
+    failed = local_file(tmp_path, "a/failed.jar", b"failed")
+    new = local_file(tmp_path, "a/new.jar", b"new")
+    server_files = [server_file("1", "same.jar", b"same"), server_file("2", "changed.jar", b"old"),
+                    server_file("3", "failed.jar", b"failed", "Upload Failed"), server_file("4", "other.jar", b"x")]
+    to_upload, skipped, to_remove = manifest.reconcile([same, changed, failed, new], server_files, "5")
+    assert to_upload == [changed, failed, new]
+    assert skipped == [same]
+    assert sorted(server_file["file_id"] for server_file in to_remove) == ["2", "3"]
+
+
+def test_same_name_in_different_directories(tmp_path, manifest):
+    first = local_file(tmp_path, "a/app.jar", b"first")
+    second = local_file(tmp_path, "b/app.jar", b"second")
+    """ one of them is attached, the other is not, so only the stale copy of the other is replaced """
+    server_files = [server_file("1", "app.jar", b"second"), server_file("2", "app.jar", b"old")]
+    to_upload, skipped, to_remove = manifest.reconcile([first, second], server_files, "5")
+    assert (to_upload, skipped) == ([first], [second])
+    assert [server_file["file_id"] for server_file in to_remove] == ["2"]
+
+
+def test_without_md5_trusts_the_recorded_upload(tmp_path, manifest):
+    app = local_file(tmp_path, "a/app.jar", b"app")
+    assert manifest.reconcile([app], [], "5") == ([app], [], [])
+    manifest.record(app, "5")
+    manifest.save()
+    manifest = UploadManifest("1")
+    assert manifest.reconcile([app], [server_file("1", "app.jar")], "5") == ([], [app], [])
+    """ an upload to another build doesn't count """
+    assert manifest.reconcile([app], [server_file("1", "app.jar")], "6")[0] == [app]
+
+
+def test_files_are_hashed_once(tmp_path, manifest, monkeypatch):
+    app = local_file(tmp_path, "a/app.jar", b"app")
+    opened = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+    monkeypatch.setattr("builtins.open", counting_open)
+    manifest.reconcile([app], [], "5")
+    manifest.record(app, "5")
+    assert opened.count(os.path.abspath(app)) == 1
+
+
+def test_files_no_longer_uploaded_are_forgotten(tmp_path, manifest):
+    bundle = local_file(tmp_path, "bundle-1/bundle-0001.zip", b"bundle 1")
+    manifest.reconcile([bundle], [], "5")
+    manifest.record(bundle, "5")
+    app = local_file(tmp_path, "a/app.jar", b"app")
+    manifest.reconcile([app], [], "6")
+    assert list(manifest.hashes) == [os.path.abspath(app)]
+    assert manifest.uploaded == {}
@@ -1,8 +1,4 @@
-import os
-import importlib
-
-
-for module in os.listdir(os.path.dirname(__file__)):
-    if module == '__init__.py' or module[-3:] != '.py':
-        continue
-    importlib.import_module("."+module[:-3], __name__)
\ No newline at end of file
+# Purpose:  Helper modules
+#
+# Notes:    Each helper is imported where it is used (from helpers.x import y). Nothing is imported here, so that
+#           importing one helper doesn't pull in the dependencies (requests, aiohttp, etc.) of all the others.
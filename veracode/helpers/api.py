@@ -11,153 +11,324 @@
 import os
 import requests
 import logging
-from requests.adapters import HTTPAdapter
-import re
+import random
+import time
 from veracode_api_signing.plugin_requests import RequestsAuthPluginVeracodeHMAC
+from helpers.builds import BuildStates
 from helpers.exceptions import VeracodeAPIError
+from helpers.exceptions import VeracodeAPIResponseError
+from helpers.exceptions import VeracodeAPIStatusError
 from helpers.exceptions import VeracodeError
-import xml.etree.ElementTree as ET
+from helpers.records import first_record
+from helpers.records import iter_records
+from helpers.records import parse_error
+from helpers.session import SessionStats
+from helpers.session import create_session
+from helpers.upload import MultipartFileStream
+from helpers.upload import UPLOAD_CHUNK_SIZE
 import configparser
 
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+THROTTLED_STATUS = 429
+
+
+def load_credentials(vid=None, vkey=None):
+    """Returns the (api_key_id, api_key_secret) from the parameters, the environment or the credentials file."""
+    if vid is None or vkey is None:
+        """ OK, lets try the environment variables... """
+        api_key_id = os.environ.get("VID")
+        api_key_secret = os.environ.get("VKEY")
+        if api_key_id is None or api_key_id == "" or api_key_secret is None or api_key_secret == "":
+            """ OK, try for the credentials file instead... """
+            auth_file = os.path.join(os.path.expanduser("~"), '.veracode', 'credentials')
+            if not os.path.exists(auth_file):
+                raise VeracodeError("""Credentials not found. You can supply the credentials as command line arguments, environment variables or by configuring a veracode credentials file. See README.md for more details.""")
+            config = configparser.ConfigParser()
+            config.read(auth_file)
+            credentials_section_name = os.environ.get("VERACODE_API_PROFILE", "default")
+            api_key_id = config.get(credentials_section_name, "VERACODE_API_KEY_ID")
+            api_key_secret = config.get(credentials_section_name, "VERACODE_API_KEY_SECRET")
+            if api_key_id is None or api_key_secret is None:
+                raise VeracodeError("Unable to get credentials from the veracode credentials file (~/.veracode/credentials)")
+        return api_key_id, api_key_secret
+    else:
+        """ use the id and key supplied as parameters """
+        return vid, vkey
+
+
+def parse_app_id(app_xml):
+    """Returns the app_id from a createapp.do response."""
+    return first_record(app_xml, "application", "app").app_id
+
+
+def parse_sandbox_id(sandbox_list_xml, sandbox_name):
+    """Returns the sandbox_id of the named sandbox in a getsandboxlist.do response or None if it isn't found."""
+    for sandbox in iter_records(sandbox_list_xml, "sandbox"):
+        if sandbox.sandbox_name == sandbox_name:
+            return sandbox.sandbox_id
+    return None
+
+
+def parse_created_sandbox_id(sandbox_xml):
+    """Returns the sandbox_id from a createsandbox.do response or None if there isn't one."""
+    sandbox = first_record(sandbox_xml, "sandbox")
+    return None if sandbox is None else sandbox.sandbox_id
+
+
+def parse_created_build_id(build_xml):
+    """Returns the build_id from a createbuild.do response."""
+    build = first_record(build_xml, "build")
+    if build is not None:
+        return build.build_id
+    err_msg = parse_error(build_xml)
+    if err_msg is not None:
+        raise VeracodeError("Error in api.create_build(): " + err_msg)
+    else:
+        raise VeracodeError("Error in api.create_build(): Unknown")
+
+
+def parse_modules(prescan_xml):
+    """Returns a dict of module name to module id from a getprescanresults.do response or None if not ready."""
+    if parse_error(prescan_xml) is not None:
+        return None
+    return {module.name: module.id for module in iter_records(prescan_xml, "module")
+            if module.has_fatal_errors is False}
+
+
+def parse_results_ready(build_info_xml):
+    """Returns True if a getbuildinfo.do response says the results are ready."""
+    build = first_record(build_info_xml, "build")
+    return build is not None and build.results_ready is True
+
+
+def parse_build(build_info_xml):
+    """Returns the Build record from a getbuildinfo.do response."""
+    build = first_record(build_info_xml, "build")
+    if build is None:
+        raise VeracodeError("Error in api.get_build_status(): " + str(parse_error(build_info_xml)))
+    return build
+
+
+def parse_build_ids(build_list_xml):
+    """Returns the build_ids in a getbuildlist.do response (oldest first)."""
+    return [build.build_id for build in iter_records(build_list_xml, "build")]
+
+
+def parse_app_builds(app_builds_xml):
+    """Returns the Build records (with their app_id and sandbox_id) in a getappbuilds.do response."""
+    return list(iter_records(app_builds_xml, "build"))
+
+
+def parse_sandbox_list(sandbox_list_xml):
+    """Returns a dict of sandbox_name to sandbox_id for the sandboxes in a getsandboxlist.do response."""
+    return {sandbox.sandbox_name: sandbox.sandbox_id for sandbox in iter_records(sandbox_list_xml, "sandbox")}
+
+
+def parse_file_list(file_list_xml):
+    """Returns a list of dicts (file_id, file_name, file_status, file_md5) for the files in a getfilelist.do response."""
+    return [file_record._asdict() for file_record in iter_records(file_list_xml, "file")]
+
+
+def parse_app_list(app_list_xml):
+    """Returns a dict of app_id to app_name for the apps in a getapplist.do response."""
+    return {app.app_id: app.app_name for app in iter_records(app_list_xml, "app")}
+
+
+def parse_app_names(app_list_xml):
+    """Returns a dict of app_name to app_id for the apps in a getapplist.do response."""
+    return {app.app_name: app.app_id for app in iter_records(app_list_xml, "app")}
+
+
+def parse_app_id_by_name(app_list_xml, app_name):
+    """Returns the app_id of the named app in a getapplist.do response or None if it isn't found."""
+    for app in iter_records(app_list_xml, "app"):
+        if app.app_name == app_name:
+            return app.app_id
+    return None
+
+
 class VeracodeAPI:
-    def __init__(self, proxies=None, vid=None, vkey=None):
+    def __init__(self, proxies=None, vid=None, vkey=None, pool_size=10, retries=5, backoff_factor=0.5,
+                 upload_retries=3, upload_chunk_size=UPLOAD_CHUNK_SIZE, cache=None, index=None, builds=None):
         self.baseurl = "https://analysiscenter.veracode.com/api"
-        requests.Session().mount(self.baseurl, HTTPAdapter(max_retries=3))
+        self.cache = cache
+        self.index = index
+        self.builds = builds if builds is not None else BuildStates()
+        self.stats = SessionStats()
+        self.session = create_session(self.stats, pool_size, retries, backoff_factor)
+        self.backoff_factor = backoff_factor
+        self.upload_retries = upload_retries
+        self.upload_chunk_size = upload_chunk_size
+        self.upload_stats = {}
         self.proxies = proxies
-        if vid is None or vkey is None:
-            """ OK, lets try the environment variables... """
-            self.api_key_id = os.environ.get("VID")
-            self.api_key_secret = os.environ.get("VKEY")
-            if self.api_key_id is None or self.api_key_id == "" or self.api_key_secret is None or self.api_key_secret == "":
-                """ OK, try for the credentials file instead... """
-                auth_file = os.path.join(os.path.expanduser("~"), '.veracode', 'credentials')
-                if not os.path.exists(auth_file):
-                    raise VeracodeError("""Credentials not found. You can supply the credentials as command line arguments, environment variables or by configuring a veracode credentials file. See README.md for more details.""")
-                config = configparser.ConfigParser()
-                config.read(auth_file)
-                credentials_section_name = os.environ.get("VERACODE_API_PROFILE", "default")
-                self.api_key_id = config.get(credentials_section_name, "VERACODE_API_KEY_ID")
-                self.api_key_secret = config.get(credentials_section_name, "VERACODE_API_KEY_SECRET")
-                if self.api_key_id is None or self.api_key_secret is None:
-                    raise VeracodeError("Unable to get credentials from the veracode credentials file (~/.veracode/credentials)")
-        else:
-            """ use the id and key supplied as parameters """
-            self.api_key_id = vid
-            self.api_key_secret = vkey
+        self.api_key_id, self.api_key_secret = load_credentials(vid, vkey)
+        self.auth = RequestsAuthPluginVeracodeHMAC(self.api_key_id, self.api_key_secret)
 
-    def _upload_request(self, url, filename, params=None):
+    def _request(self, method, url, params=None, parse=None, output=None, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
         try:
-            files = {'file': open(filename, 'rb')}
-            r = requests.post(url, auth=RequestsAuthPluginVeracodeHMAC(self.api_key_id, self.api_key_secret),
-                             files=files, params=params, proxies=self.proxies)
-            if 200 >= r.status_code <= 299:
-                if r.content is None:
-                    logging.debug("HTTP response body empty:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
-                                  .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
-                                          r.content))
-                    raise VeracodeAPIError("HTTP response body is empty")
-                else:
-                    return r.content
-            else:
-                logging.debug("HTTP error for request:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
-                              .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
-                                      r.content))
-                raise VeracodeAPIError("HTTP error: {}".format(r.status_code))
+            r = self.session.request(method, url, auth=self.auth, params=params, proxies=self.proxies,
+                                     stream=output is not None, **kwargs)
         except requests.exceptions.RequestException as e:
             logging.exception("Connection error")
             raise VeracodeAPIError(e)
-
-    def _get_request(self, url, params=None):
-        try:
-            r = requests.get(url, auth=RequestsAuthPluginVeracodeHMAC(self.api_key_id, self.api_key_secret),
-                             params=params, proxies=self.proxies)
-            if 200 >= r.status_code <= 299:
-                if r.content is None:
-                    logging.debug("HTTP response body empty:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
-                                  .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
-                                          r.content))
-                    raise VeracodeAPIError("HTTP response body is empty")
-                else:
-                    return r.content
-            else:
-                logging.debug("HTTP error for request:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
+        finally:
+            self.stats.record_request(endpoint, time.perf_counter() - start)
+        logging.debug("{} {} took {:.3f}s ({})".format(method, endpoint, r.elapsed.total_seconds(), r.status_code))
+        if 200 <= r.status_code <= 299 and output is not None:
+            """ write the body to output a chunk at a time rather than holding all of it in memory """
+            size = 0
+            try:
+                for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    output.write(chunk)
+                    size += len(chunk)
+            except requests.exceptions.RequestException as e:
+                logging.exception("Connection error")
+                raise VeracodeAPIError(e)
+            finally:
+                r.close()
+            if size == 0:
+                raise VeracodeAPIError("HTTP response body is empty")
+            return size
+        elif 200 <= r.status_code <= 299:
+            if r.content is None:
+                logging.debug("HTTP response body empty:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
                               .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
                                       r.content))
-                raise VeracodeAPIError("HTTP error: {}".format(r.status_code))
-        except requests.exceptions.RequestException as e:
-            logging.exception("Connection error")
-            raise VeracodeAPIError(e)
-
-    def upload_file(self, app_id, filename, sandbox_id=None):
+                raise VeracodeAPIError("HTTP response body is empty")
+            elif parse is None:
+                return r.content
+            else:
+                return parse(r.content)
+        else:
+            logging.debug("HTTP error for request:\r\n{}\r\n{}\r\n{}\r\n\r\n{}\r\n{}\r\n{}\r\n"
+                          .format(r.request.url, r.request.headers, r.request.body, r.status_code, r.headers,
+                                  r.content))
+            raise VeracodeAPIStatusError(r.status_code)
+
+    def _upload_request(self, url, filename, params=None, stop=None):
+        """ stream the file from disk and retry just this file if the upload fails (unless stop has been set) """
+        attempt = 0
+        while True:
+            stream = MultipartFileStream(filename, chunk_size=self.upload_chunk_size, stop=stop)
+            try:
+                content = self._request("POST", url, params=params, data=stream,
+                                        headers={"Content-Type": stream.content_type})
+            except VeracodeAPIError as e:
+                """ a rejected file (4xx) would only be rejected again after sending all of it """
+                retryable = not isinstance(e, VeracodeAPIStatusError) or e.status == THROTTLED_STATUS or \
+                    e.status >= 500
+                if not retryable or attempt >= self.upload_retries or (stop is not None and stop.is_set()):
+                    raise
+                attempt += 1
+                delay = random.uniform(0, self.backoff_factor * (2 ** attempt))
+                logging.warning("Upload of {} failed ({}). Retrying in {:.1f}s".format(filename, e, delay))
+                time.sleep(delay)
+                continue
+            stats = stream.get_stats(time.perf_counter())
+            logging.debug("Uploaded {filename}: {bytes} bytes in {seconds}s ({bytes_per_second} B/s, "
+                          "time to first byte {time_to_first_byte}s)".format(**stats))
+            self.upload_stats[filename] = stats
+            return content
+
+    def _get_request(self, url, params=None, parse=None, cache=False, fresh=False):
+        """ with fresh, a cached response isn't used (but the new one is cached) """
+        if cache and self.cache is not None:
+            content = None if fresh else self.cache.get(self.api_key_id, url, params)
+            if content is None:
+                content = self._request("GET", url, params=params)
+                """ errors come back as HTTP 200 with an <error> body, they mustn't be served from the cache """
+                if b"<error" not in content or parse_error(content) is None:
+                    self.cache.put(self.api_key_id, url, params, content)
+            return content if parse is None else parse(content)
+        return self._request("GET", url, params=params, parse=parse)
+
+    def _created(self, created_id, endpoint):
+        """ something new was created so any cached list from endpoint is now out of date """
+        if created_id is not None and self.cache is not None:
+            self.cache.invalidate(endpoint)
+        return created_id
+
+    def _app_created(self, app_name, app_id):
+        if app_id is not None and self.index is not None:
+            self.index.add_app(app_name, app_id)
+        return self._created(app_id, "getapplist.do")
+
+    def _sandbox_created(self, app_id, sandbox_name, sandbox_id):
+        if sandbox_id is not None and self.index is not None:
+            self.index.add_sandbox(app_id, sandbox_name, sandbox_id)
+        return self._created(sandbox_id, "getsandboxlist.do")
+
+    def get_stats(self):
+        """Returns the call count and the time spent in connection handshakes vs requests."""
+        return self.stats.as_dict()
+
+    def upload_file(self, app_id, filename, sandbox_id=None, stop=None):
+        """Uploads a file to the latest build. The upload stops part way through if the stop event is set."""
         if sandbox_id is None:
-            return self._upload_request(self.baseurl + "/5.0/uploadfile.do", filename, params={"app_id": app_id})
+            params = {"app_id": app_id}
         else:
-            return self._upload_request(self.baseurl + "/5.0/uploadfile.do", filename, params={"app_id": app_id,
-                                                                                               "sandbox_id": sandbox_id})
+            params = {"app_id": app_id, "sandbox_id": sandbox_id}
+        return self._upload_request(self.baseurl + "/5.0/uploadfile.do", filename, params=params, stop=stop)
+
+    def get_file_list(self, app_id, build_id=None, sandbox_id=None, parse=None):
+        """Returns the files uploaded to a build (the latest build if no build ID is given)."""
+        params = {"app_id": app_id}
+        if build_id is not None:
+            params["build_id"] = build_id
+        if sandbox_id is not None:
+            params["sandbox_id"] = sandbox_id
+        return self._get_request(self.baseurl + "/5.0/getfilelist.do", params=params, parse=parse)
+
+    def remove_file(self, app_id, file_id, sandbox_id=None):
+        """Removes an uploaded file from the build that is in progress."""
+        params = {"app_id": app_id, "file_id": file_id}
+        if sandbox_id is not None:
+            params["sandbox_id"] = sandbox_id
+        return self._get_request(self.baseurl + "/5.0/removefile.do", params=params)
 
     def create_team(self, name, users):
         return self._get_request(self.baseurl + "/3.0/createteam.do", params={"team_name": name,
                                                                                 "user": users})
 
     def create_app(self, app_name, description, bus_crit, policy, teams):
-        app_xml = self._get_request(self.baseurl + "/5.0/createapp.do", params={"app_name": app_name,
-                                                                                "business_criticality": bus_crit,
-                                                                                "policy": policy,
-                                                                                "teams": teams})
-        app_id = re.findall('app_id="(.*?)"', str(app_xml))
-        # print(app_id)
-        return app_id[0]
-
-    def results_ready(self, app_id, build_id, sandbox_id=None):
-        if sandbox_id is None:
-            bi_xml = self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params={"app_id": app_id,
-                                                                                      "build_id": build_id})
-        else:
-            bi_xml = self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params={"app_id": app_id,
-                                                                                      "sandbox_id": sandbox_id,
-                                                                                      "build_id": build_id})
-        rr = re.findall('results_ready="true"', str(bi_xml))
-        if len(rr) == 1:
-            return True
-        else:
-            return False
+        return self._get_request(self.baseurl + "/5.0/createapp.do", params={"app_name": app_name,
+                                                                             "business_criticality": bus_crit,
+                                                                             "policy": policy,
+                                                                             "teams": teams},
+                                 parse=lambda app_xml: self._app_created(app_name, parse_app_id(app_xml)))
 
     def get_sandbox_id(self, app_id, sandbox_name):
-        sbl_xml = self._get_request(self.baseurl + "/5.0/getsandboxlist.do", params={"app_id": app_id})
-        sb_id = re.findall('sandbox_id="(.*?)" sandbox_name="' + sandbox_name + '"', str(sbl_xml))
-        if len(sb_id) == 1:
-            return sb_id[0]
-        else:
-            return None
+        """ a sandbox created since the list was cached (e.g. by another runner) is missing from it, so a miss
+            looks at the current list """
+        if self.index is None:
+            def parse(sbl_xml):
+                return parse_sandbox_id(sbl_xml, sandbox_name)
+            sandbox_id = self.get_sandbox_list(app_id, parse=parse)
+            if sandbox_id is None and self.cache is not None:
+                sandbox_id = self.get_sandbox_list(app_id, parse=parse, fresh=True)
+            return sandbox_id
+        hit = self.index.sandbox_id(app_id, sandbox_name) is not None
+        if self.index.sandboxes_need_refresh(app_id, sandbox_name):
+            self.index.set_sandboxes(app_id, self.get_sandbox_list(app_id, parse=parse_sandbox_list, fresh=not hit))
+        return self.index.sandbox_id(app_id, sandbox_name)
 
     def create_sandbox(self, app_id, sandbox_name):
-        sb_xml = self._get_request(self.baseurl + "/5.0/createsandbox.do", params={"app_id": app_id,
-                                                                                    "sandbox_name": sandbox_name})
-        sb_id = re.findall('sandbox_id="(.*?)"', str(sb_xml))
-        if len(sb_id) == 1:
-            return sb_id[0]
-        else:
-            return None
+        return self._get_request(self.baseurl + "/5.0/createsandbox.do", params={"app_id": app_id,
+                                                                                 "sandbox_name": sandbox_name},
+                                 parse=lambda sb_xml: self._sandbox_created(app_id, sandbox_name,
+                                                                            parse_created_sandbox_id(sb_xml)))
 
     def create_build(self, app_id, name, sandbox_id):
         if sandbox_id is None:
-            build_xml = self._get_request(self.baseurl + "/5.0/createbuild.do", params={"app_id": app_id,
-                                                                                        "version": name})
-        else:
-            build_xml = self._get_request(self.baseurl + "/5.0/createbuild.do", params={"app_id": app_id,
-                                                                                        "version": name,
-                                                                                        "sandbox_id": sandbox_id})
-        build_id = re.findall('build_id="(.*?)"', str(build_xml))
-        # print(build_xml)
-        if len(build_id) > 0:
-            return build_id[0]
+            params = {"app_id": app_id, "version": name}
         else:
-            err_msg = re.findall('<error>(.*?)</error>', str(build_xml))
-            if len(err_msg) > 0:
-                raise VeracodeError("Error in api.create_build(): " + err_msg[0])
-            else:
-                raise VeracodeError("Error in api.create_build(): Unknown")
+            params = {"app_id": app_id, "version": name, "sandbox_id": sandbox_id}
+        return self._get_request(self.baseurl + "/5.0/createbuild.do", params=params,
+                                 parse=lambda build_xml: self._created(parse_created_build_id(build_xml),
+                                                                       "getbuildlist.do"))
 
     def begin_prescan(self, app_id, auto_scan, sandbox_id=None):
         if sandbox_id is None:
@@ -174,134 +345,120 @@ class VeracodeAPI:
             parameters["build_id"] = str(build_id)
         if sandbox_id is not None:
             parameters["sandbox_id"] = str(sandbox_id)
-        prescan_xml = self._get_request(self.baseurl + "/5.0/getprescanresults.do", params=parameters)
-        if b"<error>" in prescan_xml:
-            return None
-        else:
-            ns = {'vc': 'https://analysiscenter.veracode.com/schema/2.0/prescanresults'}
-            root = ET.fromstring(prescan_xml)
-            find_modules_query = "./vc:module[@has_fatal_errors='false']"
-            module_nodes = root.findall(find_modules_query, ns)
-            retval = {}
-            for module_node in module_nodes:
-                retval[module_node.attrib.get("name")] = module_node.attrib.get("id")
-            return retval
+        return self._get_request(self.baseurl + "/5.0/getprescanresults.do", params=parameters, parse=parse_modules)
 
     def results_ready(self, app_id, build_id, sandbox_id=None):
         """ Returns boolean for whether or not the build has results ready."""
         if sandbox_id is None:
-            build_info_xml =  self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params={"app_id": app_id,
-                                                                                               "build_id": build_id})
-        else:
-            build_info_xml = self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params={"app_id": app_id,
-                                                                                              "build_id": build_id,
-                                                                                              "sandbox_id": sandbox_id})
-        #print(str(build_info_xml))
-        #x = re.search('results_ready="true"', str(build_info_xml))
-        #print("x is " + x)
-        if re.search('results_ready="true"', str(build_info_xml)) is None:
-            return False
+            params = {"app_id": app_id, "build_id": build_id}
         else:
-            return True
+            params = {"app_id": app_id, "build_id": build_id, "sandbox_id": sandbox_id}
+        return self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params=params, parse=parse_results_ready)
 
     def add_comment(self, build_id, flaw_id, comment):
-        return self._get_request(self.baseurl + "/updatemitigationinfo.do", params={"build_id": build_id,
-                                                                                "action": "comment",
-                                                                                "comment": comment,
-                                                                                "flaw_id_list": flaw_id})
+        """Adds the comment to a flaw, or to every flaw in a list of flaw IDs with one call."""
+        if isinstance(flaw_id, (list, tuple)):
+            flaw_id = ",".join(str(issue_id) for issue_id in flaw_id)
+        """ posted as a form, a long flaw_id_list and comment could be too much for a URL """
+        content = self._request("POST", self.baseurl + "/updatemitigationinfo.do",
+                                data={"build_id": build_id, "action": "comment", "comment": comment,
+                                      "flaw_id_list": flaw_id})
+        error = parse_error(content)
+        if error is not None:
+            raise VeracodeAPIResponseError("Unable to add the comment: " + error)
+        return content
 
     def get_latest_published_build_id(self, app_id, sandbox_id=None):
-        if sandbox_id is None:
-            build_list_xml = self._get_request(self.baseurl + "/5.0/getbuildlist.do", params={"app_id": app_id})
-        else:
-            build_list_xml = self._get_request(self.baseurl + "/5.0/getbuildlist.do", params={"app_id": app_id,
-                                                                                              "sandbox_id": sandbox_id})
-        #print(str(build_list_xml))
-        build_ids = re.findall('build_id="(.*?)"', str(build_list_xml))
-        #print(build_ids)
-
-        i = len(build_ids) - 1
-        build_id = None
-        while build_id is None:
-            test = str(build_ids[i])
-            if self.results_ready(app_id, test, sandbox_id):
-                build_id = test
-            else:
-                i = i - 1
+        """Returns the latest build with results ready, or None. Usually this is just the getbuildlist.do call (plus
+        one getappbuilds.do call when there are new builds), getbuildinfo.do is only called for builds that
+        getappbuilds.do didn't report."""
+        build_ids = self.get_build_list(app_id, sandbox_id, parse=parse_build_ids)
+        build_id, unknown = self.builds.latest(build_ids)
+        if len(unknown) > 0:
+            self.builds.update(self.get_app_builds(self.builds.changed_since, parse=parse_app_builds))
+            build_id, unknown = self.builds.latest(build_ids)
+        for test in unknown:
+            ready = self.results_ready(app_id, test, sandbox_id)
+            self.builds.set_ready(test, ready)
+            if ready:
+                return test
         return build_id
 
     def get_latest_build_id(self, app_id, sandbox_id=None):
-        if sandbox_id is None:
-            build_list_xml = self._get_request(self.baseurl + "/5.0/getbuildlist.do", params={"app_id": app_id})
-        else:
-            build_list_xml = self._get_request(self.baseurl + "/5.0/getbuildlist.do", params={"app_id": app_id,
-                                                                                              "sandbox_id": sandbox_id})
-        build_ids = re.findall('build_id="(.*?)"', str(build_list_xml))
-
-        i = len(build_ids) - 1
-        return str(build_ids[i])
-
-
+        return self.get_build_list(app_id, sandbox_id, parse=lambda build_list_xml: parse_build_ids(build_list_xml)[-1])
 
-    def get_app_list(self):
+    def get_app_list(self, parse=None, fresh=False):
         """Returns all application profiles."""
-        return self._get_request(self.baseurl + "/5.0/getapplist.do")
+        return self._get_request(self.baseurl + "/5.0/getapplist.do", parse=parse, cache=True, fresh=fresh)
 
     def get_app_id_by_name(self, app_name):
         """Returns an app_id for the given app_name or None if it isn't found"""
-        latest_app_profiles_xml = self.get_app_list()
-        ns = {'vc': 'https://analysiscenter.veracode.com/schema/2.0/applist'}
-        root = ET.fromstring(latest_app_profiles_xml)
-        find_app_id_query = "./vc:app[@app_name='" + app_name + "']"
-        app_node = root.findall(find_app_id_query, ns)
-        if len(app_node) == 1:
-            app_id = app_node[0].attrib.get("app_id")
-        else:
-            app_id = None
-        return app_id
-
-    def get_app_builds(self, report_changed_since):
-        """Returns all builds."""
-        return self._get_request(self.baseurl + "/4.0/getappbuilds.do", params={"only_latest": False,
-                                                                                "include_in_progress": True,
-                                                                                "report_changed_since": report_changed_since})
+        if self.index is None:
+            """ as for sandboxes, a miss looks at the current list rather than the cached one """
+            def parse(app_list_xml):
+                return parse_app_id_by_name(app_list_xml, app_name)
+            app_id = self.get_app_list(parse=parse)
+            if app_id is None and self.cache is not None:
+                app_id = self.get_app_list(parse=parse, fresh=True)
+            return app_id
+        hit = self.index.app_id(app_name) is not None
+        if self.index.apps_need_refresh(app_name):
+            self.index.set_apps(self.get_app_list(parse=parse_app_names, fresh=not hit))
+        return self.index.app_id(app_name)
+
+    def get_app_builds(self, report_changed_since=None, parse=None):
+        """Returns all builds (whose report changed since the given mm/dd/yyyy date)."""
+        params = {"only_latest": False, "include_in_progress": True}
+        if report_changed_since is not None:
+            params["report_changed_since"] = report_changed_since
+        return self._get_request(self.baseurl + "/4.0/getappbuilds.do", params=params, parse=parse)
 
 
     def get_app_info(self, app_id):
         """Returns application profile info for a given app ID."""
         return self._get_request(self.baseurl + "/5.0/getappinfo.do", params={"app_id": app_id})
 
-    def get_sandbox_list(self, app_id):
+    def get_sandbox_list(self, app_id, parse=None, fresh=False):
         """Returns a list of sandboxes for a given app ID"""
-        return self._get_request(self.baseurl + "/5.0/getsandboxlist.do", params={"app_id": app_id})
+        return self._get_request(self.baseurl + "/5.0/getsandboxlist.do", params={"app_id": app_id}, parse=parse,
+                                 cache=True, fresh=fresh)
 
-    def get_build_list(self, app_id, sandbox_id=None):
+    def get_build_list(self, app_id, sandbox_id=None, parse=None):
         """Returns all builds for a given app ID."""
         if sandbox_id is None:
             params = {"app_id": app_id}
         else:
             params = {"app_id": app_id, "sandbox_id": sandbox_id}
-        return self._get_request(self.baseurl + "/5.0/getbuildlist.do", params=params)
+        return self._get_request(self.baseurl + "/5.0/getbuildlist.do", params=params, parse=parse, cache=True)
 
-    def get_build_info(self, app_id, build_id, sandbox_id=None):
+    def get_build_info(self, app_id, build_id, sandbox_id=None, parse=None):
         """Returns build info for a given build ID."""
         if sandbox_id is None:
             params = {"app_id": app_id, "build_id": build_id}
         else:
             params = {"app_id": app_id, "build_id": build_id, "sandbox_id": sandbox_id}
-        return self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params=params)
+        return self._get_request(self.baseurl + "/5.0/getbuildinfo.do", params=params, parse=parse)
+
+    def get_build_status(self, app_id, build_id, sandbox_id=None):
+        """Returns the Build record (results_ready, status, etc.) for a given build ID."""
+        return self.get_build_info(app_id, build_id, sandbox_id, parse=parse_build)
 
     def get_detailed_report(self, build_id):
         """Returns a detailed report for a given build ID."""
         return self._get_request(self.baseurl + "/5.0/detailedreport.do", params={"build_id": build_id})
 
+    def download_detailed_report(self, build_id, output):
+        """Writes the detailed report for a given build ID to a binary file and returns its size."""
+        return self._request("GET", self.baseurl + "/5.0/detailedreport.do", params={"build_id": build_id},
+                             output=output)
+
     def get_policy_list(self):
         """Returns all policies."""
-        return self._get_request(self.baseurl + "/5.0/getpolicylist.do")
+        return self._get_request(self.baseurl + "/5.0/getpolicylist.do", cache=True)
 
     def get_user_list(self):
         """Returns all user accounts."""
-        return self._get_request(self.baseurl + "/5.0/getuserlist.do")
+        return self._get_request(self.baseurl + "/5.0/getuserlist.do", cache=True)
 
     def get_user_info(self, username):
         """Returns user info for a given username."""
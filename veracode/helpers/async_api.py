@@ -0,0 +1,182 @@
+# Purpose:  Asynchronous API utilities
+#
+# Notes:    AsyncVeracodeAPI has the same method surface as VeracodeAPI but every method is a coroutine, so a
+#           service can fan out hundreds of calls at once (e.g. getbuildlist.do for every app profile). The
+#           number of calls in flight is capped by max_concurrency. Use it as an async context manager:
+#
+#           async with AsyncVeracodeAPI(None, vid, vkey) as api:
+#               build_lists = await api.map(api.get_build_list, app_ids)
+#
+#           The methods are inherited from VeracodeAPI, so _request() and _upload_request() take the same
+#           arguments as VeracodeAPI's. A method that looks at the response itself (add_comment) is overridden.
+
+import asyncio
+import logging
+import os
+import random
+import time
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+import aiohttp
+from yarl import URL
+from veracode_api_signing.veracode_hmac_auth import generate_veracode_hmac_header
+from helpers.api import DOWNLOAD_CHUNK_SIZE
+from helpers.api import VeracodeAPI
+from helpers.api import load_credentials
+from helpers.api import parse_app_builds
+from helpers.api import parse_build_ids
+from helpers.builds import BuildStates
+from helpers.exceptions import UploadCancelledError
+from helpers.exceptions import VeracodeAPIError
+from helpers.exceptions import VeracodeAPIResponseError
+from helpers.exceptions import VeracodeAPIStatusError
+from helpers.records import parse_error
+from helpers.session import RETRY_STATUSES
+from helpers.session import SessionStats
+
+
+class AsyncVeracodeAPI(VeracodeAPI):
+    def __init__(self, proxies=None, vid=None, vkey=None, max_concurrency=50, retries=5, backoff_factor=0.5,
+                 builds=None):
+        self.baseurl = "https://analysiscenter.veracode.com/api"
+        self.stats = SessionStats()
+        self.cache = None
+        self.index = None
+        self.builds = builds if builds is not None else BuildStates()
+        self.app_builds = None
+        self.proxy = None if proxies is None else proxies.get("https")
+        self.api_key_id, self.api_key_secret = load_credentials(vid, vkey)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(self._on_connect_start)
+        trace_config.on_connection_create_end.append(self._on_connect_end)
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                                             trace_configs=[trace_config])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    async def _on_connect_start(self, session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def _on_connect_end(self, session, context, params):
+        self.stats.record_connect(time.perf_counter() - context.connect_start)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after)
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    def _sign(self, method, url):
+        parsed = urlparse(url)
+        path = parsed.path if parsed.query == "" else parsed.path + "?" + parsed.query
+        return generate_veracode_hmac_header(parsed.hostname, path, method, self.api_key_id, self.api_key_secret)
+
+    async def _request(self, method, url, params=None, parse=None, output=None, data=None, headers=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        if params:
+            url = url + "?" + urlencode(params)
+        """ only GETs are retried, an upload body can't be replayed """
+        retries = self.retries if method == "GET" else 0
+        size = 0
+        async with self.semaphore:
+            for attempt in range(retries + 1):
+                """ sign every attempt, the signature includes a timestamp and nonce """
+                request_headers = dict(headers or {}, Authorization=self._sign(method, url))
+                start = time.perf_counter()
+                try:
+                    async with self.session.request(method, URL(url, encoded=True), headers=request_headers,
+                                                    data=data, proxy=self.proxy) as r:
+                        status = r.status
+                        retry_after = r.headers.get("Retry-After")
+                        if output is not None and 200 <= status <= 299:
+                            """ written a chunk at a time like VeracodeAPI._request(), so not retried once started """
+                            content = None
+                            try:
+                                async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                                    output.write(chunk)
+                                    size += len(chunk)
+                            except aiohttp.ClientError as e:
+                                logging.exception("Connection error")
+                                raise VeracodeAPIError(e)
+                        else:
+                            content = await r.read()
+                except aiohttp.ClientError as e:
+                    if attempt < retries:
+                        await asyncio.sleep(self._backoff(attempt))
+                        continue
+                    logging.exception("Connection error")
+                    raise VeracodeAPIError(e)
+                finally:
+                    self.stats.record_request(endpoint, time.perf_counter() - start)
+                if status in RETRY_STATUSES and attempt < retries:
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+                    continue
+                break
+        logging.debug("{} {} ({})".format(method, endpoint, status))
+        if 200 <= status <= 299 and output is not None:
+            if size == 0:
+                raise VeracodeAPIError("HTTP response body is empty")
+            return size
+        elif 200 <= status <= 299:
+            if content is None:
+                raise VeracodeAPIError("HTTP response body is empty")
+            elif parse is None:
+                return content
+            else:
+                return parse(content)
+        else:
+            logging.debug("HTTP error for request:\r\n{}\r\n\r\n{}\r\n{}\r\n".format(url, status, content))
+            raise VeracodeAPIStatusError(status)
+
+    async def _upload_request(self, url, filename, params=None, stop=None):
+        """ the form is sent in one go, so the stop event is only checked before the upload starts """
+        if stop is not None and stop.is_set():
+            raise UploadCancelledError("Upload of '" + filename + "' stopped")
+        with open(filename, 'rb') as f:
+            data = aiohttp.FormData()
+            data.add_field('file', f, filename=os.path.basename(filename))
+            return await self._request("POST", url, params=params, data=data)
+
+    async def add_comment(self, build_id, flaw_id, comment):
+        if isinstance(flaw_id, (list, tuple)):
+            flaw_id = ",".join(str(issue_id) for issue_id in flaw_id)
+        content = await self._request("POST", self.baseurl + "/updatemitigationinfo.do",
+                                      data={"build_id": build_id, "action": "comment", "comment": comment,
+                                            "flaw_id_list": flaw_id})
+        error = parse_error(content)
+        if error is not None:
+            raise VeracodeAPIResponseError("Unable to add the comment: " + error)
+        return content
+
+    async def get_latest_published_build_id(self, app_id, sandbox_id=None):
+        build_ids = await self.get_build_list(app_id, sandbox_id, parse=parse_build_ids)
+        build_id, unknown = self.builds.latest(build_ids)
+        if len(unknown) > 0:
+            """ concurrent lookups share a single getappbuilds.do call """
+            if self.app_builds is None:
+                self.app_builds = asyncio.ensure_future(self.get_app_builds(self.builds.changed_since,
+                                                                            parse=parse_app_builds))
+                self.builds.update(await self.app_builds)
+            else:
+                await self.app_builds
+            build_id, unknown = self.builds.latest(build_ids)
+        for test in unknown:
+            ready = await self.results_ready(app_id, test, sandbox_id)
+            self.builds.set_ready(test, ready)
+            if ready:
+                return test
+        return build_id
+
+    async def map(self, func, items):
+        """Calls func for every item concurrently (bounded by max_concurrency) and returns the results in order."""
+        return await asyncio.gather(*[func(item) for item in items])
@@ -0,0 +1,77 @@
+# Purpose:  Build state cache
+#
+# Notes:    Finding the latest published build used to mean a getbuildinfo.do call for every build in the list
+#           until one had results ready. BuildStates remembers which builds have results ready so that most
+#           lookups need no status calls at all. Once a build's results are ready they stay ready, so those
+#           states are kept in ~/.veracode/builds-<user>.json and never expire. Builds that aren't ready yet
+#           are only remembered for the current run.
+#
+#           The states are refreshed in bulk from getappbuilds.do, asking only for the builds whose report
+#           changed since the last refresh (report_changed_since has a granularity of a day, so one day of
+#           overlap is kept to allow for time zones).
+
+import datetime
+import hashlib
+from helpers.store import JSONStore
+from helpers.store import veracode_path
+
+
+READY_STATUS = "Results Ready"
+
+
+def is_ready(build):
+    """Returns True if a Build record says its results are ready."""
+    if build.results_ready is not None:
+        return build.results_ready
+    return build.status == READY_STATUS
+
+
+class BuildStates:
+    def __init__(self, api_key_id=None, path=None):
+        """ with neither an API ID nor a path the states are only kept in memory """
+        if path is None and api_key_id is not None:
+            user = hashlib.sha256(str(api_key_id).encode("utf-8")).hexdigest()[:16]
+            path = veracode_path("builds-" + user + ".json")
+        self.store = None if path is None else JSONStore(path)
+        data = {} if self.store is None else self.store.load()
+        self.ready = set(data.get("ready", []))
+        self.changed_since = data.get("changed_since")
+        self.not_ready = set()
+
+    def save(self):
+        if self.store is not None:
+            self.store.save({"ready": sorted(self.ready), "changed_since": self.changed_since})
+
+    def latest(self, build_ids):
+        """Returns (build_id, unknown) where build_id is the latest build known to be ready (or None) and unknown
+        lists the newer builds whose state isn't known, newest first. build_ids must be oldest first."""
+        unknown = []
+        for build_id in reversed(build_ids):
+            if build_id in self.ready:
+                return build_id, unknown
+            if build_id not in self.not_ready:
+                unknown.append(build_id)
+        return None, unknown
+
+    def set_ready(self, build_id, ready):
+        if ready:
+            self.not_ready.discard(build_id)
+            if build_id not in self.ready:
+                self.ready.add(build_id)
+                self.save()
+        else:
+            self.not_ready.add(build_id)
+
+    def update(self, builds, advance=True):
+        """Records the states of the Build records from a getappbuilds.do response. Only a response for every
+        build changed since changed_since should advance it."""
+        for build in builds:
+            if is_ready(build):
+                self.ready.add(build.build_id)
+                self.not_ready.discard(build.build_id)
+            else:
+                self.not_ready.add(build.build_id)
+        if advance:
+            yesterday = datetime.date.today() - datetime.timedelta(days=1)
+            self.changed_since = yesterday.strftime("%m/%d/%Y")
+        self.save()
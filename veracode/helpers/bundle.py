@@ -0,0 +1,75 @@
+# Purpose:  Upload bundling
+#
+# Notes:    Upload patterns such as "**/**" can match thousands of small source files and every one of them
+#           would otherwise be a separate uploadfile.do round trip. bundle_files() packs the small files into
+#           a few zip archives instead. Each archive is written by its own thread (zlib releases the GIL while
+#           it deflates) and files are streamed into the archive in chunks, so memory use stays bounded by
+#           the number of threads rather than the size of the files. Files that are already big (or already
+#           compressed) are left alone and uploaded as they are.
+
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+BUNDLE_THRESHOLD = 1024 * 1024
+BUNDLE_MAX_ARCHIVE_SIZE = 200 * 1024 * 1024
+BUNDLE_WORKERS = 4
+BUNDLE_CHUNK_SIZE = 256 * 1024
+COMPRESSED_EXTENSIONS = (".zip", ".jar", ".war", ".ear", ".apk", ".ipa", ".gz", ".tgz", ".7z")
+
+
+def _partition(filenames, max_archive_size, archives):
+    """Splits the files into at least 'archives' groups of no more than max_archive_size (uncompressed) bytes."""
+    groups = []
+    sizes = []
+    for filename in sorted(filenames, key=os.path.getsize, reverse=True):
+        size = os.path.getsize(filename)
+        """ put the file in the emptiest group that has room for it """
+        candidates = [i for i in range(len(groups)) if sizes[i] + size <= max_archive_size]
+        if len(groups) < archives or len(candidates) == 0:
+            groups.append([filename])
+            sizes.append(size)
+        else:
+            i = min(candidates, key=lambda c: sizes[c])
+            groups[i].append(filename)
+            sizes[i] += size
+    return groups
+
+
+def _write_archive(path, filenames, chunk_size):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename in filenames:
+            info = zipfile.ZipInfo.from_file(filename, os.path.relpath(filename))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(filename, "rb") as source, archive.open(info, "w", force_zip64=True) as target:
+                chunk = source.read(chunk_size)
+                while chunk:
+                    target.write(chunk)
+                    chunk = source.read(chunk_size)
+    return path
+
+
+def bundle_files(filenames, out_dir=None, threshold=BUNDLE_THRESHOLD, max_archive_size=BUNDLE_MAX_ARCHIVE_SIZE,
+                 workers=BUNDLE_WORKERS, chunk_size=BUNDLE_CHUNK_SIZE):
+    """Returns (archives, unbundled). Files smaller than threshold are packed into zip archives in out_dir
+    (a new temporary directory if not given); the rest are returned unchanged in unbundled."""
+    small = []
+    unbundled = []
+    for filename in filenames:
+        if os.path.getsize(filename) < threshold and not filename.lower().endswith(COMPRESSED_EXTENSIONS):
+            small.append(filename)
+        else:
+            unbundled.append(filename)
+    """ bundling a single file gains nothing """
+    if len(small) < 2:
+        return [], unbundled + small
+    if out_dir is None:
+        out_dir = tempfile.mkdtemp(prefix="veracode-bundle-")
+    groups = _partition(small, max_archive_size, workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_write_archive, os.path.join(out_dir, "veracode-bundle-" + str(i + 1) + ".zip"),
+                                   group, chunk_size) for i, group in enumerate(groups)]
+        archives = [future.result() for future in futures]
+    return archives, unbundled
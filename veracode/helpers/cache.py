@@ -0,0 +1,97 @@
+# Purpose:  API response cache
+#
+# Notes:    Responses from the read-only list endpoints are cached under ~/.veracode/cache so that repeated
+#           CLI invocations in the same pipeline don't keep downloading the same (often multi-MB) XML. Each
+#           endpoint has its own time to live. The cache is bounded in size and the least recently used
+#           entries are evicted first.
+#
+#           One file per entry: its mtime is when it was fetched (for the TTL) and its atime is when it was
+#           last used (for LRU, set explicitly so it works on noatime mounts). Entries are written with an
+#           atomic rename, so concurrent CLI processes can share the cache safely.
+
+import hashlib
+import json
+import os
+import time
+from helpers.store import atomic_write
+from helpers.store import VERACODE_HOME
+
+
+CACHE_TTLS = {"getapplist.do": 3600,
+              "getsandboxlist.do": 300,
+              "getbuildlist.do": 60,
+              "getpolicylist.do": 3600,
+              "getuserlist.do": 3600}
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResponseCache:
+    def __init__(self, path=None, ttls=None, max_bytes=CACHE_MAX_BYTES, refresh=False):
+        self.path = path if path is not None else os.path.join(VERACODE_HOME, "cache", "responses")
+        os.makedirs(self.path, exist_ok=True)
+        self.ttls = ttls if ttls is not None else CACHE_TTLS
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+
+    def _entry_path(self, api_key_id, url, params):
+        endpoint = url.rsplit("/", 1)[-1]
+        """ the key includes the API ID so that different users never share responses """
+        key = json.dumps([api_key_id, url, sorted((str(k), str(v)) for k, v in (params or {}).items())])
+        return os.path.join(self.path, endpoint + "-" + hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def ttl(self, url):
+        return self.ttls.get(url.rsplit("/", 1)[-1])
+
+    def get(self, api_key_id, url, params=None):
+        """Returns the cached response or None if there isn't a fresh one."""
+        ttl = self.ttl(url)
+        if ttl is None or self.refresh:
+            return None
+        path = self._entry_path(api_key_id, url, params)
+        try:
+            fetched = os.stat(path).st_mtime
+            if time.time() - fetched > ttl:
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path, (time.time(), fetched))
+        except OSError:
+            return None
+        return content
+
+    def put(self, api_key_id, url, params, content):
+        if self.ttl(url) is None:
+            return
+        atomic_write(self._entry_path(api_key_id, url, params), content)
+        self.evict()
+
+    def invalidate(self, endpoint):
+        """Removes every cached response for the endpoint (e.g. after something has been created)."""
+        for name in os.listdir(self.path):
+            if name.startswith(endpoint + "-"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is within max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if name.startswith(".tmp-"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, name))
+            total += stat.st_size
+        for atime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
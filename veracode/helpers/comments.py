@@ -0,0 +1,134 @@
+# Purpose:  Batched flaw comments
+#
+# Notes:    updatemitigationinfo.do adds one comment to every flaw in its flaw_id_list, so flaws that get the
+#           same comment are sent in batches rather than with a call per flaw:
+#
+#           add()           the same comment on many flaws of a build, batched by build and comment
+#           add_issue_key() the key of a new ticket, as an issue_key_comment() on just that flaw (or, with
+#                           shared_issue_keys, batched by build into one issue_keys_comment() per batch)
+#
+#           A batch holds at most batch_size flaws and, for shared issue keys, a comment of at most max_length
+#           characters. The batches are sent on a small pool of threads. A batch whose call fails is retried (with
+#           a jittered backoff) and only reported as failed once the retries have run out. An <error> response
+#           (e.g. an unknown flaw id) won't go away on a retry, so that batch is split in half instead and each
+#           half sent on its own, until only the flaws that fail are left.
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from helpers.exceptions import VeracodeAPIError
+from helpers.exceptions import VeracodeAPIResponseError
+from helpers.tickets import issue_key_comment
+from helpers.tickets import issue_keys_comment
+
+
+COMMENT_BATCH_SIZE = 100
+COMMENT_MAX_LENGTH = 2000
+COMMENT_WORKERS = 4
+
+
+class CommentBatcher:
+    def __init__(self, api, ticket_type="JIRA", batch_size=COMMENT_BATCH_SIZE, max_length=COMMENT_MAX_LENGTH,
+                 retries=3, backoff_factor=0.5, shared_issue_keys=False, workers=COMMENT_WORKERS):
+        self.api = api
+        self.ticket_type = ticket_type
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.shared_issue_keys = shared_issue_keys
+        self.workers = workers
+        """ (build_id, comment) to issue ids, and build_id to a dict of issue_id to issue key """
+        self.comments = {}
+        self.issue_keys = {}
+        self.summary = {"calls": 0, "flaws": 0, "errors": []}
+        self.lock = threading.Lock()
+
+    def add(self, build_id, issue_id, comment):
+        self.comments.setdefault((str(build_id), comment), []).append(str(issue_id))
+
+    def add_issue_key(self, build_id, issue_id, issue_key):
+        if self.shared_issue_keys:
+            self.issue_keys.setdefault(str(build_id), {})[str(issue_id)] = issue_key
+        else:
+            self.add(build_id, issue_id, issue_key_comment(self.ticket_type, issue_key))
+
+    def batches(self):
+        """Yields (build_id, issue_ids, comment) for everything added since the last flush."""
+        for (build_id, comment), issue_ids in self.comments.items():
+            for i in range(0, len(issue_ids), self.batch_size):
+                yield build_id, issue_ids[i:i + self.batch_size], comment
+        for build_id, issue_keys in self.issue_keys.items():
+            batch = {}
+            length = len(issue_keys_comment(self.ticket_type, {}))
+            for issue_id, issue_key in issue_keys.items():
+                entry = len(issue_id) + len(issue_key) + 2
+                if len(batch) > 0 and (len(batch) >= self.batch_size or length + entry > self.max_length):
+                    yield build_id, list(batch), issue_keys_comment(self.ticket_type, batch)
+                    batch = {}
+                    length = len(issue_keys_comment(self.ticket_type, {}))
+                batch[issue_id] = issue_key
+                length += entry
+            if len(batch) > 0:
+                yield build_id, list(batch), issue_keys_comment(self.ticket_type, batch)
+
+    def send(self, build_id, issue_ids, comment):
+        attempt = 0
+        while True:
+            with self.lock:
+                self.summary["calls"] += 1
+            try:
+                self.api.add_comment(build_id, issue_ids, comment)
+                return
+            except VeracodeAPIResponseError:
+                raise
+            except VeracodeAPIError:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = random.uniform(0, self.backoff_factor * (2 ** attempt))
+                logging.warning("Comment on {} flaws of build {} failed. Retrying in {:.1f}s"
+                                .format(len(issue_ids), build_id, delay))
+                time.sleep(delay)
+
+    def send_batch(self, build_id, issue_ids, comment):
+        """ send a batch, splitting it in half for as long as the API rejects it """
+        try:
+            self.send(build_id, issue_ids, comment)
+            return len(issue_ids), []
+        except VeracodeAPIResponseError as err:
+            if len(issue_ids) == 1:
+                return 0, [(issue_ids, err)]
+        except VeracodeAPIError as err:
+            return 0, [(issue_ids, err)]
+        """ a shared issue keys comment names the flaws of its batch, so each half gets its own """
+        keys = None
+        if self.shared_issue_keys and comment.startswith(issue_keys_comment(self.ticket_type, {})):
+            keys = self.issue_keys[build_id]
+        half = len(issue_ids) // 2
+        done, errors = 0, []
+        for part in (issue_ids[:half], issue_ids[half:]):
+            part_comment = comment if keys is None else \
+                issue_keys_comment(self.ticket_type, {issue_id: keys[issue_id] for issue_id in part})
+            part_done, part_errors = self.send_batch(build_id, part, part_comment)
+            done += part_done
+            errors.extend(part_errors)
+        return done, errors
+
+    def flush(self):
+        """Sends the batched comments and returns the summary (calls made, flaws commented and errors)."""
+        batches = list(self.batches())
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches)))) as executor:
+            sent = [(build_id, executor.submit(self.send_batch, build_id, issue_ids, comment))
+                    for build_id, issue_ids, comment in batches]
+            for build_id, future in sent:
+                done, errors = future.result()
+                self.summary["flaws"] += done
+                for issue_ids, err in errors:
+                    self.summary["errors"].append({"type": "comment", "build_id": build_id, "issueids": issue_ids,
+                                                   "error": str(err)})
+        self.comments = {}
+        self.issue_keys = {}
+        return self.summary
@@ -0,0 +1,81 @@
+# Purpose:  Build to build flaw diff
+#
+# Notes:    Compares the flaws of two builds (a base, e.g. the latest policy scan, and a head, e.g. the sandbox
+#           scan of a pull request) taken from the local results store (or straight from their reports, with
+#           --no-cache), so a gate can look at just the flaws a change introduced. Flaws are matched with a hash
+#           join, first on issue id and then, for the flaws left over, on a fingerprint of where the flaw is (CWE,
+#           source file, function and call). Issue ids are stable within an app, the fingerprint catches the same
+#           flaw reported under a new issue id.
+#
+#           new         open in the head and not in the base
+#           fixed       open in the base and fixed (or missing) in the head
+#           reopened    open in the head and fixed in the base (or marked as reopened)
+#           unchanged   open in both
+
+import hashlib
+from helpers.report_parser import CLOSED_STATUSES
+
+
+FINGERPRINT_KEYS = ("cwe_id", "sourcefile_path", "sourcefile", "function_prototype", "type", "scope")
+
+
+def fingerprint(values):
+    """Returns the fingerprint of a flaw from its FINGERPRINT_KEYS values (module names often carry a version,
+    so the module isn't part of it)."""
+    key = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def flaw_states(results):
+    """Returns (issue_id, remediation_status, fingerprint) for the flaws of parsed results, as
+    ResultsStore.flaw_states() does for a stored build."""
+    return [(str(issue_id), flaw["remediation_status"], fingerprint([flaw[key] for key in FINGERPRINT_KEYS]))
+            for issue_id, flaw in results.get("flaws", {}).items()]
+
+
+def _is_open(status):
+    return status not in CLOSED_STATUSES
+
+
+def diff_flaws(base, head):
+    """Returns a dict of new, fixed, reopened and unchanged issue ids (of the head build, or of the base build for
+    flaws that are missing from the head). base and head are iterables of (issue_id, remediation_status,
+    fingerprint)."""
+    by_issue = {}
+    by_fingerprint = {}
+    for issue_id, status, print_ in base:
+        by_issue[issue_id] = (status, print_)
+        by_fingerprint.setdefault(print_, []).append(issue_id)
+    diff = {"new": [], "fixed": [], "reopened": [], "unchanged": []}
+    matched = set()
+    unmatched = []
+    for flaw in head:
+        issue_id = flaw[0]
+        if issue_id in by_issue:
+            matched.add(issue_id)
+            _classify(diff, flaw, by_issue[issue_id][0])
+        else:
+            unmatched.append(flaw)
+    """ the same flaw under a new issue id, each base flaw is matched at most once """
+    for flaw in unmatched:
+        candidates = [issue_id for issue_id in by_fingerprint.get(flaw[2], []) if issue_id not in matched]
+        if len(candidates) > 0:
+            matched.add(candidates[0])
+            _classify(diff, flaw, by_issue[candidates[0]][0])
+        elif _is_open(flaw[1]):
+            diff["new"].append(flaw[0])
+    for issue_id, (status, print_) in by_issue.items():
+        if issue_id not in matched and _is_open(status):
+            diff["fixed"].append(issue_id)
+    return diff
+
+
+def _classify(diff, flaw, base_status):
+    issue_id, status = flaw[0], flaw[1]
+    if not _is_open(status):
+        if _is_open(base_status):
+            diff["fixed"].append(issue_id)
+    elif not _is_open(base_status) or (status == "Reopened" and base_status != "Reopened"):
+        diff["reopened"].append(issue_id)
+    else:
+        diff["unchanged"].append(issue_id)
@@ -9,3 +9,25 @@ class VeracodeError(Exception):
 class VeracodeAPIError(Exception):
     """Raised when something goes wrong with talking to the Veracode API"""
     pass
+
+
+class TicketingError(Exception):
+    """Raised when something goes wrong with talking to a ticketing system"""
+    pass
+
+
+class VeracodeAPIResponseError(VeracodeAPIError):
+    """Raised when the Veracode API returns an <error> response"""
+    pass
+
+
+class UploadCancelledError(VeracodeError):
+    """Raised when an upload is stopped because another upload of the same build failed"""
+    pass
+
+
+class VeracodeAPIStatusError(VeracodeAPIError):
+    """Raised when the Veracode API responds with an HTTP error status"""
+    def __init__(self, status):
+        super().__init__("HTTP error: {}".format(status))
+        self.status = status
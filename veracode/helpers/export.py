@@ -0,0 +1,137 @@
+# Purpose:  Columnar results export
+#
+# Notes:    Writes the flaws of parsed results as columns, so they can be loaded straight into a dataframe
+#           rather than by walking the nested JSON output. Two formats are supported:
+#
+#           .parquet    one row per flaw, string columns dictionary encoded
+#           .npz        a "flaws" structured array of numbers, with each string column stored as integer codes
+#                       into a "<column>_values" array
+#
+#           numpy (and pyarrow for .parquet) are optional dependencies, they are only imported when an export
+#           is asked for.
+#           summarize() counts the flaws by severity, CWE, module and file over the same columns.
+
+import os
+from helpers.exceptions import VeracodeError
+
+
+""" (column, flaw key) of the numeric columns """
+NUMERIC_COLUMNS = (("issue_id", None),
+                   ("severity", "severity"),
+                   ("cwe_id", "cwe_id"),
+                   ("category_id", "category_id"),
+                   ("exploit_level", "exploit_level"),
+                   ("remediation_effort", "remediation_effort"))
+""" (column, flaw key) of the string columns """
+STRING_COLUMNS = (("module", "module"),
+                  ("sourcefile", "sourcefile"),
+                  ("sourcefile_path", "sourcefile_path"),
+                  ("type", "type"),
+                  ("function_prototype", "function_prototype"),
+                  ("remediation_status", "remediation_status"),
+                  ("mitigation_status", "mitigation_status"),
+                  ("affects_policy_compliance", "affects_policy_compliance"),
+                  ("date_first_occurrence", "date_first_occurrence"),
+                  ("grace_period_expires", "grace_period_expires"))
+""" the columns summarize() counts by, and the name of each summary """
+SUMMARY_COLUMNS = (("severity", "severity"),
+                   ("cwe", "cwe_id"),
+                   ("module", "module"),
+                   ("file", "sourcefile"))
+
+
+def _import(module, purpose):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise VeracodeError(f'{purpose} needs the {module} package (pip install {module})')
+
+
+def _number(value):
+    """ missing and non numeric values are -1 """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+class FlawColumns:
+    """The flaws of parsed results as columns: numeric columns are numpy arrays and string columns are
+    (codes, values) pairs, where values[codes[i]] is the value for flaw i."""
+    def __init__(self, results):
+        np = _import("numpy", "Exporting results")
+        flaws = results.get("flaws", {})
+        count = len(flaws)
+        self.app_id = results.get("scan", {}).get("app_id")
+        self.numeric = {}
+        for column, key in NUMERIC_COLUMNS:
+            if key is None:
+                values = (_number(issue_id) for issue_id in flaws)
+            else:
+                values = (_number(flaw.get(key)) for flaw in flaws.values())
+            self.numeric[column] = np.fromiter(values, dtype=np.int64, count=count)
+        self.strings = {}
+        for column, key in STRING_COLUMNS:
+            index = {}
+            codes = np.fromiter((index.setdefault(flaw.get(key), len(index)) for flaw in flaws.values()),
+                                dtype=np.int32, count=count)
+            self.strings[column] = (codes, list(index))
+
+    def __len__(self):
+        return len(self.numeric["issue_id"])
+
+    def values(self, column):
+        """Returns (codes, values) for a string column or (array, None) for a numeric one."""
+        if column in self.strings:
+            return self.strings[column]
+        return self.numeric[column], None
+
+
+def summarize(columns):
+    """Returns the flaw counts by severity, CWE, module and file (each a dict, largest count first)."""
+    np = _import("numpy", "Summarizing results")
+    summary = {}
+    for name, column in SUMMARY_COLUMNS:
+        data, labels = columns.values(column)
+        keys, counts = np.unique(data, return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        summary[name] = {str(labels[keys[i]] if labels is not None else keys[i]): int(counts[i]) for i in order}
+    return summary
+
+
+def write_npz(columns, path):
+    np = _import("numpy", "Exporting results to .npz")
+    dtype = [(column, np.int64) for column in columns.numeric] + [(column, np.int32) for column in columns.strings]
+    flaws = np.empty(len(columns), dtype=dtype)
+    for column, data in columns.numeric.items():
+        flaws[column] = data
+    arrays = {"flaws": flaws, "app_id": np.array("" if columns.app_id is None else columns.app_id)}
+    for column, (codes, values) in columns.strings.items():
+        flaws[column] = codes
+        arrays[column + "_values"] = np.array(["" if value is None else value for value in values], dtype=str)
+    np.savez_compressed(path, **arrays)
+
+
+def write_parquet(columns, path):
+    pa = _import("pyarrow", "Exporting results to .parquet")
+    import pyarrow.parquet as pq
+    arrays = {"app_id": pa.array([columns.app_id] * len(columns), type=pa.string()).dictionary_encode()}
+    for column, data in columns.numeric.items():
+        arrays[column] = pa.array(data)
+    for column, (codes, values) in columns.strings.items():
+        arrays[column] = pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(values, type=pa.string()))
+    pq.write_table(pa.table(arrays), path)
+
+
+WRITERS = {".npz": write_npz,
+           ".parquet": write_parquet}
+
+
+def export_results(results, path):
+    """Writes the flaws of the parsed results to path (.parquet or .npz) and returns the summary."""
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise VeracodeError(f'Unable to export results to {path}. The file name must end with .parquet or .npz')
+    columns = FlawColumns(results)
+    writer(columns, path)
+    return summarize(columns)
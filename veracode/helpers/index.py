@@ -0,0 +1,77 @@
+# Purpose:  Name to ID indexes
+#
+# Notes:    Looking up an app_id by name means downloading getapplist.do (several MB for a large portfolio)
+#           and a sandbox_id by name means downloading getsandboxlist.do. NameIndex keeps the answers in
+#           ~/.veracode/index-<user>.json so that most lookups are a dict access.
+#
+#           The index is refreshed one partition at a time: the app names as a whole, and the sandbox names
+#           separately for each app. A partition is refreshed when a lookup misses (at most once every
+#           MISS_REFRESH_INTERVAL seconds) or when it is older than MAX_AGE. Creating an app or a sandbox
+#           adds it to the index straight away.
+
+import hashlib
+import time
+from helpers.store import JSONStore
+from helpers.store import veracode_path
+
+
+MAX_AGE = 24 * 3600
+MISS_REFRESH_INTERVAL = 60
+
+
+class NameIndex:
+    def __init__(self, api_key_id, path=None, refresh=False):
+        if path is None:
+            user = hashlib.sha256(str(api_key_id).encode("utf-8")).hexdigest()[:16]
+            path = veracode_path("index-" + user + ".json")
+        self.store = JSONStore(path)
+        self.refresh = refresh
+        self.refreshed = set()
+        data = self.store.load()
+        self.apps = data.get("apps", {"refreshed": 0, "names": {}})
+        self.sandboxes = data.get("sandboxes", {})
+
+    def save(self):
+        self.store.save({"apps": self.apps, "sandboxes": self.sandboxes})
+
+    def _needs_refresh(self, key, partition, hit):
+        age = time.time() - partition["refreshed"]
+        """ with refresh, every partition is refreshed the first time it is used """
+        if (self.refresh and key not in self.refreshed) or age > MAX_AGE:
+            return True
+        return not hit and age > MISS_REFRESH_INTERVAL
+
+    def app_id(self, app_name):
+        """Returns the indexed app_id, or None if the index doesn't know it."""
+        return self.apps["names"].get(app_name)
+
+    def apps_need_refresh(self, app_name):
+        return self._needs_refresh("apps", self.apps, self.app_id(app_name) is not None)
+
+    def set_apps(self, names):
+        """Replaces the app partition with a dict of app_name to app_id."""
+        self.apps = {"refreshed": time.time(), "names": names}
+        self.refreshed.add("apps")
+        self.save()
+
+    def add_app(self, app_name, app_id):
+        self.apps["names"][app_name] = app_id
+        self.save()
+
+    def sandbox_id(self, app_id, sandbox_name):
+        """Returns the indexed sandbox_id, or None if the index doesn't know it."""
+        return self.sandboxes.get(str(app_id), {"names": {}})["names"].get(sandbox_name)
+
+    def sandboxes_need_refresh(self, app_id, sandbox_name):
+        partition = self.sandboxes.get(str(app_id), {"refreshed": 0})
+        return self._needs_refresh(str(app_id), partition, self.sandbox_id(app_id, sandbox_name) is not None)
+
+    def set_sandboxes(self, app_id, names):
+        """Replaces the sandbox partition for the app with a dict of sandbox_name to sandbox_id."""
+        self.sandboxes[str(app_id)] = {"refreshed": time.time(), "names": names}
+        self.refreshed.add(str(app_id))
+        self.save()
+
+    def add_sandbox(self, app_id, sandbox_name, sandbox_id):
+        self.sandboxes.setdefault(str(app_id), {"refreshed": 0, "names": {}})["names"][sandbox_name] = sandbox_id
+        self.save()
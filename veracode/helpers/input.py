@@ -10,6 +10,18 @@ def free_text(description, current):
         return x
 
 
+def number(description, current, minimum=1):
+    x = ""
+    print("  " + description + " : " + str(current))
+    while True:
+        x = input("   (blank to keep existing): ")
+        if x == "":
+            return current
+        if x.strip().isdigit() and int(x) >= minimum:
+            return int(x)
+        print("   Please enter a whole number of at least " + str(minimum))
+
+
 def choice(description, current, values):
     x = ""
     print("  " + description + " [" + "|".join(values) + "] : " + current)
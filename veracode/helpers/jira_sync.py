@@ -0,0 +1,332 @@
+# Purpose:  JIRA synchronisation
+#
+# Notes:    Applies the ticket actions planned by helpers.tickets to a JIRA project through the JIRA REST API (v2).
+#           The tickets of an app are labelled veracode-app-<app_id> and each one veracode-flaw-<issue_id>, so
+#           one paged JQL search (pages fetched concurrently) finds every ticket the app already has, with its
+#           status, before anything is changed. Then:
+#
+#           create  bulk create (/issue/bulk), up to BULK_CREATE_SIZE tickets a call
+#           update  one call per ticket
+#           close   one call per ticket, skipped if the ticket is already done. The id of the done transition is
+#                   looked up once per issue type and status (i.e. per workflow step) and cached
+#
+#           The calls run on a bounded pool of workers sharing one keep-alive session. A throttled (429) response
+#           is retried after the Retry-After the server sent. So is an unavailable (503) response, but only for
+#           idempotent calls: a 503 from a gateway can come after JIRA has already created the tickets of a POST.
+#
+#           With a SyncLedger, tickets whose content and state are the same as when they were last synced are
+#           left alone (see helpers.sync_ledger), and the keys of new tickets stay pending in it until they have
+#           been written back to their flaws.
+#
+#           The JIRA credentials come from the JIRA_USER and JIRA_TOKEN environment variables (or the jira_user and
+#           jira_password of the ticketing_config).
+
+import os
+import threading
+import time
+import random
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from helpers.exceptions import TicketingError
+from helpers.session import SessionStats
+from helpers.session import create_session
+from helpers.sync_ledger import CLOSED
+from helpers.sync_ledger import OPEN
+from helpers.sync_ledger import content_hash
+
+
+JIRA_WORKERS = 8
+BULK_CREATE_SIZE = 50
+SEARCH_PAGE_SIZE = 100
+THROTTLED_STATUS = 429
+UNAVAILABLE_STATUS = 503
+APP_LABEL_PREFIX = "veracode-app-"
+FLAW_LABEL_PREFIX = "veracode-flaw-"
+DONE_CATEGORY = "done"
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class JiraClient:
+    def __init__(self, base_url, user, token, workers=JIRA_WORKERS, retries=5, backoff_factor=0.5, proxies=None):
+        self.base_url = base_url.rstrip("/") + "/rest/api/2/"
+        self.stats = SessionStats()
+        """ GETs are retried by the session itself, _request() retries the other methods when throttled """
+        self.session = create_session(self.stats, workers, retries, backoff_factor)
+        self.session.auth = (user, token)
+        self.session.headers["Accept"] = "application/json"
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.proxies = proxies
+        self.workers = workers
+
+    def _retry_delay(self, r, attempt):
+        try:
+            return max(0.0, float(r.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return random.uniform(0, self.backoff_factor * (2 ** attempt))
+
+    def _request(self, method, path, accept=(), idempotent=None, **kwargs):
+        """Returns the decoded JSON response. Responses with a status in accept are returned rather than raised.
+        POSTs are taken to not be idempotent unless they say so."""
+        if idempotent is None:
+            idempotent = method != "POST"
+        retry_statuses = (THROTTLED_STATUS, UNAVAILABLE_STATUS) if idempotent else (THROTTLED_STATUS,)
+        endpoint = path.split("/", 1)[0]
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, self.base_url + path, proxies=self.proxies, **kwargs)
+            except requests.exceptions.RequestException as e:
+                raise TicketingError(f'JIRA {method} {path} failed: {e}')
+            finally:
+                self.stats.record_request(endpoint, time.perf_counter() - start)
+            if r.status_code in retry_statuses and method not in ("GET", "HEAD") and attempt < self.retries:
+                attempt += 1
+                time.sleep(self._retry_delay(r, attempt))
+                continue
+            break
+        if not (200 <= r.status_code <= 299 or r.status_code in accept):
+            raise TicketingError(f'JIRA {method} {path} failed: HTTP {r.status_code} {r.text[:200]}')
+        return r.json() if len(r.content) > 0 else None
+
+    def _search_page(self, jql, fields, start_at, page_size):
+        """ a search changes nothing, so it is safe to retry """
+        return self._request("POST", "search", idempotent=True,
+                             json={"jql": jql, "startAt": start_at, "maxResults": page_size, "fields": list(fields)})
+
+    def search(self, jql, fields=(), page_size=SEARCH_PAGE_SIZE):
+        """Returns every issue the JQL query finds. Once the first page gives the total, the other pages are
+        fetched concurrently."""
+        page = self._search_page(jql, fields, 0, page_size)
+        issues = list(page.get("issues", []))
+        total = page.get("total", len(issues))
+        page_size = page.get("maxResults") or page_size
+        if len(issues) >= total or len(issues) == 0:
+            return issues
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pages = executor.map(lambda start_at: self._search_page(jql, fields, start_at, page_size),
+                                 range(len(issues), total, page_size))
+            for page in pages:
+                issues.extend(page.get("issues", []))
+        return issues
+
+    def create_issues(self, issue_fields):
+        """Creates the issues in one bulk call and returns a (key, error) for each of them, in order."""
+        response = self._request("POST", "issue/bulk", accept=(400,),
+                                 json={"issueUpdates": [{"fields": fields} for fields in issue_fields]}) or {}
+        failed = {error.get("failedElementNumber"): error for error in response.get("errors", [])}
+        created = iter(response.get("issues", []))
+        results = []
+        for i in range(len(issue_fields)):
+            if i in failed:
+                results.append((None, str(failed[i].get("elementErrors", failed[i]))))
+            else:
+                issue = next(created, None)
+                results.append((None, "No issue created") if issue is None else (issue["key"], None))
+        return results
+
+    def update_issue(self, key, fields, labels=()):
+        """Sets the fields of the issue and adds the labels to it."""
+        body = {"fields": fields}
+        if len(labels) > 0:
+            body["update"] = {"labels": [{"add": label} for label in labels]}
+        self._request("PUT", f'issue/{key}', json=body)
+
+    def transitions(self, key):
+        return self._request("GET", f'issue/{key}/transitions').get("transitions", [])
+
+    def transition_issue(self, key, transition_id):
+        self._request("POST", f'issue/{key}/transitions', json={"transition": {"id": transition_id}})
+
+
+class JiraSync:
+    def __init__(self, client, project, app_id, issue_type="Bug", done_transition="Done", workers=JIRA_WORKERS,
+                 ledger=None):
+        self.client = client
+        self.project = project
+        self.app_label = APP_LABEL_PREFIX + str(app_id)
+        self.ledger = ledger
+        self.scope = f'{"" if client is None else client.base_url}|{project}|{app_id}'
+        """ issue_id to (issue_key, content_hash, state) as last synced """
+        self.synced = ledger.entries(self.scope) if ledger is not None else {}
+        self.issue_type = issue_type
+        self.done_transition = done_transition
+        self.workers = workers
+        """ issue_id to the key, issue type, status and status category of its ticket """
+        self.issues = {}
+        """ (issue type, status) to the id of the done transition """
+        self.transition_ids = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self):
+        """Finds the tickets the app already has and returns a dict of issue_id to key. Tickets in the ledger that
+        the search doesn't find (yet) are included."""
+        jql = f'project = "{self.project}" AND labels = "{self.app_label}"'
+        for issue in self.client.search(jql, ("labels", "status", "issuetype")):
+            fields = issue.get("fields", {})
+            status = fields.get("status") or {}
+            for label in fields.get("labels", []):
+                if label.startswith(FLAW_LABEL_PREFIX):
+                    self.issues[label[len(FLAW_LABEL_PREFIX):]] = {
+                        "key": issue["key"],
+                        "issuetype": (fields.get("issuetype") or {}).get("id"),
+                        "status": status.get("id"),
+                        "category": (status.get("statusCategory") or {}).get("key")}
+        tickets = {issue_id: issue_key for issue_id, (issue_key, digest, state) in self.synced.items()}
+        tickets.update((issue_id, issue["key"]) for issue_id, issue in self.issues.items())
+        return tickets
+
+    def summary(self, action):
+        return "Veracode Flaw: " + str(action["category_name"]) + " Flaw " + str(action["issueid"])
+
+    def description(self, action):
+        return "CWE: " + str(action["cweid"]) + " " + str(action["cwe_name"]) + "\n\n" + \
+               "Module: " + str(action["module"]) + "\n\n" + \
+               "Source: " + str(action["path"] or "") + str(action["file"]) + "\n\n" + \
+               "Attack Vector: " + str(action["attack_vector"]) + "\n\n" + \
+               "Description: " + str(action["description"])
+
+    def content_hash(self, action):
+        return content_hash(self.summary(action), self.description(action))
+
+    def unchanged(self, action):
+        """Returns True if the ledger says the ticket already has this content and state."""
+        synced = self.synced.get(action["issueid"])
+        if synced is None or synced[0] != action["issue_key"]:
+            return False
+        if action["type"] == "update":
+            """ a ticket the search didn't find still needs its labels """
+            return synced[2] == OPEN and synced[1] == self.content_hash(action) and action["issueid"] in self.issues
+        """ a ticket that the search found open again is closed again """
+        issue = self.issues.get(action["issueid"])
+        return synced[2] == CLOSED and (issue is None or issue["category"] == DONE_CATEGORY)
+
+    def record(self, tickets, key_pending=False):
+        if self.ledger is not None and len(tickets) > 0:
+            self.ledger.record_many(self.scope, tickets, key_pending)
+
+    def pending_keys(self):
+        """Returns a dict of issue_id to key for the tickets whose keys haven't been written back to their flaws,
+        i.e. those created by this sync and by any earlier one that stopped before writing them back."""
+        return self.ledger.pending_keys(self.scope) if self.ledger is not None else {}
+
+    def keys_written(self, issue_ids):
+        if self.ledger is not None and len(issue_ids) > 0:
+            self.ledger.keys_written(self.scope, issue_ids)
+
+    def create_fields(self, action):
+        return {"project": {"key": self.project},
+                "issuetype": {"name": self.issue_type},
+                "summary": self.summary(action),
+                "description": self.description(action),
+                "labels": self.labels(action)}
+
+    def labels(self, action):
+        return [self.app_label, FLAW_LABEL_PREFIX + str(action["issueid"])]
+
+    def update(self, action):
+        """ a ticket the search didn't find is only linked to its flaw by a comment (e.g. one created by the legacy
+            synchroniser), labelling it lets the next search find it (and its status) """
+        labels = self.labels(action) if action["issueid"] not in self.issues else ()
+        self.client.update_issue(action["issue_key"], {"summary": self.summary(action),
+                                                       "description": self.description(action)}, labels)
+        return True
+
+    def transition_id(self, action):
+        issue = self.issues.get(action["issueid"])
+        step = None if issue is None else (issue["issuetype"], issue["status"])
+        with self.lock:
+            if step is not None and step in self.transition_ids:
+                return self.transition_ids[step]
+        for transition in self.client.transitions(action["issue_key"]):
+            if transition.get("name") == self.done_transition:
+                if step is not None:
+                    with self.lock:
+                        self.transition_ids[step] = transition["id"]
+                return transition["id"]
+        raise TicketingError(f'{action["issue_key"]} has no "{self.done_transition}" transition')
+
+    def close(self, action):
+        """Moves the ticket to done, returns False if it already was."""
+        issue = self.issues.get(action["issueid"])
+        if issue is not None and issue["category"] == DONE_CATEGORY:
+            return False
+        self.client.transition_issue(action["issue_key"], self.transition_id(action))
+        return True
+
+    def sync(self, actions):
+        """Applies the ticket actions and returns what was done: created (issue_id to key), the number of tickets
+        updated, closed, skipped (already closed) and unchanged (since the last sync) and the errors."""
+        summary = {"created": {}, "updated": 0, "closed": 0, "skipped": 0, "unchanged": 0, "errors": []}
+        creates = [action for action in actions if action["type"] == "create"]
+        executor = ThreadPoolExecutor(max_workers=max(1, self.workers))
+        futures = {}
+        try:
+            for chunk in _chunks(creates, BULK_CREATE_SIZE):
+                futures[executor.submit(self.client.create_issues, [self.create_fields(a) for a in chunk])] = chunk
+            for action in actions:
+                if action["type"] in ("update", "close") and self.unchanged(action):
+                    summary["unchanged"] += 1
+                elif action["type"] == "update":
+                    futures[executor.submit(self.update, action)] = action
+                elif action["type"] == "close":
+                    futures[executor.submit(self.close, action)] = action
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    result = future.result()
+                except TicketingError as e:
+                    for action in item if isinstance(item, list) else [item]:
+                        summary["errors"].append({"type": action["type"], "issueid": action["issueid"],
+                                                  "error": str(e)})
+                    continue
+                """ each ticket is recorded as soon as it's done, so an interrupted sync can resume """
+                if isinstance(item, list):
+                    created = []
+                    for action, (key, error) in zip(item, result):
+                        if key is not None:
+                            summary["created"][action["issueid"]] = key
+                            created.append((action["issueid"], key, self.content_hash(action), OPEN))
+                        else:
+                            summary["errors"].append({"type": "create", "issueid": action["issueid"],
+                                                      "error": error})
+                    self.record(created, key_pending=True)
+                elif item["type"] == "update":
+                    summary["updated"] += 1
+                    self.record([(item["issueid"], item["issue_key"], self.content_hash(item), OPEN)])
+                else:
+                    summary["closed" if result else "skipped"] += 1
+                    self.record([(item["issueid"], item["issue_key"], self.content_hash(item), CLOSED)])
+        finally:
+            """ the calls that haven't started are cancelled (shutdown's cancel_futures needs Python 3.9) """
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        return summary
+
+
+def create_jira_sync(ticketing_config, app_id, proxies=None, ledger=None):
+    """Returns the JiraSync for a ticketing_config, or None if it doesn't configure a JIRA server."""
+    if ticketing_config.get("type", "JIRA") != "JIRA" or not ticketing_config.get("jira_base_url"):
+        return None
+    user = os.environ.get("JIRA_USER") or ticketing_config.get("jira_user")
+    token = os.environ.get("JIRA_TOKEN") or ticketing_config.get("jira_password")
+    if not user or not token:
+        raise TicketingError("JIRA credentials not found. Set the JIRA_USER and JIRA_TOKEN environment variables")
+    if not ticketing_config.get("jira_project"):
+        raise TicketingError("No jira_project in the ticketing_config")
+    """ the tickets of every app would share one veracode-app-None label """
+    if app_id is None or str(app_id) == "":
+        raise TicketingError("No app_id in the portfolio config, unable to label the tickets of the app")
+    workers = ticketing_config.get("jira_workers", JIRA_WORKERS)
+    client = JiraClient(ticketing_config["jira_base_url"], user, token, workers=workers, proxies=proxies)
+    return JiraSync(client, ticketing_config["jira_project"], app_id,
+                    ticketing_config.get("jira_issue_type", "Bug"),
+                    ticketing_config.get("jira_done_transition", "Done"),
+                    workers, ledger)
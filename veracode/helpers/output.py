@@ -1,10 +1,31 @@
+# Purpose:  Console output
+#
+# Notes:    Out is the console output of a command. Messages have levels (0 is always shown, 1 is verbose and
+#           2 is debug, shown when log_level is above them) and a quiet Out (the --console machine mode, where
+#           stdout is the JSON output) shows nothing at all. Loops over many items (flaws, files) report through
+#           progress() instead of a line per item: the counts are redrawn at most once every interval seconds,
+#           in place on a terminal and as a new line in a CI log.
+
+import sys
+import time
+
+
+PROGRESS_INTERVAL = 1.0
+
 
 class Out():
-    def __init__(self):
-        self.log_level = 0
+    def __init__(self, quiet=False, log_level=0, stream=None, interval=PROGRESS_INTERVAL):
+        self.quiet = quiet
+        self.log_level = log_level
+        self.stream = stream
+        self.interval = interval
 
     def print(self, msg):
-        print(msg)
+        if not self.quiet:
+            print(msg, file=self.stream if self.stream is not None else sys.stdout)
+
+    def info(self, label, msg):
+        self.print(f'{label:10} : {msg}')
 
     def log(self, level, msg):
         if level >= self.log_level:
@@ -15,7 +36,57 @@ class Out():
                 output = "[VERBOSE] "
             elif level == 2:
                 output = "[ DEBUG ] "
-            print(output + msg)
+            self.print(output + msg)
 
     def set_level(self, level):
         self.log_level = level
+
+    def progress(self, label, total=None, unit="items"):
+        """Returns a Progress for a loop over total (if known) items."""
+        return Progress(self, label, total, unit)
+
+
+class Progress():
+    def __init__(self, out, label, total=None, unit="items"):
+        self.out = out
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.count = 0
+        self.started = time.monotonic()
+        self.next_render = self.started + out.interval
+        stream = out.stream if out.stream is not None else sys.stdout
+        self.in_place = hasattr(stream, "isatty") and stream.isatty()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def update(self, count=1):
+        self.count += count
+        if self.out.quiet:
+            return
+        now = time.monotonic()
+        if now >= self.next_render:
+            self.next_render = now + self.out.interval
+            self.render(now)
+
+    def text(self, now):
+        elapsed = now - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0
+        done = str(self.count) if self.total is None else f'{self.count}/{self.total}'
+        return f'{self.label:10} : {done} {self.unit} in {elapsed:.1f}s ({rate:.0f}/s)'
+
+    def render(self, now, final=False):
+        stream = self.out.stream if self.out.stream is not None else sys.stdout
+        if self.in_place:
+            stream.write("\r" + self.text(now) + ("\n" if final else ""))
+        else:
+            stream.write(self.text(now) + "\n")
+        stream.flush()
+
+    def close(self):
+        if not self.out.quiet:
+            self.render(time.monotonic(), True)
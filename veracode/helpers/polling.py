@@ -0,0 +1,230 @@
+# Purpose:  Scan completion polling
+#
+# Notes:    A static scan goes through a pre-scan and then the full scan, and either can take anything from a
+#           few seconds to a couple of hours. Polling at a fixed interval either wastes API calls on long scans
+#           or adds latency to short ones. PollScheduler polls with exponential backoff (with jitter, so that
+#           parallel pipelines don't poll in lock step) and starts again from the shortest interval whenever
+#           the scan moves to a new phase.
+#
+#           How long each phase took is kept in ~/.veracode/scan-history.json, per app for the pre-scan and
+#           per app and module set for the full scan. When there is history, the first poll of a phase is put
+#           off until the phase is nearly expected to finish, and an ETA can be given.
+
+import datetime
+import hashlib
+import random
+import statistics
+import time
+from helpers.api import parse_app_builds
+from helpers.store import JSONStore
+from helpers.store import veracode_path
+
+
+MIN_INTERVAL = 5
+MAX_INTERVAL = 300
+BACKOFF_FACTOR = 1.5
+HISTORY_SIZE = 10
+""" the first poll of a phase is at this fraction of its expected duration """
+FIRST_POLL_FRACTION = 0.8
+
+PRESCAN = "prescan"
+SCAN = "scan"
+DONE = "done"
+FAILED = "failed"
+PHASES = {"Incomplete": PRESCAN,
+          "Pre-Scan Submitted": PRESCAN,
+          "Pre-Scan Success": SCAN,
+          "Not Submitted to Engine": SCAN,
+          "Submitted to Engine": SCAN,
+          "Scan In Process": SCAN,
+          "Results Ready": DONE,
+          "Pre-Scan Failed": FAILED,
+          "Pre-Scan Canceled": FAILED,
+          "Scan Errors": FAILED,
+          "Scan Canceled": FAILED,
+          "No Modules Defined": FAILED}
+
+
+def phase(build):
+    """Returns the phase (PRESCAN, SCAN, DONE or FAILED) of a Build record."""
+    if build.results_ready:
+        return DONE
+    """ statuses we don't know about are treated as still scanning """
+    return PHASES.get(build.status, SCAN)
+
+
+class ScanHistory:
+    def __init__(self, path=None):
+        self.store = JSONStore(path if path is not None else veracode_path("scan-history.json"))
+        self.durations = self.store.load()
+
+    @staticmethod
+    def key(app_id, phase_name, modules=None):
+        if modules is None:
+            return phase_name + ":" + str(app_id)
+        module_set = hashlib.sha256("\n".join(sorted(modules)).encode("utf-8")).hexdigest()[:16]
+        return phase_name + ":" + str(app_id) + ":" + module_set
+
+    def expected(self, app_id, phase_name, modules=None):
+        """Returns the median duration (seconds) of the phase for the app (and module set), or None if unknown."""
+        for key in (self.key(app_id, phase_name, modules), self.key(app_id, phase_name)):
+            if len(self.durations.get(key, [])) > 0:
+                return statistics.median(self.durations[key])
+        return None
+
+    def record(self, app_id, phase_name, seconds, modules=None):
+        """ the module set is recorded as well as the app, so that a new module set still has an estimate """
+        keys = {self.key(app_id, phase_name), self.key(app_id, phase_name, modules)}
+        for key in keys:
+            self.durations[key] = (self.durations.get(key, []) + [round(seconds, 1)])[-HISTORY_SIZE:]
+        self.store.save(self.durations)
+
+
+class PollScheduler:
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, factor=BACKOFF_FACTOR):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.phase = None
+        self.phase_started = None
+        self.expected = None
+        self.interval = None
+        self.polls = 0
+
+    def update(self, phase_name, expected=None, started=None):
+        """Records the phase seen by the latest poll. Returns True if the phase has changed."""
+        self.polls += 1
+        if phase_name == self.phase:
+            return False
+        self.phase = phase_name
+        self.reset(started)
+        self.expected = expected
+        return True
+
+    def reset(self, started=None):
+        """Starts the backoff again from the shortest interval."""
+        self.phase_started = started if started is not None else time.time()
+        self.interval = None
+
+    def elapsed(self):
+        return time.time() - self.phase_started
+
+    def next_interval(self):
+        """Returns how many seconds to wait before the next poll."""
+        if self.interval is None:
+            self.interval = self.min_interval
+            if self.expected is not None:
+                """ don't poll again until the phase is nearly expected to finish """
+                remaining = self.expected * FIRST_POLL_FRACTION - self.elapsed()
+                if remaining > self.min_interval:
+                    return remaining
+        else:
+            self.interval = min(self.max_interval, self.interval * self.factor)
+        return random.uniform(self.interval / 2, self.interval)
+
+    def eta(self, later=0):
+        """Returns when the scan is expected to finish (epoch seconds) or None. later is the expected duration of
+        the phases that are still to come."""
+        if self.expected is None:
+            return None
+        return max(time.time(), self.phase_started + self.expected) + later
+
+
+def wait_for_results(api, app_id, build_id, sandbox_id=None, timeout=3600, history=None, started=None,
+                     scheduler=None, on_poll=None):
+    """Polls the build until its results are ready, it fails or the timeout (seconds) passes. Returns the final
+    phase (DONE, FAILED or the phase it was in at the timeout). started is when the pre-scan was started, if
+    known, and on_poll(scheduler, build, delay, eta) is called after every poll."""
+    if history is None:
+        history = ScanHistory()
+    if scheduler is None:
+        scheduler = PollScheduler()
+    deadline = time.time() + timeout
+    modules = None
+    """ a phase's duration is only recorded if we saw it start (to within a poll) """
+    start_known = False
+    while True:
+        build = api.get_build_status(app_id, build_id, sandbox_id)
+        current = phase(build)
+        if current == SCAN and modules is None:
+            """ the module set is known once the pre-scan has finished """
+            modules = sorted(api.get_modules(app_id, build_id, sandbox_id) or {})
+        expected = None
+        if current == PRESCAN:
+            expected = history.expected(app_id, PRESCAN)
+        elif current == SCAN:
+            expected = history.expected(app_id, SCAN, modules or None)
+        if scheduler.phase is None:
+            start_known = started is not None and current == PRESCAN
+            scheduler.update(current, expected, started if start_known else None)
+        elif scheduler.phase != current:
+            if start_known:
+                history.record(app_id, scheduler.phase, scheduler.elapsed(),
+                               (modules or None) if scheduler.phase == SCAN else None)
+            start_known = True
+            scheduler.update(current, expected)
+        else:
+            scheduler.update(current)
+        if current in (DONE, FAILED):
+            return current
+        delay = min(scheduler.next_interval(), max(0, deadline - time.time()))
+        later = (history.expected(app_id, SCAN, modules or None) or 0) if current == PRESCAN else 0
+        if on_poll is not None:
+            on_poll(scheduler, build, delay, scheduler.eta(later))
+        if time.time() + delay >= deadline:
+            return current
+        time.sleep(delay)
+
+
+def parse_target(target):
+    """Returns (app_id, sandbox_id, build_id) from an "app_id:sandbox_id:build_id" or "app_id:build_id" string."""
+    parts = target.split(":")
+    if len(parts) == 2:
+        return parts[0], None, parts[1]
+    if len(parts) == 3:
+        return parts[0], parts[1] or None, parts[2]
+    raise ValueError("Targets must be app_id:sandbox_id:build_id or app_id:build_id, not '" + target + "'")
+
+
+def wait_for_builds(api, targets, timeout=3600, scheduler=None, on_complete=None, on_poll=None):
+    """Polls many builds at once until they have all finished or the timeout (seconds) passes. targets is a list of
+    (app_id, sandbox_id, build_id). Returns a dict of build_id to its final phase. Every poll is a single
+    getappbuilds.do call, getbuildinfo.do is only called for the builds it didn't report. on_complete(target,
+    phase) is called as soon as each build finishes and on_poll(scheduler, pending, delay) after every poll."""
+    if scheduler is None:
+        scheduler = PollScheduler()
+    deadline = time.time() + timeout
+    pending = {str(target[2]): target for target in targets}
+    phases = {}
+    """ report_changed_since has a granularity of a day, allow one day for time zones """
+    changed_since = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%m/%d/%Y")
+    scheduler.reset()
+    while True:
+        scheduler.polls += 1
+        app_builds = api.get_app_builds(changed_since, parse=parse_app_builds)
+        """ only the builds changed since yesterday, which may not be everything since api.builds.changed_since """
+        api.builds.update(app_builds, advance=False)
+        builds = {build.build_id: build for build in app_builds if build.build_id in pending}
+        for build_id, (app_id, sandbox_id, _) in pending.items():
+            if build_id not in builds:
+                builds[build_id] = api.get_build_status(app_id, build_id, sandbox_id)
+        changed = False
+        for build_id, build in builds.items():
+            current = phase(build)
+            changed = changed or phases.get(build_id, current) != current
+            phases[build_id] = current
+            if current in (DONE, FAILED):
+                target = pending.pop(build_id)
+                if on_complete is not None:
+                    on_complete(target, current)
+        if len(pending) == 0:
+            return phases
+        if changed:
+            """ something moved on, the others may be close behind """
+            scheduler.reset()
+        delay = min(scheduler.next_interval(), max(0, deadline - time.time()))
+        if on_poll is not None:
+            on_poll(scheduler, pending, delay)
+        if time.time() + delay >= deadline:
+            return phases
+        time.sleep(delay)
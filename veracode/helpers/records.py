@@ -0,0 +1,115 @@
+# Purpose:  Typed API response records
+#
+# Notes:    Decodes the XML returned by the Veracode XML APIs into small typed records (App, Sandbox, Build,
+#           Module, File) using an incremental iterparse. Each record is built when its element closes and
+#           the element is then cleared, so even a 10 MB build list is never held as a full tree (or as an
+#           escaped str() copy of the bytes). Attributes are matched by name, so attribute order and XML
+#           namespaces don't matter.
+
+import io
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+
+App = namedtuple("App", ["app_id", "app_name", "policy_updated_date"])
+Sandbox = namedtuple("Sandbox", ["sandbox_id", "sandbox_name", "owner", "last_modified"])
+Build = namedtuple("Build", ["build_id", "version", "app_id", "sandbox_id", "results_ready", "policy_updated_date",
+                             "status", "published_date"])
+Module = namedtuple("Module", ["id", "name", "status", "has_fatal_errors"])
+File = namedtuple("File", ["file_id", "file_name", "file_status", "file_md5"])
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _source(xml):
+    """ accept bytes (what VeracodeAPI returns) or an open binary file """
+    if isinstance(xml, (bytes, bytearray)):
+        return io.BytesIO(xml)
+    return xml
+
+
+def _to_bool(value):
+    return None if value is None else value == "true"
+
+
+def _app(elem, context):
+    return App(elem.get("app_id"), elem.get("app_name"), elem.get("policy_updated_date"))
+
+
+def _sandbox(elem, context):
+    return Sandbox(elem.get("sandbox_id"), elem.get("sandbox_name"), elem.get("owner"), elem.get("last_modified"))
+
+
+def _build(elem, context):
+    """ the status of a build is on its analysis_unit child, the app and sandbox may be on an ancestor """
+    status = None
+    published_date = None
+    for child in elem:
+        if _local_name(child.tag) == "analysis_unit":
+            status = child.get("status")
+            published_date = child.get("published_date")
+            break
+    return Build(elem.get("build_id"), elem.get("version"),
+                 elem.get("app_id", context.get("app_id")), elem.get("sandbox_id", context.get("sandbox_id")),
+                 _to_bool(elem.get("results_ready")), elem.get("policy_updated_date"), status, published_date)
+
+
+def _module(elem, context):
+    return Module(elem.get("id"), elem.get("name"), elem.get("status"), _to_bool(elem.get("has_fatal_errors")))
+
+
+def _file(elem, context):
+    return File(elem.get("file_id"), elem.get("file_name"), elem.get("file_status"), elem.get("file_md5"))
+
+
+RECORD_TYPES = {"app": _app,
+                "application": _app,
+                "sandbox": _sandbox,
+                "build": _build,
+                "module": _module,
+                "file": _file}
+
+
+def iter_records(xml, *tags):
+    """Yields a typed record for every element whose (local) name is in tags, e.g. iter_records(xml, "build").
+    An <error> response yields nothing, use parse_error() to get its message."""
+    stack = [{}]
+    root = None
+    for event, elem in ET.iterparse(_source(xml), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            """ remember app_id/sandbox_id from the enclosing elements (e.g. <buildinfo>, <application>) """
+            context = dict(stack[-1])
+            for key in ("app_id", "sandbox_id"):
+                if key in elem.attrib:
+                    context[key] = elem.attrib[key]
+            stack.append(context)
+            continue
+        stack.pop()
+        name = _local_name(elem.tag)
+        if name in tags:
+            yield RECORD_TYPES[name](elem, stack[-1])
+            """ drop everything parsed so far, the records already yielded don't need it """
+            elem.clear()
+            root.clear()
+
+
+def first_record(xml, *tags):
+    """Returns the first matching record, or None."""
+    for record in iter_records(xml, *tags):
+        return record
+    return None
+
+
+def parse_error(xml):
+    """Returns the text of the <error> element of an error response, or None if it isn't one."""
+    try:
+        for event, elem in ET.iterparse(_source(xml), events=("end",)):
+            if _local_name(elem.tag) == "error":
+                return elem.text
+    except ET.ParseError:
+        return None
+    return None
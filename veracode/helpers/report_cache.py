@@ -0,0 +1,130 @@
+# Purpose:  Detailed report cache
+#
+# Notes:    Detailed reports are kept gzipped under ~/.veracode/reports so that results, diff, ticketing, etc. only
+#           download a build's report once. The report is streamed from the API straight into the compressed file
+#           and read back through a file handle, it is never held in memory as a whole.
+#
+#           The report of a finished build only changes when its policy evaluation is updated (a mitigation is
+#           accepted, the policy changes), which moves the build's policy_updated_date. That date is part of the
+#           file name, so an entry is never modified: a report with a new date is a new file and the old one is
+#           removed. Checking an entry is just a getbuildinfo call. A report is downloaded to a temporary file
+#           and only renamed to its entry's name once it is complete and isn't an <error> response, so a process
+#           that opens an entry always reads a whole report.
+#
+#           The cache holds at most REPORT_CACHE_MAX_BYTES of compressed reports. When a download takes it over
+#           that, the reports of the builds that were used least recently are removed (opening a cached report
+#           sets its atime explicitly, so this works on noatime mounts).
+
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from helpers.exceptions import VeracodeAPIError
+from helpers.records import parse_error
+from helpers.store import VERACODE_HOME
+
+
+""" error responses are small, anything larger than this is a report """
+ERROR_RESPONSE_MAX = 4096
+REPORT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def report_error(report, size):
+    """Returns the error message of a downloaded report (a binary file positioned at its start) or None."""
+    if size > ERROR_RESPONSE_MAX:
+        return None
+    return parse_error(report.read())
+
+
+class ReportCache:
+    def __init__(self, path=None, compresslevel=6, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.path = path if path is not None else os.path.join(VERACODE_HOME, "reports")
+        os.makedirs(self.path, exist_ok=True)
+        self.compresslevel = compresslevel
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, build_id, version):
+        tag = hashlib.sha256(str(version or "").encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.path, f'{build_id}-{tag}.xml.gz')
+
+    def entries(self, build_id):
+        """Returns the paths of the cached reports of a build."""
+        prefix = f'{build_id}-'
+        return [os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.startswith(prefix) and name.endswith(".xml.gz")]
+
+    def get(self, build_id, version):
+        """Returns the path of the cached report of the build at version (its policy_updated_date) or None."""
+        path = self._entry_path(build_id, version)
+        return path if os.path.exists(path) else None
+
+    def fetch(self, api, build_id, version):
+        """Downloads the report of the build into the cache and returns its path."""
+        path = self._entry_path(build_id, version)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=self.compresslevel) as report:
+                    size = api.download_detailed_report(build_id, report)
+            with gzip.open(tmp_path, "rb") as report:
+                error = report_error(report, size)
+            if error is not None:
+                raise VeracodeAPIError(f'Unable to download the detailed report of build {build_id}: {error}')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        """ the reports of earlier versions of the build are out of date now """
+        for old_path in self.entries(build_id):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Removes the least recently used reports (other than keep) until the cache is within max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if not name.endswith(".xml.gz") or name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+        for atime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def open(self, api, build_id, version):
+        """Returns the detailed report of the build at version as an open binary file, downloading it if it isn't
+        cached."""
+        path = self.get(build_id, version)
+        if path is not None:
+            try:
+                report = gzip.open(path, "rb")
+            except FileNotFoundError:
+                """ another process has just replaced it with a newer version """
+                report = None
+            if report is not None:
+                try:
+                    os.utime(path, (time.time(), os.fstat(report.fileno()).st_mtime))
+                except OSError:
+                    pass
+                return report
+        return gzip.open(self.fetch(api, build_id, version), "rb")
@@ -0,0 +1,271 @@
+# Purpose:  Detailed report parsing
+#
+# Notes:    A detailedreport.do payload for a large application can be hundreds of MB. Converting all of it to
+#           a dict tree (xmltodict) and then walking that tree needs many times that in memory. The parser here
+#           reads the report with an incremental iterparse instead: each flaw is turned into its result as
+#           soon as its element closes and the element is then removed from the tree, so memory use is the
+#           parsed results plus one flaw's worth of XML.
+#
+#           The results have the same structure as before (scan, severities, categories, cwes and flaws). The
+#           category desc/recommendations and cwe description subtrees are converted the same way xmltodict
+#           converts them, so consumers of those fields see no difference.
+#
+#           To keep the results small, each flaw is a Flaw record (__slots__, no per-flaw dict) whose strings
+#           are shared between flaws (module, source file, CWE, category, etc. repeat a lot), and the issue ids
+#           listed under severities, categories and cwes are IssueIds integer arrays. Both are only turned into
+#           JSON types when the output is written, by passing to_json as the default= of json.dump.
+
+import xml.etree.ElementTree as ET
+from array import array
+from operator import attrgetter
+from operator import itemgetter
+from helpers.exceptions import VeracodeError
+from helpers.records import _local_name
+from helpers.records import _source
+
+
+SEVERITY_NAMES = {"5": "Very High",
+                  "4": "High",
+                  "3": "Medium",
+                  "2": "Low",
+                  "1": "Very Low",
+                  "0": "Information"}
+
+FLAW_ATTRIBUTES = (("severity", "severity"),
+                   ("module", "module"),
+                   ("type", "type"),
+                   ("description", "description"),
+                   ("recommendations", "description"),
+                   ("note", "note"),
+                   ("cwe_id", "cweid"),
+                   ("remediation_effort", "remediationeffort"),
+                   ("exploit_level", "exploitLevel"),
+                   ("category_id", "categoryid"),
+                   ("pci_related", "pcirelated"),
+                   ("date_first_occurrence", "date_first_occurrence"),
+                   ("remediation_status", "remediation_status"),
+                   ("cia_impact", "cia_impact"),
+                   ("grace_period_expires", "grace_period_expires"),
+                   ("affects_policy_compliance", "affects_policy_compliance"),
+                   ("mitigation_status", "mitigation_status"),
+                   ("mitigation_status_desc", "mitigation_status_desc"),
+                   ("sourcefile", "sourcefile"),
+                   ("sourcefile_path", "sourcefilepath"),
+                   ("scope", "scope"),
+                   ("function_prototype", "functionprototype"),
+                   ("function_relative_location", "functionrelativelocation"))
+
+""" a flaw is closed when it's fixed, or has an accepted mitigation if mitigations count (e.g. for the tickets) """
+CLOSED_STATUSES = frozenset(["Fixed", "Cannot Reproduce"])
+ACCEPTED_MITIGATION = "accepted"
+
+FLAW_KEY_ORDER = tuple(key for key, attribute in FLAW_ATTRIBUTES)
+FLAW_KEYS = frozenset(FLAW_KEY_ORDER)
+_flaw_values = attrgetter(*FLAW_KEY_ORDER)
+
+""" the elements whose children are streamed (and removed once they have been processed) """
+CONTAINERS = ("detailedreport", "severity", "category", "cwe", "staticflaws")
+
+
+def to_dict(elem):
+    """Returns the element converted the same way xmltodict converts it (@attributes, child lists, #text)."""
+    result = {}
+    for name, value in elem.attrib.items():
+        result["@" + name] = value
+    for child in elem:
+        name = _local_name(child.tag)
+        value = to_dict(child)
+        if name not in result:
+            result[name] = value
+        elif type(result[name]) is list:
+            result[name].append(value)
+        else:
+            result[name] = [result[name], value]
+    text = (elem.text or "").strip()
+    if text != "":
+        if len(result) == 0:
+            return text
+        result["#text"] = text
+    return result if len(result) > 0 else None
+
+
+class Flaw:
+    """ dict-like (flaw["module"], flaw.get("comments")) so it can be used where a parsed JSON flaw is expected """
+    __slots__ = [key for key, attribute in FLAW_ATTRIBUTES if key != "recommendations"] + ["comments", "mitigations"]
+
+    def __init__(self, elem, strings):
+        for key, attribute in FLAW_ATTRIBUTES:
+            if key != "recommendations":
+                value = elem.get(attribute)
+                setattr(self, key, value if value is None else strings.setdefault(value, value))
+        self.comments = None
+        self.mitigations = None
+        for child in elem:
+            name = _local_name(child.tag)
+            if name == "annotations":
+                comments = [tuple(strings.setdefault(v, v) if v is not None else v
+                                  for v in (an.get("date"), an.get("description"), an.get("user")))
+                            for an in child if _local_name(an.tag) == "annotation"]
+                if len(comments) > 0:
+                    """ newest first """
+                    self.comments = tuple(comments[::-1])
+            elif name == "mitigations":
+                mitigations = [tuple(strings.setdefault(v, v) if v is not None else v
+                                     for v in (m.get("action"), m.get("date"), m.get("description"), m.get("user")))
+                               for m in child if _local_name(m.tag) == "mitigation"]
+                if len(mitigations) > 0:
+                    self.mitigations = tuple(mitigations[::-1])
+
+    @property
+    def recommendations(self):
+        """ the report only has the one description attribute """
+        return self.description
+
+    def as_dict(self):
+        """Returns the flaw as the dict written to the output."""
+        the_flaw = dict(zip(FLAW_KEY_ORDER, _flaw_values(self)))
+        if self.comments is not None:
+            the_flaw["comments"] = [{"date": date, "description": description, "user": user}
+                                    for date, description, user in self.comments]
+        if self.mitigations is not None:
+            the_flaw["mitigations"] = [{"action": action, "date": date, "description": description, "user": user}
+                                       for action, date, description, user in self.mitigations]
+        return the_flaw
+
+    def __getitem__(self, key):
+        if key in ("comments", "mitigations"):
+            if getattr(self, key) is None:
+                raise KeyError(key)
+            return self.as_dict()[key]
+        if key not in FLAW_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in FLAW_KEYS or (key in ("comments", "mitigations") and getattr(self, key) is not None)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+def flaw_fields(flaws, *fields):
+    """Returns a function that reads the fields of a flaw as a tuple, for flaws (a dict of issue_id to flaw) that
+    are Flaw records (read by attribute) or the dicts of a JSON context (read by key)."""
+    if isinstance(next(iter(flaws.values()), {}), dict):
+        return itemgetter(*fields)
+    return attrgetter(*fields)
+
+
+class IssueIds(array):
+    """ the issue ids of a severity, category or cwe, as 64 bit integers rather than a list of strings """
+    __slots__ = ()
+
+    def __new__(cls, ids=()):
+        return super().__new__(cls, "q", ids)
+
+    def __repr__(self):
+        return repr([str(issue_id) for issue_id in self])
+
+
+def to_json(obj):
+    """Materializes the compact result types for json.dump(..., default=to_json)."""
+    if isinstance(obj, Flaw):
+        return obj.as_dict()
+    if isinstance(obj, IssueIds):
+        return [str(issue_id) for issue_id in obj]
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _add_flaw(entry, issue_id):
+    entry.setdefault("flaws", IssueIds()).append(int(issue_id))
+    entry["count"] += 1
+
+
+def iter_flaws(xml, results=None):
+    """Yields (issue_id, Flaw) for every flaw in a detailed report, filling in the scan, severities,
+    categories and cwes of results (a dict) as it goes."""
+    if results is None:
+        results = {}
+    """ one copy of each distinct string, shared by all of the flaws """
+    strings = {}
+    stack = []
+    severity = category = cwe = None
+    for event, elem in ET.iterparse(_source(xml), events=("start", "end")):
+        name = _local_name(elem.tag)
+        if event == "start":
+            if len(stack) == 0 and name != "detailedreport":
+                """ e.g. an <error> response, which would otherwise parse as a report with no flaws """
+                raise VeracodeError(f'Not a detailed report, the document is a <{name}>')
+            if name == "detailedreport":
+                results["scan"] = {"app_name": elem.get("app_name"),
+                                   "app_id": elem.get("app_id"),
+                                   "sandbox_id": elem.get("sandbox_id"),
+                                   "policy_name": elem.get("policy_name"),
+                                   "scan_name": elem.get("version"),
+                                   "policy_compliance": elem.get("policy_compliance_status")}
+            elif name == "severity" and len(stack) == 1:
+                severity = elem.get("level")
+                severities = results.setdefault("severities", {})
+                if severity not in severities:
+                    severities[severity] = {"name": SEVERITY_NAMES.get(severity), "count": 0}
+            elif name == "category" and severity is not None:
+                category = elem.get("categoryid")
+                categories = results.setdefault("categories", {})
+                if category not in categories:
+                    categories[category] = {"name": elem.get("categoryname"),
+                                            "pci_related": elem.get("pcirelated"),
+                                            "description": None,
+                                            "recommendations": None,
+                                            "count": 0}
+            elif name == "cwe" and category is not None:
+                cwe = elem.get("cweid")
+                cwes = results.setdefault("cwes", {})
+                if cwe not in cwes:
+                    cwes[cwe] = {"name": elem.get("cwename"),
+                                 "pci_related": elem.get("pcirelated"),
+                                 "owasp": elem.get("owasp"),
+                                 "owasp2013": elem.get("owasp2013"),
+                                 "sans": elem.get("sans"),
+                                 "description": None,
+                                 "count": 0}
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        parent = _local_name(stack[-1].tag) if len(stack) > 0 else None
+        if name == "flaw" and parent == "staticflaws":
+            issue_id = elem.get("issueid")
+            _add_flaw(results["severities"][severity], issue_id)
+            _add_flaw(results["categories"][category], issue_id)
+            _add_flaw(results["cwes"][cwe], issue_id)
+            yield issue_id, Flaw(elem, strings)
+        elif name in ("desc", "recommendations") and parent == "category":
+            key = "description" if name == "desc" else "recommendations"
+            if results["categories"][category][key] is None:
+                results["categories"][category][key] = to_dict(elem)
+        elif name == "description" and parent == "cwe":
+            if results["cwes"][cwe]["description"] is None:
+                results["cwes"][cwe]["description"] = to_dict(elem)
+        elif name == "severity" and parent == "detailedreport":
+            severity = None
+        elif name == "category" and parent == "severity":
+            category = None
+        elif name == "cwe" and parent == "category":
+            cwe = None
+        """ the streamed elements are finished with once they close, drop them from the tree """
+        if parent in CONTAINERS:
+            stack[-1].remove(elem)
+
+
+def parse_detailed_report(xml, on_flaw=None):
+    """Returns the parsed results (scan, severities, categories, cwes and flaws) of a detailed report given as
+    bytes or a binary file. on_flaw(issue_id, flaw) is called for each flaw as it is parsed."""
+    results = {}
+    for issue_id, flaw in iter_flaws(xml, results):
+        if on_flaw is not None:
+            on_flaw(issue_id, flaw)
+        results.setdefault("flaws", {})[issue_id] = flaw
+    return results
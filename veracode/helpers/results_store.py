@@ -0,0 +1,198 @@
+# Purpose:  Local results store
+#
+# Notes:    Once a build's detailed report has been parsed its flaws are kept in ~/.veracode/results.db (SQLite).
+#           static results then loads a build it has already seen from there instead of downloading and parsing
+#           the report again, and static query filters the stored flaws (indexed by issue id, CWE, severity,
+#           module and source file path).
+#
+#           The report of a finished build still changes (mitigations are accepted, comments are added, the
+#           policy is re-evaluated), which moves the build's policy_updated_date. So that date is stored with the
+#           build, and has_build() only counts a build as stored if it was stored at the same date (a build whose
+#           date isn't known is never counted as stored).
+#
+#           The store keeps the builds ingested in the last RESULTS_MAX_AGE seconds, at most RESULTS_MAX_BUILDS of
+#           them: older builds are removed whenever a build is ingested (SQLite reuses the space they took up).
+#
+#           Each flaw is stored as its indexed columns plus the full flaw as JSON. The severities, categories
+#           and cwes of the results are stored per build without their flaw lists, which are rebuilt (in the
+#           order of the report) when the results are loaded.
+
+import json
+import sqlite3
+import time
+from helpers.diff import FINGERPRINT_KEYS
+from helpers.diff import fingerprint
+from helpers.report_parser import IssueIds
+from helpers.report_parser import to_json
+from helpers.store import veracode_path
+
+
+RESULTS_MAX_AGE = 30 * 24 * 3600
+RESULTS_MAX_BUILDS = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    build_id TEXT PRIMARY KEY,
+    app_id TEXT,
+    sandbox_id TEXT,
+    results TEXT NOT NULL,
+    ingested REAL NOT NULL,
+    policy_updated_date TEXT
+);
+CREATE TABLE IF NOT EXISTS flaws (
+    build_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    issue_id INTEGER NOT NULL,
+    severity INTEGER,
+    cwe_id INTEGER,
+    category_id INTEGER,
+    module TEXT,
+    sourcefile_path TEXT,
+    sourcefile TEXT,
+    remediation_status TEXT,
+    mitigation_status TEXT,
+    affects_policy_compliance TEXT,
+    flaw TEXT NOT NULL,
+    PRIMARY KEY (build_id, seq)
+);
+CREATE INDEX IF NOT EXISTS flaws_issue_id ON flaws (issue_id);
+CREATE INDEX IF NOT EXISTS flaws_cwe_id ON flaws (cwe_id);
+CREATE INDEX IF NOT EXISTS flaws_severity ON flaws (severity);
+CREATE INDEX IF NOT EXISTS flaws_module ON flaws (module);
+CREATE INDEX IF NOT EXISTS flaws_sourcefile_path ON flaws (sourcefile_path COLLATE NOCASE);
+"""
+
+""" the filters query() accepts and the condition each one adds """
+FILTERS = {"app_id": "b.app_id = ?",
+           "sandbox_id": "b.sandbox_id = ?",
+           "build_id": "f.build_id = ?",
+           "issue_id": "f.issue_id = ?",
+           "severity": "f.severity >= ?",
+           "cwe_id": "f.cwe_id = ?",
+           "module": "f.module = ?",
+           "sourcefile_path": "f.sourcefile_path LIKE ?",
+           "sourcefile": "f.sourcefile = ?"}
+
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsStore:
+    def __init__(self, path=None, max_age=RESULTS_MAX_AGE, max_builds=RESULTS_MAX_BUILDS):
+        self.path = path if path is not None else veracode_path("results.db")
+        self.max_age = max_age
+        self.max_builds = max_builds
+        """ WAL lets several CLI processes read while another one ingests a build """
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        """ stores created before the policy_updated_date was kept: their builds are stored again when next used """
+        columns = [column[1] for column in self.db.execute("PRAGMA table_info(builds)")]
+        if "policy_updated_date" not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE builds ADD COLUMN policy_updated_date TEXT")
+
+    def close(self):
+        self.db.close()
+
+    def has_build(self, build_id, policy_updated_date):
+        """Returns True if the results of the build are stored, and were stored at its policy_updated_date. Without a
+        policy_updated_date the stored results may be out of date, so that is always False."""
+        if policy_updated_date is None:
+            return False
+        row = self.db.execute("SELECT policy_updated_date FROM builds WHERE build_id = ?", (str(build_id),)).fetchone()
+        return row is not None and row[0] == policy_updated_date
+
+    def ingest(self, app_id, sandbox_id, build_id, results, policy_updated_date=None):
+        """Stores the parsed results of a build at its policy_updated_date (replacing any that were stored before)."""
+        build_id = str(build_id)
+        """ the flaw lists are rebuilt from the flaws table when the results are loaded """
+        summary = {key: value for key, value in results.items() if key != "flaws"}
+        for group in ("severities", "categories", "cwes"):
+            if group in results:
+                summary[group] = {key: {k: v for k, v in entry.items() if k != "flaws"}
+                                  for key, entry in results[group].items()}
+        rows = ((build_id, seq, int(issue_id), _number(flaw["severity"]), _number(flaw["cwe_id"]),
+                 _number(flaw["category_id"]), flaw["module"], flaw["sourcefile_path"], flaw["sourcefile"],
+                 flaw["remediation_status"], flaw["mitigation_status"], flaw["affects_policy_compliance"],
+                 json.dumps(flaw, default=to_json))
+                for seq, (issue_id, flaw) in enumerate(results.get("flaws", {}).items()))
+        with self.db:
+            self.db.execute("DELETE FROM flaws WHERE build_id = ?", (build_id,))
+            self.db.execute("INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?, ?)",
+                            (build_id, None if app_id is None else str(app_id),
+                             None if sandbox_id is None else str(sandbox_id),
+                             json.dumps(summary, default=to_json), time.time(), policy_updated_date))
+            self.db.executemany("INSERT INTO flaws VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.prune()
+
+    def prune(self):
+        """Removes the builds ingested more than max_age seconds ago and all but the max_builds newest."""
+        expired = [(build_id,) for build_id, in self.db.execute(
+            "SELECT build_id FROM builds WHERE ingested < ? OR build_id NOT IN "
+            "(SELECT build_id FROM builds ORDER BY ingested DESC LIMIT ?)",
+            (time.time() - self.max_age, self.max_builds))]
+        if len(expired) > 0:
+            with self.db:
+                self.db.executemany("DELETE FROM flaws WHERE build_id = ?", expired)
+                self.db.executemany("DELETE FROM builds WHERE build_id = ?", expired)
+
+    def load(self, build_id):
+        """Returns the stored results of a build (in the same structure as the parser returns) or None."""
+        row = self.db.execute("SELECT results FROM builds WHERE build_id = ?", (str(build_id),)).fetchone()
+        if row is None:
+            return None
+        results = json.loads(row[0])
+        issue_ids = [issue_id for issue_id, in self.db.execute(
+            "SELECT issue_id FROM flaws WHERE build_id = ? ORDER BY seq", (str(build_id),))]
+        if len(issue_ids) == 0:
+            return results
+        """ decoding all of the flaws as one JSON array is much quicker than decoding them one at a time """
+        flaw_list, = self.db.execute("SELECT '[' || group_concat(flaw, ',') || ']' FROM "
+                                     "(SELECT flaw FROM flaws WHERE build_id = ? ORDER BY seq)",
+                                     (str(build_id),)).fetchone()
+        flaws = dict(zip(map(str, issue_ids), json.loads(flaw_list)))
+        for group, key in (("severities", "severity"), ("categories", "category_id"), ("cwes", "cwe_id")):
+            entries = results[group]
+            for issue_id, flaw in zip(issue_ids, flaws.values()):
+                entry = entries[flaw[key]]
+                if "flaws" not in entry:
+                    entry["flaws"] = IssueIds()
+                entry["flaws"].append(issue_id)
+        results["flaws"] = flaws
+        return results
+
+    def flaw_states(self, build_id):
+        """Returns (issue_id, remediation_status, fingerprint) for the stored flaws of a build."""
+        fields = ", ".join("json_extract(flaw, '$." + key + "')" for key in FINGERPRINT_KEYS)
+        return [(str(row[0]), row[1], fingerprint(row[2:]))
+                for row in self.db.execute("SELECT issue_id, remediation_status, " + fields +
+                                           " FROM flaws WHERE build_id = ? ORDER BY seq", (str(build_id),))]
+
+    def query(self, limit=None, **filters):
+        """Returns the stored flaws (each with its build_id and issue_id) matching the filters, e.g. query(cwe_id=89,
+        severity=4). severity is a minimum and sourcefile_path a LIKE pattern (e.g. "com/example/%")."""
+        conditions = []
+        params = []
+        for name, value in filters.items():
+            if value is not None:
+                conditions.append(FILTERS[name])
+                params.append(value)
+        sql = "SELECT f.build_id, f.issue_id, f.flaw FROM flaws f JOIN builds b ON b.build_id = f.build_id"
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY f.build_id, f.seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        flaws = []
+        for build_id, issue_id, flaw in self.db.execute(sql, params):
+            flaw = json.loads(flaw)
+            flaw["build_id"] = build_id
+            flaw["issue_id"] = str(issue_id)
+            flaws.append(flaw)
+        return flaws
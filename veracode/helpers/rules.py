@@ -0,0 +1,87 @@
+# Purpose:  Static scan decision rules
+#
+# Notes:    static decide passes or fails a scan against the rules in the static_config of the branch:
+#
+#           "decide_max_severity": {"5": 0, "4": 10}   the most flaws allowed of each severity
+#           "decide_banned_cwes": [89, 78]             CWEs that aren't allowed at all
+#           "decide_grace_period_expired": true        fail on flaws whose grace period has expired
+#           "decide_policy_affecting_only": true       only count flaws that affect policy compliance
+#
+#           compile_rules() turns the configuration into a DecisionRules object once, and evaluate() then
+#           checks every rule in a single pass over the flaws. Flaws that are fixed or have an accepted
+#           mitigation never count. The flaws can be the parser's Flaw records or the dicts of a JSON context.
+
+import datetime
+from helpers.report_parser import ACCEPTED_MITIGATION
+from helpers.report_parser import CLOSED_STATUSES
+from helpers.report_parser import flaw_fields
+
+
+""" the report's date format, which sorts the same way as the dates """
+GRACE_PERIOD_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+FIELDS = ("severity", "cwe_id", "grace_period_expires", "affects_policy_compliance", "remediation_status",
+          "mitigation_status")
+
+
+class DecisionRules:
+    def __init__(self, max_severity=None, banned_cwes=None, grace_period_expired=False, policy_affecting_only=False,
+                 now=None):
+        self.max_severity = {str(level): int(count) for level, count in (max_severity or {}).items()}
+        self.banned_cwes = frozenset(str(cwe) for cwe in (banned_cwes or []))
+        self.grace_period_expired = grace_period_expired
+        self.policy_affecting_only = policy_affecting_only
+        now = now if now is not None else datetime.datetime.now(datetime.timezone.utc)
+        """ grace period dates are compared as strings, no per-flaw date parsing """
+        self.now = now.strftime(GRACE_PERIOD_FORMAT)
+
+    def __bool__(self):
+        return len(self.max_severity) > 0 or len(self.banned_cwes) > 0 or self.grace_period_expired
+
+    def evaluate(self, flaws):
+        """Returns {"decision": "pass" or "fail", "violations": [...]} for a dict of issue_id to flaw."""
+        by_severity = {level: [] for level in self.max_severity}
+        banned = []
+        expired = []
+        max_severity = self.max_severity
+        banned_cwes = self.banned_cwes
+        check_grace = self.grace_period_expired
+        policy_only = self.policy_affecting_only
+        now = self.now
+        fields = flaw_fields(flaws, *FIELDS)
+        for issue_id, flaw in flaws.items():
+            severity, cwe_id, grace_period_expires, affects_policy, remediation, mitigation = fields(flaw)
+            if remediation in CLOSED_STATUSES or mitigation == ACCEPTED_MITIGATION:
+                continue
+            if policy_only and affects_policy != "true":
+                continue
+            if severity in max_severity:
+                by_severity[severity].append(issue_id)
+            if cwe_id in banned_cwes:
+                banned.append(issue_id)
+            if check_grace and grace_period_expires and grace_period_expires < now:
+                expired.append(issue_id)
+
+        violations = []
+        for level, issue_ids in sorted(by_severity.items(), reverse=True):
+            if len(issue_ids) > max_severity[level]:
+                violations.append({"rule": "max_severity",
+                                   "message": f'{len(issue_ids)} flaws of severity {level} (at most '
+                                              f'{max_severity[level]} allowed)',
+                                   "issue_ids": issue_ids})
+        if len(banned) > 0:
+            violations.append({"rule": "banned_cwes", "message": f'{len(banned)} flaws with a banned CWE',
+                               "issue_ids": banned})
+        if len(expired) > 0:
+            violations.append({"rule": "grace_period_expired",
+                               "message": f'{len(expired)} flaws past their grace period', "issue_ids": expired})
+        return {"decision": "fail" if len(violations) > 0 else "pass", "violations": violations}
+
+
+def compile_rules(static_config, now=None):
+    """Returns the DecisionRules configured in a static_config."""
+    return DecisionRules(static_config.get("decide_max_severity"),
+                         static_config.get("decide_banned_cwes"),
+                         static_config.get("decide_grace_period_expired", False),
+                         static_config.get("decide_policy_affecting_only", False),
+                         now)
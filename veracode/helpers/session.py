@@ -0,0 +1,113 @@
+# Purpose:  HTTP session utilities
+#
+# Notes:    A VeracodeAPI instance keeps one pooled requests.Session for its whole lifetime so that the TCP and
+#           TLS handshakes are paid once per connection rather than once per API call. The adapter below also
+#           retries throttled (429) and failed (5xx) responses and dropped connections with a jittered
+#           exponential backoff, and keeps a running total of how long was spent in handshakes vs requests.
+
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitterRetry(Retry):
+    """Retry policy using exponential backoff with 'full jitter' so concurrent clients don't retry in lockstep"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(0, backoff)
+
+
+class SessionStats:
+    """Running totals for the calls made through a session"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.connections = 0
+        self.handshake_time = 0.0
+        self.request_time = 0.0
+        self.endpoints = {}
+
+    def record_connect(self, elapsed):
+        with self.lock:
+            self.connections += 1
+            self.handshake_time += elapsed
+
+    def record_request(self, endpoint, elapsed):
+        with self.lock:
+            self.calls += 1
+            self.request_time += elapsed
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return {"calls": self.calls,
+                    "connections": self.connections,
+                    "handshake_seconds": round(self.handshake_time, 3),
+                    "request_seconds": round(self.request_time, 3),
+                    "endpoints": dict(self.endpoints)}
+
+
+def _timed_pool_class(pool_class, stats):
+    """Returns a subclass of pool_class whose connections report their connect (TCP + TLS) time to stats"""
+
+    class TimedConnection(pool_class.ConnectionCls):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_connect(time.perf_counter() - start)
+
+    class TimedConnectionPool(pool_class):
+        ConnectionCls = TimedConnection
+
+    return TimedConnectionPool
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def _use_timed_pools(self, manager):
+        manager.pool_classes_by_scheme = {"http": _timed_pool_class(HTTPConnectionPool, self.stats),
+                                          "https": _timed_pool_class(HTTPSConnectionPool, self.stats)}
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._use_timed_pools(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if proxy not in self.proxy_manager:
+            self._use_timed_pools(super().proxy_manager_for(proxy, **proxy_kwargs))
+        return self.proxy_manager[proxy]
+
+
+def create_session(stats, pool_size=10, retries=5, backoff_factor=0.5):
+    """Returns a keep-alive requests.Session with a pool of pool_size connections and retry/backoff enabled"""
+    retry = JitterRetry(total=retries,
+                        connect=retries,
+                        read=retries,
+                        status=retries,
+                        backoff_factor=backoff_factor,
+                        status_forcelist=RETRY_STATUSES,
+                        allowed_methods=frozenset(["GET", "HEAD"]),
+                        respect_retry_after_header=True,
+                        raise_on_status=False)
+    adapter = TimedHTTPAdapter(stats, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,49 @@
+# Purpose:  Local state utilities
+#
+# Notes:    Small JSON documents kept under ~/.veracode (upload manifests, indexes, etc.). Writes go to a
+#           temporary file in the same directory which is then renamed over the original, so concurrent CLI
+#           processes never see a half written file (the last writer wins).
+
+import json
+import os
+import tempfile
+
+
+VERACODE_HOME = os.path.join(os.path.expanduser("~"), ".veracode")
+
+
+def veracode_path(*parts):
+    """Returns a path under ~/.veracode, creating the parent directories if needed."""
+    path = os.path.join(VERACODE_HOME, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def atomic_write(path, data):
+    """Writes bytes to path via a temporary file and a rename."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JSONStore:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Returns the stored dict, or an empty dict if there isn't one (or it can't be read)."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, data):
+        atomic_write(self.path, json.dumps(data, indent=2, sort_keys=True).encode("utf-8"))
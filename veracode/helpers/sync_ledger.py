@@ -0,0 +1,105 @@
+# Purpose:  Ticket sync ledger
+#
+# Notes:    Remembers, for every flaw synced to a ticketing system, its ticket key, a hash of the content last
+#           written to the ticket and the state the ticket was left in (open or closed). Kept in
+#           ~/.veracode/sync-ledger.db (SQLite), one scope per ticketing server, project and app.
+#
+#           A sync then leaves alone the tickets whose content and state haven't changed, so a sync of an app
+#           with no changes makes no calls other than the search for its tickets. Each ticket is recorded as
+#           soon as its call succeeds, so a sync that is interrupted picks up where it stopped when it is run
+#           again, and the tickets it created are known even before the ticketing system's search finds them.
+#
+#           The key of a new ticket is recorded as pending until it has been written back to its flaw (as a
+#           comment), so a sync that stopped after creating tickets, or whose comments failed, writes those keys
+#           back the next time it is run.
+
+import hashlib
+import sqlite3
+import time
+from helpers.store import veracode_path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    scope TEXT NOT NULL,
+    issue_id TEXT NOT NULL,
+    issue_key TEXT NOT NULL,
+    content_hash TEXT,
+    state TEXT NOT NULL,
+    synced REAL NOT NULL,
+    key_pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, issue_id)
+);
+"""
+
+""" a ticket's key stays pending until it's written back, unless the flaw now has a different ticket. A new ticket is
+    inserted and then updated (the row's old values are what SET reads), rather than with an ON CONFLICT upsert,
+    which needs SQLite 3.24 """
+INSERT_RECORD = "INSERT OR IGNORE INTO tickets VALUES (?, ?, ?, ?, ?, ?, ?)"
+UPDATE_RECORD = """
+UPDATE tickets SET
+    key_pending = CASE WHEN issue_key = ? THEN max(key_pending, ?) ELSE ? END,
+    issue_key = ?,
+    content_hash = ?,
+    state = ?,
+    synced = ?
+WHERE scope = ? AND issue_id = ?
+"""
+
+OPEN = "open"
+CLOSED = "closed"
+
+
+def content_hash(*fields):
+    """Returns the hash of the content written to a ticket."""
+    content = "\x1f".join("" if field is None else str(field) for field in fields)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class SyncLedger:
+    def __init__(self, path=None):
+        self.path = path if path is not None else veracode_path("sync-ledger.db")
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        """ a commit per ticket, without waiting for the disk on every one """
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        """ ledgers created before write backs were tracked """
+        columns = [column[1] for column in self.db.execute("PRAGMA table_info(tickets)")]
+        if "key_pending" not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE tickets ADD COLUMN key_pending INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self.db.close()
+
+    def entries(self, scope):
+        """Returns a dict of issue_id to (issue_key, content_hash, state) for the scope."""
+        return {issue_id: (issue_key, digest, state) for issue_id, issue_key, digest, state in self.db.execute(
+            "SELECT issue_id, issue_key, content_hash, state FROM tickets WHERE scope = ?", (scope,))}
+
+    def record(self, scope, issue_id, issue_key, digest, state, key_pending=False):
+        self.record_many(scope, [(issue_id, issue_key, digest, state)], key_pending)
+
+    def record_many(self, scope, tickets, key_pending=False):
+        """Records (issue_id, issue_key, content_hash, state) for each of the tickets in one transaction. With
+        key_pending, their keys are pending until keys_written() is called for them."""
+        now = time.time()
+        rows = [(str(issue_id), issue_key, digest, state) for issue_id, issue_key, digest, state in tickets]
+        with self.db:
+            self.db.executemany(INSERT_RECORD, [(scope, issue_id, issue_key, digest, state, now, int(key_pending))
+                                                for issue_id, issue_key, digest, state in rows])
+            self.db.executemany(UPDATE_RECORD, [(issue_key, int(key_pending), int(key_pending), issue_key, digest,
+                                                 state, now, scope, issue_id)
+                                                for issue_id, issue_key, digest, state in rows])
+
+    def pending_keys(self, scope):
+        """Returns a dict of issue_id to issue_key for the tickets whose keys haven't been written back yet."""
+        return {issue_id: issue_key for issue_id, issue_key in self.db.execute(
+            "SELECT issue_id, issue_key FROM tickets WHERE scope = ? AND key_pending = 1", (scope,))}
+
+    def keys_written(self, scope, issue_ids):
+        """Records that the keys of the tickets of the issue_ids have been written back."""
+        with self.db:
+            self.db.executemany("UPDATE tickets SET key_pending = 0 WHERE scope = ? AND issue_id = ?",
+                                [(scope, str(issue_id)) for issue_id in issue_ids])
@@ -0,0 +1,146 @@
+# Purpose:  Ticket action planning
+#
+# Notes:    ticketing synchronise turns the flaws of a scan into ticket actions. A flaw that has a ticket is
+#           linked to it by a "<type> Issue Key: <key>" comment on the flaw, e.g. "JIRA Issue Key: VC-123", or by
+#           its entry in a "<type> Issue Keys: <issue_id>=<key> ..." comment. The keys of new tickets are written
+#           back in the first form, one comment per flaw. The second form, one comment (and one API call) for a
+#           whole batch of flaws, is only written if the ticketing_config asks for shared_issue_key_comments.
+#
+#           create  the flaw is open and has no ticket
+#           update  the flaw is open and has a ticket
+#           close   the flaw has a ticket and is fixed (or has an accepted mitigation, if mitigation_handling)
+#
+#           The planner plans every flaw in one pass over the results: the tickets it already knows about are a
+#           dict of issue id to key, and only the flaws that aren't in it have their comments searched, with one
+#           compiled pattern. The results can hold the parser's Flaw records or the dicts of a JSON context.
+
+import re
+from helpers.report_parser import ACCEPTED_MITIGATION
+from helpers.report_parser import CLOSED_STATUSES
+from helpers.report_parser import flaw_fields
+
+
+SYNC_FILTERS = ("all", "policy_affecting")
+
+FIELDS = ("affects_policy_compliance", "remediation_status", "mitigation_status", "category_id", "cwe_id",
+          "severity", "type", "description", "module", "scope", "sourcefile", "sourcefile_path")
+
+
+def issue_key_comment(ticket_type, issue_key):
+    """Returns the flaw comment that links a flaw to its ticket."""
+    return f'{ticket_type} Issue Key: {issue_key}'
+
+
+def issue_keys_comment(ticket_type, issue_keys):
+    """Returns the comment that links each flaw in a dict of issue_id to issue key to its ticket."""
+    return f'{ticket_type} Issue Keys: ' + " ".join(f'{issue_id}={issue_key}'
+                                                    for issue_id, issue_key in issue_keys.items())
+
+
+def issue_key_pattern(ticket_type):
+    """Returns the compiled pattern that finds the issue key in an issue_key_comment()."""
+    return re.compile(re.escape(f'{ticket_type} Issue Key: ') + r'(\S+)')
+
+
+def issue_keys_pattern(ticket_type):
+    """Returns the compiled pattern that finds the issue keys in an issue_keys_comment()."""
+    return re.compile(re.escape(f'{ticket_type} Issue Keys: ') + r'(.*)', re.DOTALL)
+
+
+def _comments(flaw):
+    """ the comment descriptions of a flaw, newest first """
+    if isinstance(flaw, dict):
+        return [comment.get("description") for comment in flaw.get("comments", ())]
+    return [description for date, description, user in flaw.comments or ()]
+
+
+class TicketPlanner:
+    def __init__(self, ticket_type="JIRA", sync_filter="all", mitigation_handling=True):
+        if sync_filter not in SYNC_FILTERS:
+            raise ValueError(f'Unknown sync_filter {sync_filter}. Expected one of {", ".join(SYNC_FILTERS)}')
+        self.ticket_type = ticket_type
+        self.sync_filter = sync_filter
+        self.mitigation_handling = mitigation_handling
+        self.pattern = issue_key_pattern(ticket_type)
+        self.keys_pattern = issue_keys_pattern(ticket_type)
+        """ a batch comment is shared by many flaws, each one is only split up once """
+        self.batch_keys = {}
+
+    def _batch_keys(self, description):
+        keys = self.batch_keys.get(description)
+        if keys is None:
+            found = self.keys_pattern.match(description)
+            if found is None:
+                return {}
+            keys = {}
+            for pair in found.group(1).split():
+                issue_id, _, issue_key = pair.partition("=")
+                if issue_key:
+                    keys[issue_id] = issue_key
+            self.batch_keys[description] = keys
+        return keys
+
+    def issue_key(self, flaw, issue_id=None):
+        """Returns the issue key in the newest issue key comment of a flaw (with this issue_id) or None."""
+        match = self.pattern.match
+        for description in _comments(flaw):
+            if description:
+                found = match(description)
+                if found is not None:
+                    return found.group(1)
+                if issue_id is not None:
+                    issue_key = self._batch_keys(description).get(issue_id)
+                    if issue_key is not None:
+                        return issue_key
+        return None
+
+    def plan(self, results, tickets=None):
+        """Returns the ticket actions (a list of dicts, in the order of the flaws) for parsed results. tickets
+        (issue_id to key, e.g. from the ticketing system) take precedence over the flaw comments."""
+        flaws = results.get("flaws", {})
+        known = {str(issue_id): issue_key for issue_id, issue_key in (tickets or {}).items()}
+        categories = results.get("categories", {})
+        cwes = results.get("cwes", {})
+        policy_only = self.sync_filter == "policy_affecting"
+        mitigation_handling = self.mitigation_handling
+        fields = flaw_fields(flaws, *FIELDS)
+        actions = []
+        for issue_id, flaw in flaws.items():
+            (affects_policy, remediation, mitigation, category_id, cwe_id, severity, attack_vector, description,
+             module, scope, sourcefile, sourcefile_path) = fields(flaw)
+            if policy_only and affects_policy != "true":
+                continue
+            issue_key = known.get(issue_id)
+            if issue_key is None:
+                issue_key = self.issue_key(flaw, issue_id)
+            closed = remediation in CLOSED_STATUSES or (mitigation_handling and mitigation == ACCEPTED_MITIGATION)
+            if issue_key is None:
+                if closed:
+                    continue
+                action_type = "create"
+            else:
+                action_type = "close" if closed else "update"
+            actions.append({"type": action_type,
+                            "issue_key": issue_key,
+                            "issueid": issue_id,
+                            "severity": severity,
+                            "category_name": categories.get(category_id, {}).get("name"),
+                            "cwe_name": cwes.get(cwe_id, {}).get("name"),
+                            "cweid": cwe_id,
+                            "attack_vector": attack_vector,
+                            "description": description,
+                            "module": module,
+                            "scope": scope,
+                            "file": sourcefile,
+                            "path": sourcefile_path,
+                            "remediation_status": remediation,
+                            "mitigation_status": mitigation})
+        return actions
+
+
+def plan_tickets(ticketing_config, results, tickets=None):
+    """Returns the ticket actions for parsed results with the settings of a ticketing_config."""
+    planner = TicketPlanner(ticketing_config.get("type", "JIRA"),
+                            ticketing_config.get("sync_filter", "all"),
+                            ticketing_config.get("mitigation_handling", True))
+    return planner.plan(results, tickets)
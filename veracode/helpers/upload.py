@@ -0,0 +1,115 @@
+# Purpose:  Upload utilities
+#
+# Notes:    requests builds a multipart body for files= uploads in memory, which for multi-GB WAR/EAR artifacts
+#           is enough to get a container runner OOM-killed. MultipartFileStream produces the same
+#           multipart/form-data body but reads the file from disk one chunk at a time as the body is sent, so
+#           memory use is constant regardless of the file size.
+#
+#           upload_files() uploads on a pool of workers and stops as soon as one upload fails: the uploads that
+#           haven't started are cancelled and the ones that are streaming stop at their next chunk (the stream
+#           checks a shared stop event), and the workers are waited for before the failure is raised, so nothing
+#           is still being sent to the build once upload_files() has returned. uploadfile.do rejects a file with an
+#           HTTP 200 and an <error> body, which counts as a failed upload too.
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from helpers.exceptions import UploadCancelledError
+from helpers.exceptions import VeracodeAPIError
+from helpers.exceptions import VeracodeError
+from helpers.records import parse_error
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_WORKERS = 4
+
+
+class MultipartFileStream:
+    """Iterable multipart/form-data body for a single file, read from disk in chunk_size pieces"""
+
+    def __init__(self, filename, field="file", chunk_size=UPLOAD_CHUNK_SIZE, stop=None):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        """ a threading.Event, once it's set the body stops (with an UploadCancelledError) at the next chunk """
+        self.stop = stop
+        self.size = os.path.getsize(filename)
+        boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=" + boundary
+        basename = os.path.basename(filename).replace('"', '%22')
+        self.preamble = ("--" + boundary + "\r\n" +
+                         'Content-Disposition: form-data; name="' + field + '"; filename="' + basename + '"\r\n' +
+                         "Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+        self.epilogue = ("\r\n--" + boundary + "--\r\n").encode("utf-8")
+        self.bytes_sent = 0
+        self.first_byte_time = None
+        self.last_byte_time = None
+
+    def __len__(self):
+        return len(self.preamble) + self.size + len(self.epilogue)
+
+    def __iter__(self):
+        self.bytes_sent = 0
+        self.first_byte_time = time.perf_counter()
+        yield self.preamble
+        with open(self.filename, "rb") as f:
+            chunk = f.read(self.chunk_size)
+            while chunk:
+                if self.stop is not None and self.stop.is_set():
+                    raise UploadCancelledError("Upload of '" + self.filename + "' stopped")
+                self.bytes_sent += len(chunk)
+                yield chunk
+                chunk = f.read(self.chunk_size)
+        yield self.epilogue
+        self.last_byte_time = time.perf_counter()
+
+    def get_stats(self, response_time):
+        """Returns the throughput of the upload and the time from sending the last byte to getting a response"""
+        stats = {"filename": self.filename, "bytes": self.size, "seconds": None, "bytes_per_second": None,
+                 "time_to_first_byte": None}
+        if self.first_byte_time is not None and self.last_byte_time is not None:
+            seconds = max(self.last_byte_time - self.first_byte_time, 1e-6)
+            stats["seconds"] = round(seconds, 3)
+            stats["bytes_per_second"] = int(self.size / seconds)
+            stats["time_to_first_byte"] = round(response_time - self.last_byte_time, 3)
+        return stats
+
+
+def upload_files(api, app_id, filenames, sandbox_id=None, workers=UPLOAD_WORKERS, on_uploaded=None):
+    """Uploads the files using a pool of workers, largest first, and returns the aggregate throughput.
+    Raises a VeracodeError as soon as any upload fails, once the other uploads have stopped."""
+    ordered = sorted(filenames, key=os.path.getsize, reverse=True)
+    summary = {"files": 0, "bytes": 0, "seconds": None, "bytes_per_second": None}
+    start = time.perf_counter()
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {}
+    try:
+        for filename in ordered:
+            futures[executor.submit(api.upload_file, app_id, filename, sandbox_id, stop)] = filename
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                content = future.result()
+                """ uploadfile.do rejects a file with an HTTP 200 and an <error> body """
+                error = parse_error(content) if content is not None and b"<error" in content else None
+                if error is not None:
+                    raise VeracodeAPIError(error)
+            except (VeracodeAPIError, VeracodeError, OSError) as e:
+                raise VeracodeError("Upload of '" + filename + "' failed: " + str(e))
+            summary["files"] += 1
+            summary["bytes"] += os.path.getsize(filename)
+            if on_uploaded is not None:
+                on_uploaded(filename)
+    finally:
+        stop.set()
+        """ the uploads that haven't started are cancelled (shutdown's cancel_futures needs Python 3.9) """
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+    seconds = max(time.perf_counter() - start, 1e-6)
+    summary["seconds"] = round(seconds, 3)
+    summary["bytes_per_second"] = int(summary["bytes"] / seconds)
+    return summary
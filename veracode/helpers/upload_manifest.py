@@ -0,0 +1,114 @@
+# Purpose:  Upload deduplication
+#
+# Notes:    The manifest for an app (or app + sandbox) lives in ~/.veracode/uploads/ and records
+#
+#           hashes   : local path -> size, mtime, sha256 and md5 (so unchanged files aren't re-hashed)
+#           uploaded : sha256 -> the file_name and build_id it was last uploaded as
+#
+#           Before uploading, the manifest is reconciled against the file list of the build on the Veracode
+#           Platform. A local file is skipped when a file with the same name and the same content is already
+#           attached to the build (and its upload succeeded), and a stale copy of a changed file, or one whose
+#           upload failed, is removed before it is uploaded again. Local files are told apart by their path, so
+#           files with the same name in different directories each need a server file of their own.
+#
+#           Each file is hashed (at most) once a run, by reconcile(), and only the files of the latest run are
+#           kept in the manifest, so e.g. the temporary paths of upload bundles don't pile up in it.
+
+import hashlib
+import os
+from helpers.store import JSONStore
+from helpers.store import veracode_path
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+""" the file_status of a file in getfilelist.do whose upload completed """
+UPLOADED_STATUS = "Uploaded"
+
+
+class UploadManifest:
+    def __init__(self, app_id, sandbox_id=None):
+        name = str(app_id) if sandbox_id is None else str(app_id) + "_" + str(sandbox_id)
+        self.store = JSONStore(veracode_path("uploads", name + ".json"))
+        data = self.store.load()
+        self.hashes = data.get("hashes", {})
+        self.uploaded = data.get("uploaded", {})
+
+    def hash_file(self, filename):
+        """Returns the (sha256, md5) of the file, re-using the previous hashes if the file hasn't changed."""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+            return cached["sha256"], cached["md5"]
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            while chunk:
+                sha256.update(chunk)
+                md5.update(chunk)
+                chunk = f.read(HASH_CHUNK_SIZE)
+        self.hashes[path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                             "sha256": sha256.hexdigest(), "md5": md5.hexdigest()}
+        return self.hashes[path]["sha256"], self.hashes[path]["md5"]
+
+    def digest(self, filename):
+        """Returns the (sha256, md5) of the file as reconcile() found it, hashing it if reconcile() hasn't."""
+        cached = self.hashes.get(os.path.abspath(filename))
+        if cached is not None:
+            return cached["sha256"], cached["md5"]
+        return self.hash_file(filename)
+
+    def is_attached(self, filename, server_file, build_id=None):
+        """Returns True if server_file (from the file list of build_id) was uploaded successfully and has the same
+        content as the local file."""
+        if server_file.get("file_status") != UPLOADED_STATUS:
+            return False
+        sha256, md5 = self.digest(filename)
+        if server_file.get("file_md5"):
+            return server_file["file_md5"].lower() == md5
+        """ no md5 from the platform so trust what we last uploaded under that name, to this build """
+        uploaded = self.uploaded.get(sha256)
+        return uploaded is not None and uploaded["file_name"] == server_file["file_name"] and \
+            build_id is not None and str(uploaded.get("build_id")) == str(build_id)
+
+    def reconcile(self, filenames, server_files, build_id=None):
+        """Returns (to_upload, skipped, to_remove). to_remove holds server files that will be replaced."""
+        """ hash this run's files, and forget the ones that aren't part of it any more """
+        hashes = {}
+        for filename in filenames:
+            self.hash_file(filename)
+            path = os.path.abspath(filename)
+            hashes[path] = self.hashes[path]
+        self.hashes = hashes
+        contents = {entry["sha256"] for entry in hashes.values()}
+        self.uploaded = {sha256: uploaded for sha256, uploaded in self.uploaded.items() if sha256 in contents}
+
+        by_name = {}
+        for server_file in server_files:
+            by_name.setdefault(server_file["file_name"], []).append(server_file)
+        to_upload = []
+        skipped = []
+        """ each server file is the attached copy of at most one local file """
+        matched = set()
+        for filename in filenames:
+            candidates = by_name.get(os.path.basename(filename), [])
+            attached = next((server_file for server_file in candidates if server_file["file_id"] not in matched
+                             and self.is_attached(filename, server_file, build_id)), None)
+            if attached is None:
+                to_upload.append(filename)
+            else:
+                matched.add(attached["file_id"])
+                skipped.append(filename)
+        """ the server files named like a local file that none of them matched are stale copies """
+        names = {os.path.basename(filename) for filename in to_upload}
+        to_remove = [server_file for name in names for server_file in by_name.get(name, [])
+                     if server_file["file_id"] not in matched]
+        return to_upload, skipped, to_remove
+
+    def record(self, filename, build_id):
+        sha256, md5 = self.digest(filename)
+        self.uploaded[sha256] = {"file_name": os.path.basename(filename), "md5": md5, "build_id": build_id}
+
+    def save(self):
+        self.store.save({"hashes": self.hashes, "uploaded": self.uploaded})
@@ -1,8 +1,121 @@
-import os
+# Purpose:  Service discovery
+#
+# Notes:    The CLI needs the name and help of every service to build its parser, but only ever runs one of them,
+#           and importing a service module imports its dependencies (requests, aiohttp, GitPython, etc.). So the
+#           services are found by reading the source of the modules in this package instead of importing them:
+#           every class that subclasses Service, with the name and help of the sub-parser its add_parser() adds.
+#
+#           The result (the manifest) is cached in ~/.veracode/services-manifest.json and only rebuilt when a
+#           module in the package is added, removed or changed. load() then imports just the one service that
+#           is needed.
+
+import ast
 import importlib
+import json
+import os
+import sys
+
+
+MANIFEST_VERSION = 2
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SKIP_MODULES = ("__init__.py", "base_service.py")
+""" the 3.7 parser gives string literals as ast.Str (.s), 3.8 on as ast.Constant (.value), and ast.Str is deprecated
+    from 3.8 """
+STRING_NODES = (ast.Str, ast.Constant) if sys.version_info < (3, 8) else (ast.Constant,)
+
+
+def _signature():
+    """ the modules of the package with their size and modification time """
+    files = []
+    for entry in os.scandir(DIRECTORY):
+        if entry.name.endswith(".py") and entry.name not in SKIP_MODULES:
+            stat = entry.stat()
+            files.append([entry.name, stat.st_size, stat.st_mtime_ns])
+    return sorted(files)
+
+
+def _string(node):
+    """ the value of a string literal, None for any other node """
+    value = getattr(node, "value", getattr(node, "s", None)) if isinstance(node, STRING_NODES) else None
+    return value if isinstance(value, str) else None
+
+
+def _parser_name(method):
+    """ the name and help of the first sub-parser add_parser(self, parsers) adds to parsers """
+    if len(method.args.args) < 2:
+        return None, None
+    parsers = method.args.args[1].arg
+    for node in ast.walk(method):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "add_parser" \
+                and isinstance(node.func.value, ast.Name) and node.func.value.id == parsers \
+                and len(node.args) > 0 and _string(node.args[0]) is not None:
+            help_text = None
+            for keyword in node.keywords:
+                if keyword.arg == "help":
+                    help_text = _string(keyword.value)
+            return _string(node.args[0]), help_text
+    return None, None
+
+
+def scan():
+    """Returns the manifest of the services in the package, read from their source: a dict of service name to
+    {"module", "class", "help"}."""
+    services = {}
+    for name, size, mtime in _signature():
+        with open(os.path.join(DIRECTORY, name), encoding="utf-8") as f:
+            tree = ast.parse(f.read(), name)
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            bases = [base.id if isinstance(base, ast.Name) else getattr(base, "attr", None) for base in node.bases]
+            if "Service" not in bases:
+                continue
+            service_name, help_text = None, None
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name == "add_parser":
+                    service_name, help_text = _parser_name(item)
+            services[service_name or node.name] = {"module": name[:-3], "class": node.name, "help": help_text}
+    return services
+
+
+def manifest(path=None):
+    """Returns the manifest of the services, from the cache if none of the modules have changed since it was
+    written."""
+    """ the cache is only an optimisation, e.g. a read only home directory just means scanning every time """
+    if path is None:
+        from helpers.store import veracode_path
+        try:
+            path = veracode_path("services-manifest.json")
+        except OSError:
+            return scan()
+    signature = _signature()
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached.get("version") == MANIFEST_VERSION and cached.get("directory") == DIRECTORY and \
+                cached.get("files") == signature:
+            return cached["services"]
+    except (OSError, ValueError, AttributeError):
+        pass
+    services = scan()
+    try:
+        from helpers.store import atomic_write
+        atomic_write(path, json.dumps({"version": MANIFEST_VERSION, "directory": DIRECTORY, "files": signature,
+                                       "services": services}, indent=2).encode("utf-8"))
+    except OSError:
+        pass
+    return services
+
+
+def load(name, services=None):
+    """Imports the module of the named service and returns its Service class."""
+    from services.base_service import Service
+    entry = (services if services is not None else manifest())[name]
+    importlib.import_module("." + entry["module"], __name__)
+    return Service.services[entry["class"]]
 
 
-for module in os.listdir(os.path.dirname(__file__)):
-    if module == '__init__.py' or module[-3:] != '.py':
-        continue
-    importlib.import_module("."+module[:-3], __name__)
\ No newline at end of file
+def load_all():
+    """Imports every service and returns their Service classes by name."""
+    services = manifest()
+    return {name: load(name, services) for name in services}
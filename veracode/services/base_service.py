@@ -3,12 +3,13 @@ from abc import abstractmethod
 
 
 class Service(ABC):
-    services = []
+    """ the Service classes that have been imported, by name (see services.load()) """
+    services = {}
     test = "yes, it works"
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
-        cls.services.append(cls())
+        cls.services[cls.__name__] = cls
 
 
     @abstractmethod
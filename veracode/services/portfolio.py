@@ -1,9 +1,14 @@
 from .base_service import Service
 from git import Repo
+import asyncio
 import os
 import logging
 import json
 
+from helpers.api import parse_app_list
+from helpers.api import parse_build_ids
+from helpers.async_api import AsyncVeracodeAPI
+
 
 class portfolio(Service):
     def __init__(self):
@@ -29,8 +34,10 @@ class portfolio(Service):
 
 
 
-    def execute(self, args, config, api):
-        if args.command == 'onboard':
+    def execute(self, args, config, api, context):
+        if args.command == 'list':
+            return self.list_apps(args, config, api, context)
+        elif args.command == 'onboard':
             """ onboard a new application """
             """ first we need to get the current repo"""
             logging.debug(2, "getting the current repo based on the current directory")
@@ -164,5 +171,20 @@ class portfolio(Service):
         else:
             print("execute called")
 
+    def list_apps(self, args, config, api, context):
+        output = {}
+        apps = api.get_app_list(parse=parse_app_list)
+        if not args.console:
+            print(f'{"info":10} : Found {len(apps)} application profiles. Getting latest builds...')
+        latest_builds = asyncio.run(self.get_latest_builds(api, list(apps)))
+        output["apps"] = {}
+        for app_id, app_name in apps.items():
+            output["apps"][app_id] = {"app_name": app_name, "latest_build_id": latest_builds[app_id]}
+        return output
 
-
+    async def get_latest_builds(self, api, app_ids):
+        """ fan out the getbuildlist.do calls, AsyncVeracodeAPI limits how many are in flight """
+        async with AsyncVeracodeAPI(api.proxies, api.api_key_id, api.api_key_secret) as async_api:
+            build_lists = await async_api.map(lambda app_id: async_api.get_build_list(app_id, parse=parse_build_ids),
+                                              app_ids)
+        return {app_id: build_ids[-1] if len(build_ids) > 0 else None for app_id, build_ids in zip(app_ids, build_lists)}
@@ -4,18 +4,46 @@ import os
 from antfs import AntPatternDirectoryScanner
 from services.base_service import Service
 from helpers.api import VeracodeAPI
+from helpers.api import parse_file_list
 import json
 import logging
 import re
 import time
-import xmltodict
 import traceback
+import shutil
 import sys
+import tempfile
 
+from helpers.exceptions import VeracodeAPIError
 from helpers.exceptions import VeracodeError
 from helpers.input import choice
 from helpers.input import free_text
+from helpers.input import number
 from helpers.input import patterns_list
+from helpers.output import Out
+from helpers.bundle import BUNDLE_MAX_ARCHIVE_SIZE
+from helpers.bundle import BUNDLE_THRESHOLD
+from helpers.bundle import bundle_files
+from helpers.upload import UPLOAD_WORKERS
+from helpers.upload import upload_files
+from helpers.upload_manifest import UploadManifest
+from helpers.diff import diff_flaws
+from helpers.diff import flaw_states
+from helpers.export import export_results
+from helpers.builds import is_ready
+from helpers.report_cache import ReportCache
+from helpers.report_cache import report_error
+from helpers.report_parser import parse_detailed_report
+from helpers.results_store import ResultsStore
+from helpers.rules import compile_rules
+from helpers.polling import DONE
+from helpers.polling import FAILED
+from helpers.polling import MAX_INTERVAL
+from helpers.polling import MIN_INTERVAL
+from helpers.polling import PollScheduler
+from helpers.polling import parse_target
+from helpers.polling import wait_for_builds
+from helpers.polling import wait_for_results
 
 class static(Service):
     def __init__(self):
@@ -37,6 +65,23 @@ class static(Service):
         start_parser = command_parsers.add_parser('start', help='start a static scan')
         """ results """
         results_parser = command_parsers.add_parser('results', help='get the results for a static scan. wait for the scan to complete if necessary')
+        results_parser.add_argument("--export", type=str, help="also write the flaws to a columnar file (.parquet or .npz) and summarise them")
+        """ wait """
+        wait_parser = command_parsers.add_parser('wait', help='wait for several static scans to complete')
+        wait_parser.add_argument("targets", nargs="+", help="the scans to wait for, as app_id:sandbox_id:build_id (or app_id:build_id for policy scans)")
+        """ diff """
+        diff_parser = command_parsers.add_parser('diff', help='compare the flaws of a static scan with those of an earlier scan')
+        diff_parser.add_argument("--base", type=str, required=True, help="the build ID of the scan to compare against")
+        """ query """
+        query_parser = command_parsers.add_parser('query', help='filter the flaws of the static scans whose results have been downloaded')
+        query_parser.add_argument("--app", type=str, help="only flaws from this app_id")
+        query_parser.add_argument("--severity", type=int, help="only flaws of at least this severity (0-5)")
+        query_parser.add_argument("--cwe", type=int, help="only flaws with this CWE id")
+        query_parser.add_argument("--module", type=str, help="only flaws in this module")
+        query_parser.add_argument("--path", type=str, help="only flaws in source files whose path matches this pattern (SQL LIKE, e.g. com/example/%%)")
+        query_parser.add_argument("--file", type=str, help="only flaws in this source file")
+        query_parser.add_argument("--issue", type=int, help="only the flaw with this issue id")
+        query_parser.add_argument("--limit", type=int, help="return at most this many flaws")
         """ decide """
         decide_parser = command_parsers.add_parser('decide', help='make a decision about the results of a scan')
         """ configure """
@@ -49,12 +94,19 @@ class static(Service):
     def execute(self, args, config, api, context):
         logging.debug("static service executed")
         self.console = args.console
+        self.out = Out(quiet=args.console, log_level=args.verbose + 1)
         if args.command == "configure":
             return self.configure(args, config, api, context)
         elif args.command == "start":
             return self.start(args, config, api, context)
         elif args.command == "results":
             return self.results(args, config, api, context)
+        elif args.command == "diff":
+            return self.diff(args, config, api, context)
+        elif args.command == "query":
+            return self.query(args, config, api, context)
+        elif args.command == "wait":
+            return self.wait(args, config, api, context)
         elif args.command == "decide":
             return self.decide(args, config, api, context)
         else:
@@ -79,6 +131,7 @@ class static(Service):
                 branch_type["static_config"]["scan_naming_env"] = free_text("Environment Variable to use for Scan Name", branch_type["static_config"]["scan_naming_env"])
             branch_type["static_config"]["upload_include_patterns"] = patterns_list("Upload Include Patterns", branch_type["static_config"]["upload_include_patterns"])
             branch_type["static_config"]["upload_exclude_patterns"] = patterns_list("Upload Exclude Patterns", branch_type["static_config"]["upload_exclude_patterns"])
+            branch_type["static_config"]["upload_workers"] = number("Number of files to upload in parallel", branch_type["static_config"].get("upload_workers", UPLOAD_WORKERS))
 
         """ write the config file """
         with open('veracode.config', 'w') as outfile:
@@ -153,15 +206,64 @@ class static(Service):
                 print("Uploading Files")
             ds = AntPatternDirectoryScanner(".", static_config["static_config"]["upload_include_patterns"],
                                             static_config["static_config"]["upload_exclude_patterns"])
-            for filename in ds.scan():
-                if not args.console:
-                    print("  " + filename)
-                api.upload_file(static_config["portfolio"]["app_id"], filename, self.sandbox_id)
+            app_id = static_config["portfolio"]["app_id"]
+            filenames = list(ds.scan())
+            bundle_dir = None
+            """ the bundles are removed whatever happens from here on, they hold zipped copies of the sources """
+            try:
+                if static_config["static_config"].get("upload_bundle", False):
+                    """ pack the small files into a few zip archives rather than uploading them one by one """
+                    bundle_dir = tempfile.mkdtemp(prefix="veracode-bundle-")
+                    matched = len(filenames)
+                    archives, filenames = bundle_files(filenames, bundle_dir,
+                                                       static_config["static_config"].get("upload_bundle_threshold", BUNDLE_THRESHOLD),
+                                                       static_config["static_config"].get("upload_bundle_max_size", BUNDLE_MAX_ARCHIVE_SIZE))
+                    if not args.console:
+                        print(f'  Bundled {matched - len(filenames)} small files into {len(archives)} archives')
+                    filenames = filenames + archives
+                manifest = None
+                if static_config["static_config"].get("upload_deduplicate", True):
+                    """ skip any files that are already attached to the build with the same content """
+                    manifest = UploadManifest(app_id, self.sandbox_id)
+                    server_files = api.get_file_list(app_id, build_id, self.sandbox_id, parse=parse_file_list)
+                    filenames, skipped, to_remove = manifest.reconcile(filenames, server_files, build_id)
+                    for server_file in to_remove:
+                        api.remove_file(app_id, server_file["file_id"], self.sandbox_id)
+                    if not args.console:
+                        print(f'  Skipped {len(skipped)} files which are already attached to the build unchanged')
+                    for filename in skipped:
+                        self.out.log(1, f'  {filename} : unchanged, already attached to the build')
+
+                progress = self.out.progress("uploading", len(filenames), "files")
+
+                def uploaded(filename):
+                    if manifest is not None:
+                        manifest.record(filename, build_id)
+                    progress.update()
+                    self.print_upload(api, filename)
+
+                workers = static_config["static_config"].get("upload_workers", UPLOAD_WORKERS)
+                try:
+                    summary = upload_files(api, app_id, filenames, self.sandbox_id, workers, uploaded)
+                finally:
+                    progress.close()
+                    if manifest is not None:
+                        manifest.save()
+            finally:
+                if bundle_dir is not None:
+                    shutil.rmtree(bundle_dir, ignore_errors=True)
+            if manifest is not None:
+                summary["skipped"] = len(skipped)
+            output["upload"] = summary
+            if not args.console:
+                print(f'  Uploaded {summary["files"]} files ({summary["bytes"]} bytes) in {summary["seconds"]}s '
+                      f'using {workers} workers ({summary["bytes_per_second"]} B/s)')
 
             """ enable AutoScan and lets get going """
             if not args.console:
                 print("Pre-Scan Starting. Auto-Scan is enabled - Full Scan will start automatically.")
             api.begin_prescan(static_config["portfolio"]["app_id"], "true", self.sandbox_id)
+            output["started"] = time.time()
             if not args.console:
                 print("Scan Started with Auto-Scan Enabled")
             return output
@@ -175,8 +277,63 @@ class static(Service):
 
 
 
+    def print_upload(self, api, filename):
+        upload_stats = api.upload_stats[filename]
+        self.out.log(1, f'  {filename} : {upload_stats["bytes"]} bytes in {upload_stats["seconds"]}s '
+                        f'({upload_stats["bytes_per_second"]} B/s, time to first byte '
+                        f'{upload_stats["time_to_first_byte"]}s)')
+
+    def print_poll(self, scheduler, build, delay, eta):
+        eta_text = "unknown" if eta is None else datetime.datetime.fromtimestamp(eta).strftime("%H:%M:%S")
+        print(f'{"info":10} : {build.status} ({scheduler.phase} for {int(scheduler.elapsed())}s). '
+              f'Checking again in {int(delay)}s, ETA {eta_text}')
+
+    def open_report(self, args, api, app_id, sandbox_id, build_id, build=None):
+        """ the detailed report as a file, from the report cache if the build hasn't changed since it was cached """
+        if args.no_cache:
+            report = tempfile.TemporaryFile()
+            try:
+                size = api.download_detailed_report(build_id, report)
+                report.seek(0)
+                error = report_error(report, size)
+                if error is not None:
+                    raise VeracodeAPIError(f'Unable to download the detailed report of build {build_id}: {error}')
+                report.seek(0)
+            except BaseException:
+                report.close()
+                raise
+            return report
+        if build is None:
+            build = api.get_build_status(app_id, build_id, sandbox_id)
+        return ReportCache().open(api, build_id, build.policy_updated_date)
+
+    def download_results(self, args, api, store, app_id, sandbox_id, build_id, build=None):
+        """ download the results as xml and parse them a flaw at a time """
+        if build is None and not args.no_cache:
+            build = api.get_build_status(app_id, build_id, sandbox_id)
+        verbose = self.out.log_level > 1
+        with self.open_report(args, api, app_id, sandbox_id, build_id, build) as report, \
+                self.out.progress("parsing", unit="flaws") as progress:
+            def parsed(issue_id, flaw):
+                progress.update()
+                if verbose:
+                    self.out.log(1, f'parsing flaw {issue_id}')
+
+            results = parse_detailed_report(report, on_flaw=parsed)
+        if store is not None:
+            store.ingest(app_id, sandbox_id, build_id, results, None if build is None else build.policy_updated_date)
+        return results
+
+    def export(self, args, output):
+        if args.export is not None:
+            output["summary"] = export_results(self.parsed_results, args.export)
+            output["export"] = args.export
+            if not args.console:
+                print(f'{"info":10} : Wrote {len(self.parsed_results.get("flaws", {}))} flaws to {args.export}')
+
     def results(self, args, config, api, context):
         output = {}
+        store = None
 
         """ Does the branch match the previous command? """
         if "branch" in context and context["branch"] != args.branch:
@@ -222,45 +379,60 @@ class static(Service):
                     else:
                         if not args.console:
                             print(f'{"info":10} : Getting latest build_id (app_id={static_config["portfolio"]["app_id"]})')
-                            build_id = api.get_latest_build_id(static_config["portfolio"]["app_id"])
+                        build_id = api.get_latest_build_id(static_config["portfolio"]["app_id"])
 
 
                 if build_id is None:
                     """ Problem, cannot proceed without a build_id """
-
+                    raise VeracodeError("Unable to find a build_id for the scan")
+
+
+                if sandbox_id is None:
+                    sandbox_id = self.sandbox_id
+                store = None if args.no_cache else ResultsStore()
+                build = None
+                if store is not None:
+                    """ use the results we already have, unless the report has changed since they were stored """
+                    build = api.get_build_status(static_config["portfolio"]["app_id"], build_id, sandbox_id)
+                if build is not None and store.has_build(build_id, build.policy_updated_date):
+                    if not args.console:
+                        print(f'{"info":10} : Using the stored results for build {build_id}')
+                    self.parsed_results = store.load(build_id)
+                    output["results"] = self.parsed_results
+                    self.export(args, output)
+                    return output
 
                 """ wait for the scan results to be ready, up to timeout... """
-                print(f'{"info":10} : Current time is {str(int(round(time.time())))}')
-                timeout = int(round(time.time())) + static_config["static_config"]["results_timeout"]
-                print(f'{"info":10} : Timeout is {str(timeout)}')
-                ready = api.results_ready(static_config["portfolio"]["app_id"], build_id, self.sandbox_id)
+                started = context.get("started") if context.get("build_id") == build_id else None
+                scheduler = PollScheduler(static_config["static_config"].get("results_poll_min", MIN_INTERVAL),
+                                          static_config["static_config"].get("results_poll_max", MAX_INTERVAL))
+                final_phase = wait_for_results(api, static_config["portfolio"]["app_id"], build_id, sandbox_id,
+                                               static_config["static_config"]["results_timeout"], started=started,
+                                               scheduler=scheduler, on_poll=None if args.console else self.print_poll)
+                ready = final_phase == DONE
                 if not args.console:
-                    if not ready:
-                        print(f'{"info":10} : Results not ready. Try again in 15s...')
-                    else:
-                        print(f'{"info":10} : Results are ready')
-                while not ready and timeout > int(round(time.time())):
-                    print("sleeping")
-                    time.sleep(15)
-                    ready = api.results_ready(static_config["portfolio"]["app_id"], context["build_id"], self.sandbox_id)
+                    print(f'{"info":10} : Results {"are ready" if ready else "not ready"} after {scheduler.polls} checks')
+                if final_phase == FAILED:
+                    raise VeracodeError(f'Scan of build {build_id} failed')
 
                 """ are the results ready? """
                 if not ready:
                     """ We have timed out and the results aren't ready """
                     output["error"] = "Results were not ready within the timeout."
                 else:
-                    """ download the results as xml and convert to dict """
-                    detailed_report_xml = api.get_detailed_report(build_id)
-                    raw_results = xmltodict.parse(detailed_report_xml)["detailedreport"]
-                    self.parse_results(config, raw_results)
+                    """ the status from before the wait is only current if the results were already ready """
+                    self.parsed_results = self.download_results(args, api, store, static_config["portfolio"]["app_id"],
+                                                                sandbox_id, build_id,
+                                                                build if build is not None and is_ready(build) else None)
                     output["results"] = self.parsed_results
+                    self.export(args, output)
                     # output["results"] = raw_results
 
             elif static_config["static_config"]["scan_type"] == "pipeline":
                 """ this is where we would handle results for the pipeline scanner"""
 
             return output
-        except VeracodeError as err:
+        except (VeracodeError, VeracodeAPIError) as err:
             if not args.console:
                 print(f'{"exception":10} : Unexpected Exception (Static.py) #001 : {str(err)}')
             output["error"] = str(err)
@@ -270,8 +442,107 @@ class static(Service):
             output["error"] = f'Unexpected Exception (Static.py) #001 : {sys.exc_info()[0]}'
             traceback.print_exc()
         finally:
+            if store is not None:
+                store.close()
+            return output
+
+
+    def diff(self, args, config, api, context):
+        output = {}
+        head = args.id if args.id is not None else context.get("build_id")
+        if head is None:
+            output["error"] = "No build to compare. Use --id or run after static start/results"
             return output
+        app_id = config["portfolio"]["app_id"]
+        """ the head is usually the build of the context, which may be a sandbox scan. the base is a policy scan """
+        sandbox_ids = {args.base: None,
+                       head: context.get("sandbox_id") if str(head) == str(context.get("build_id")) else None}
+        store = None if args.no_cache else ResultsStore()
+        try:
+            states = []
+            for build_id in (args.base, head):
+                """ builds stored at their current policy_updated_date are compared straight from the store """
+                build = api.get_build_status(app_id, build_id, sandbox_ids[build_id])
+                if store is None or not store.has_build(build_id, build.policy_updated_date):
+                    if not is_ready(build):
+                        raise VeracodeError(f'The results of build {build_id} are not ready')
+                    if not args.console:
+                        print(f'{"info":10} : Downloading the results of build {build_id}')
+                    results = self.download_results(args, api, store, app_id, sandbox_ids[build_id], build_id, build)
+                    if store is None:
+                        states.append(flaw_states(results))
+                        continue
+                states.append(store.flaw_states(build_id))
+            diff = diff_flaws(states[0], states[1])
+        except (VeracodeError, VeracodeAPIError) as err:
+            output["error"] = str(err)
+            return output
+        finally:
+            if store is not None:
+                store.close()
+        output["diff"] = {"base": args.base, "head": str(head),
+                          "counts": {kind: len(issue_ids) for kind, issue_ids in diff.items()},
+                          "new": diff["new"], "fixed": diff["fixed"], "reopened": diff["reopened"]}
+        if not args.console:
+            print(f'{"info":10} : Build {head} compared with {args.base}: ' +
+                  ", ".join(f'{count} {kind}' for kind, count in output["diff"]["counts"].items()))
+        return output
 
+    def query(self, args, config, api, context):
+        output = {}
+        store = ResultsStore()
+        try:
+            output["flaws"] = store.query(args.limit, app_id=args.app, build_id=args.id, issue_id=args.issue,
+                                          severity=args.severity, cwe_id=args.cwe, module=args.module,
+                                          sourcefile_path=args.path, sourcefile=args.file)
+        finally:
+            store.close()
+        if not args.console:
+            print(f'{"info":10} : Found {len(output["flaws"])} flaws')
+        return output
+
+    def wait(self, args, config, api, context):
+        output = {}
+        try:
+            targets = [parse_target(target) for target in args.targets]
+        except ValueError as err:
+            output["error"] = str(err)
+            return output
+        static_config = config.get("static_config", {})
+        scheduler = PollScheduler(static_config.get("results_poll_min", MIN_INTERVAL),
+                                  static_config.get("results_poll_max", MAX_INTERVAL))
+
+        def completed(target, phase_name):
+            """ report each scan as soon as it finishes, in console mode as a JSON line on stderr """
+            app_id, sandbox_id, build_id = target
+            if args.console:
+                print(json.dumps({"app_id": app_id, "sandbox_id": sandbox_id, "build_id": build_id,
+                                  "status": phase_name}), file=sys.stderr, flush=True)
+            else:
+                print(f'{phase_name:10} : build {build_id} (app_id={app_id}, sandbox_id={sandbox_id}) '
+                      f'after {int(time.time() - started)}s')
+
+        def polled(scheduler, pending, delay):
+            if not args.console:
+                print(f'{"info":10} : {len(pending)} of {len(targets)} scans still running. '
+                      f'Checking again in {int(delay)}s')
+
+        started = time.time()
+        try:
+            phases = wait_for_builds(api, targets, static_config.get("results_timeout", 3600), scheduler,
+                                     completed, polled)
+        except VeracodeError as err:
+            output["error"] = str(err)
+            return output
+        output["builds"] = {build_id: {"app_id": app_id, "sandbox_id": sandbox_id, "status": phases.get(build_id)}
+                            for app_id, sandbox_id, build_id in targets}
+        failed = [build_id for build_id, build in output["builds"].items() if build["status"] == FAILED]
+        waiting = [build_id for build_id, build in output["builds"].items() if build["status"] not in (DONE, FAILED)]
+        if len(failed) > 0:
+            output["error"] = f'Scans failed for builds {", ".join(failed)}'
+        elif len(waiting) > 0:
+            output["error"] = f'Results were not ready within the timeout for builds {", ".join(waiting)}'
+        return output
 
     def decide(self, args, config, api, context):
         output = {}
@@ -294,216 +565,17 @@ class static(Service):
             we can just return. If the decision is Negative then we put something into
             the error field of the output  """
         output = context
+        rules = compile_rules(config.get("static_config", {}))
+        if not rules:
+            if not args.console:
+                print(f'{"info":10} : No decision rules configured in static_config')
+            return output
+        output["decision"] = rules.evaluate(context["results"].get("flaws", {}))
+        if not args.console:
+            for violation in output["decision"]["violations"]:
+                print(f'{"fail":10} : {violation["message"]}')
+            print(f'{"decision":10} : {output["decision"]["decision"]}')
+        if output["decision"]["decision"] == "fail":
+            output["error"] = "Static scan failed the decision rules: " + \
+                              "; ".join(violation["message"] for violation in output["decision"]["violations"])
         return output
-
-
-    def parse_results(self, config, res, severity=None, category=None, cwe=None, flaw=None):
-        if flaw is not None:
-            if not self.console:
-                print(f'{"info":10} : parsing flaw {flaw["@issueid"]}')
-            """ create the flaw dictionary """
-            the_flaw = {}
-            the_flaw["severity"] = flaw["@severity"]
-            the_flaw["module"] = flaw["@module"]
-            the_flaw["type"] = flaw["@type"]
-            the_flaw["description"] = self.parse_text2(flaw["@description"])
-            the_flaw["recommendations"] = self.parse_text3(flaw["@description"])
-            the_flaw["note"] = flaw["@note"]
-            the_flaw["cwe_id"] = flaw["@cweid"]
-            the_flaw["remediation_effort"] = flaw["@remediationeffort"]
-            the_flaw["exploit_level"] = flaw["@exploitLevel"]
-            the_flaw["category_id"] = flaw["@categoryid"]
-            the_flaw["pci_related"] = flaw["@pcirelated"]
-            the_flaw["date_first_occurrence"] = flaw["@date_first_occurrence"]
-            the_flaw["remediation_status"] = flaw["@remediation_status"]
-            the_flaw["cia_impact"] = flaw["@cia_impact"]
-            the_flaw["grace_period_expires"] = flaw["@grace_period_expires"]
-            the_flaw["affects_policy_compliance"] = flaw["@affects_policy_compliance"]
-            the_flaw["mitigation_status"] = flaw["@mitigation_status"]
-            the_flaw["mitigation_status_desc"] = flaw["@mitigation_status_desc"]
-            the_flaw["sourcefile"] = flaw["@sourcefile"]
-            the_flaw["sourcefile_path"] = flaw["@sourcefilepath"]
-            the_flaw["scope"] = flaw["@scope"]
-            the_flaw["function_prototype"] = flaw["@functionprototype"]
-            the_flaw["function_relative_location"] = flaw["@functionrelativelocation"]
-            if "annotations" in flaw:
-                if "annotation" in flaw["annotations"]:
-                    the_flaw["comments"] = []
-                    if type(flaw["annotations"]["annotation"]) is list:
-                        for an in flaw["annotations"]["annotation"]:
-                            comment = {}
-                            comment["date"] = an["@date"]
-                            comment["description"] = an["@description"]
-                            comment["user"] = an["@user"]
-                            the_flaw["comments"].insert(0, comment)
-                    else:
-                        comment = {}
-                        comment["date"] = flaw["annotations"]["annotation"]["@date"]
-                        comment["description"] = flaw["annotations"]["annotation"]["@description"]
-                        comment["user"] = flaw["annotations"]["annotation"]["@user"]
-                        the_flaw["comments"].insert(0, comment)
-            if "mitigations" in flaw:
-                if "mitigation" in flaw["mitigations"]:
-                    the_flaw["mitigations"] = []
-                    if type(flaw["mitigations"]["mitigation"]) is list:
-                        for an in flaw["mitigations"]["mitigation"]:
-                            comment = {}
-                            comment["action"] = an["@action"]
-                            comment["date"] = an["@date"]
-                            comment["description"] = an["@description"]
-                            comment["user"] = an["@user"]
-                            the_flaw["mitigations"].insert(0, comment)
-                    else:
-                        comment = {}
-                        comment["action"] = flaw["mitigations"]["mitigation"]["@action"]
-                        comment["date"] = flaw["mitigations"]["mitigation"]["@date"]
-                        comment["description"] = flaw["mitigations"]["mitigation"]["@description"]
-                        comment["user"] = flaw["mitigations"]["mitigation"]["@user"]
-                        the_flaw["mitigations"].insert(0, comment)
-
-            """ update the severity results """
-            if "flaws" not in self.parsed_results["severities"][severity["@level"]]:
-                self.parsed_results["severities"][severity["@level"]]["flaws"] = []
-            self.parsed_results["severities"][severity["@level"]]["flaws"].append(flaw["@issueid"])
-            self.parsed_results["severities"][severity["@level"]]["count"] += 1
-            """ update the category results """
-            if "flaws" not in self.parsed_results["categories"][category["@categoryid"]]:
-                self.parsed_results["categories"][category["@categoryid"]]["flaws"] = []
-            self.parsed_results["categories"][category["@categoryid"]]["flaws"].append(flaw["@issueid"])
-            self.parsed_results["categories"][category["@categoryid"]]["count"] += 1
-            """ Update the cwe results """
-            if "flaws" not in self.parsed_results["cwes"][cwe["@cweid"]]:
-                self.parsed_results["cwes"][cwe["@cweid"]]["flaws"] = []
-            self.parsed_results["cwes"][cwe["@cweid"]]["flaws"].append(flaw["@issueid"])
-            self.parsed_results["cwes"][cwe["@cweid"]]["count"] += 1
-            """ add the flaw to the flaws results """
-            if "flaws" not in self.parsed_results:
-                self.parsed_results["flaws"] = {}
-            self.parsed_results["flaws"][flaw["@issueid"]] = the_flaw
-
-        elif cwe is not None:
-            if not self.console:
-                print(f'{"info":10} : parsing cwe')
-            """ add this cwe to the parsed results"""
-            if "cwes" not in self.parsed_results:
-                self.parsed_results["cwes"] = {}
-            if cwe["@cweid"] not in self.parsed_results["cwes"]:
-                self.parsed_results["cwes"][cwe["@cweid"]] = {}
-                self.parsed_results["cwes"][cwe["@cweid"]]["name"] = cwe["@cwename"]
-                if "@pcirelated" in cwe:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["pci_related"] = cwe["@pcirelated"]
-                else:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["pci_related"] = None
-                if "@owasp" in cwe:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["owasp"] = cwe["@owasp"]
-                else:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["owasp"] = None
-                if "@owasp2013" in cwe:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["owasp2013"] = cwe["@owasp2013"]
-                else:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["owasp2013"] = None
-                if "@sans" in cwe:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["sans"] = cwe["@sans"]
-                else:
-                    self.parsed_results["cwes"][cwe["@cweid"]]["sans"] = None
-                self.parsed_results["cwes"][cwe["@cweid"]]["description"] = self.parse_text1(cwe["description"])
-                self.parsed_results["cwes"][cwe["@cweid"]]["count"] = 0
-            """ parse the cwe """
-            for k, v in cwe.items():
-                if k == "staticflaws":
-                    if type(v["flaw"]) is list:
-                        for f in v["flaw"]:
-                            if not self.console:
-                                print(f'{"info":10} : found flaw (and it is a list)')
-                            self.parse_results(config, res, severity, category, cwe, f)
-                    else:
-                        if not self.console:
-                            print(f'{"info":10} : found flaw')
-                        self.parse_results(config, res, severity, category, cwe, v["flaw"])
-
-        elif category is not None:
-            if not self.console:
-                print(f'{"info":10} : parsing category {category["@categoryname"]} ({category["@categoryid"]})')
-            """ add this category to the p[arsed results """
-            if "categories" not in self.parsed_results:
-                self.parsed_results["categories"] = {}
-            if category["@categoryid"] not in self.parsed_results["categories"]:
-                self.parsed_results["categories"][category["@categoryid"]] = {}
-                self.parsed_results["categories"][category["@categoryid"]]["name"] = category["@categoryname"]
-                self.parsed_results["categories"][category["@categoryid"]]["pci_related"] = category["@pcirelated"]
-                self.parsed_results["categories"][category["@categoryid"]]["description"] = self.parse_text1(category["desc"])
-                self.parsed_results["categories"][category["@categoryid"]]["recommendations"] = self.parse_text1(category["recommendations"])
-                self.parsed_results["categories"][category["@categoryid"]]["count"] = 0
-            """ parse the category """
-            for k, v in category.items():
-                if k == "cwe":
-                    if type(v) is list:
-                        if not self.console:
-                            print(f'{"info":10} : found cwe (and it is a list)')
-                        for x in v:
-                            self.parse_results(config, res, severity, category, x)
-                    else:
-                        if not self.console:
-                            print(f'{"info":10} : found cwe')
-                        self.parse_results(config, res, severity, category, v)
-        elif severity is not None:
-            if not self.console:
-                print(f'{"info":10} : parsing severity {severity["@level"]}')
-            """ add this severity to the parsed results """
-            if "severities" not in self.parsed_results:
-                self.parsed_results["severities"] = {}
-            if severity["@level"] not in self.parsed_results["severities"]:
-                self.parsed_results["severities"][severity["@level"]] = {}
-                if severity["@level"] == "5":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "Very High"
-                elif severity["@level"] == "4":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "High"
-                elif severity["@level"] == "3":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "Medium"
-                elif severity["@level"] == "2":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "Low"
-                elif severity["@level"] == "1":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "Very Low"
-                elif severity["@level"] == "0":
-                    self.parsed_results["severities"][severity["@level"]]["name"] = "Information"
-                self.parsed_results["severities"][severity["@level"]]["count"] = 0
-
-            """ parse the severity """
-            if "category" in severity:
-                if "@categoryid" in severity["category"]:
-                    if not self.console:
-                        print(f'{"info":10} : found category "{severity["category"]["@categoryname"]}" as the only category')
-                        self.parse_results(config, res, severity, severity["category"])
-                    else:
-                        for cat in severity["category"]:
-                            if not self.console:
-                                print(f'{"info":10} : found category "{cat["@categoryname"]}"')
-                            self.parse_results(config, res, severity, cat)
-        else:
-            if not self.console:
-                print(f'{"info":10} : parsing root')
-            self.parsed_results["scan"] = {}
-            self.parsed_results["scan"]["app_name"] = res["@app_name"]
-            self.parsed_results["scan"]["app_id"] = res["@app_id"]
-            self.parsed_results["scan"]["sandbox_id"] = res["@sandbox_id"]
-            self.parsed_results["scan"]["policy_name"] = res["@app_name"]
-            self.parsed_results["scan"]["scan_name"] = res["@version"]
-            self.parsed_results["scan"]["policy_compliance"] = res["@policy_compliance_status"]
-
-            """ parse the root """
-            for k, v in res.items():
-                if k == "severity":
-                    if not self.console:
-                        print(f'{"info":10} : found severities')
-                    """ this is the severities """
-                    for severity in v:
-                        self.parse_results(config, res, severity)
-
-    def parse_text1(self, input):
-        return input
-
-    def parse_text2(self, input):
-        return input
-
-    def parse_text3(self, input):
-        return input
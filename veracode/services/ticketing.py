@@ -6,6 +6,12 @@ import os
 import re
 import pprint
 import json
+import sys
+from helpers.exceptions import TicketingError
+from helpers.comments import CommentBatcher
+from helpers.jira_sync import create_jira_sync
+from helpers.sync_ledger import SyncLedger
+from helpers.tickets import plan_tickets
 
 
 class ticketing(Service):
@@ -27,6 +33,7 @@ class ticketing(Service):
         command_parsers = ticketing_parser.add_subparsers(dest='command', help='Ticketing Service Command description')
         """ synchronize """
         sync_parser = command_parsers.add_parser('synchronize', help='Synchronise the latest scan results with the Ticketing System')
+        sync_parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="only plan the ticket actions, don't change any tickets")
         """ configure """
         configure_parser = command_parsers.add_parser('configure', help='configure the ticketing config blocks in the veracode.config file')
         """ optional parameters """
@@ -56,17 +63,70 @@ class ticketing(Service):
             if not args.console:
                 print(f'{"error":10} : ticketing.synchronise - {output["error"]}')
             return output
+        ticketing_config = config.get("ticketing_config", {})
+        ledger = None
         try:
-            """ parse the results into Ticket Actions the tickets """
-            self.parse_results(config, context["results"])
+            jira = None
+            tickets = None
+            if not args.dry_run:
+                """ the ledger of what was synced last time, so unchanged tickets aren't touched """
+                if ticketing_config.get("jira_base_url") and not getattr(args, "no_cache", False):
+                    ledger = SyncLedger()
+                jira = create_jira_sync(ticketing_config, config.get("portfolio", {}).get("app_id"),
+                                        getattr(api, "proxies", None), ledger)
+            if jira is not None:
+                """ the tickets the app already has, they take precedence over the flaw comments """
+                tickets = jira.prefetch()
+                if not args.console:
+                    print(f'{"info":10} : Found {len(tickets)} existing tickets')
+            """ plan the Ticket Actions (create, update, close) for the flaws in the results """
+            self.ticket_actions["flaws"] = plan_tickets(ticketing_config, context["results"], tickets)
             output["ticket_actions"] = self.ticket_actions
+            if jira is not None:
+                output["ticket_sync"] = jira.sync(self.ticket_actions["flaws"])
+                self.write_back(args, api, ticketing_config, context, jira, output["ticket_sync"])
+        except (ValueError, TicketingError) as err:
+            output["error"] = str(err)
+            if not args.console:
+                print(f'{"error":10} : ticketing.synchronise - {output["error"]}')
+            return output
         except:
-            output["error"] = "Unexpected Exception #005 (static.py) : " + str(sys.exc_info()[0])
+            output["error"] = "Unexpected Exception #005 (ticketing.py) : " + str(sys.exc_info()[0])
             return output
+        finally:
+            if ledger is not None:
+                ledger.close()
 
-        return output
-
-
-
+        if not args.console:
+            counts = {"create": 0, "update": 0, "close": 0}
+            for action in self.ticket_actions["flaws"]:
+                counts[action["type"]] += 1
+            print(f'{"info":10} : Ticket actions: ' + ", ".join(f'{count} to {kind}' for kind, count in counts.items()))
+            if "ticket_sync" in output:
+                sync = output["ticket_sync"]
+                print(f'{"info":10} : {len(sync["created"])} tickets created, {sync["updated"]} updated, '
+                      f'{sync["closed"]} closed, {sync["unchanged"]} unchanged, {len(sync["errors"])} errors')
 
+        if "ticket_sync" in output and len(output["ticket_sync"]["errors"]) > 0:
+            output["error"] = f'{len(output["ticket_sync"]["errors"])} ticket actions failed'
+        return output
 
+    def write_back(self, args, api, ticketing_config, context, jira, sync):
+        """ comment the issue key of each new ticket on its flaw, including the keys an earlier sync created but
+            didn't write back, and mark the ones that were written in the ledger """
+        build_id = context.get("build_id")
+        flaws = context["results"].get("flaws", {})
+        issue_keys = {issue_id: issue_key for issue_id, issue_key in jira.pending_keys().items() if issue_id in flaws}
+        issue_keys.update(sync["created"])
+        if build_id is None or len(issue_keys) == 0:
+            return
+        comments = CommentBatcher(api, ticketing_config.get("type", "JIRA"),
+                                  shared_issue_keys=ticketing_config.get("shared_issue_key_comments", False))
+        for issue_id, issue_key in issue_keys.items():
+            comments.add_issue_key(build_id, issue_id, issue_key)
+        summary = comments.flush()
+        sync["errors"].extend(summary["errors"])
+        failed = set(issue_id for error in summary["errors"] for issue_id in error["issueids"])
+        jira.keys_written([issue_id for issue_id in issue_keys if issue_id not in failed])
+        if not args.console:
+            print(f'{"info":10} : Commented the issue keys on {summary["flaws"]} flaws with {summary["calls"]} calls')
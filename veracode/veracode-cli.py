@@ -1,21 +1,17 @@
 import argparse
 import json
-import logging
-from git import Repo
 import os
 import sys
 import re
 import traceback
 import services
-from services.base_service import Service
-from helpers.json_skeletons import JSONSkeleton
-from importlib import import_module
-
-from helpers.api import VeracodeAPI
-from helpers.exceptions import VeracodeAPIError
 from helpers.exceptions import VeracodeError
 import configparser
 
+""" GitPython, requests, xmltodict and the API signing are only imported once a command needs them (see run()),
+    and only the module of the service being run is imported (see services.load()), so that --help, readme and
+    the parsing of the command line don't wait for them """
+
 banner = """
                                           _                     _  _ 
  __   __ ___  _ __  __ _   ___  ___    __| |  ___          ___ | |(_)
@@ -78,33 +74,57 @@ Once you have your credentials there are 3 ways to supply them:
   https://help.veracode.com/reader/LMv_dtSHyb7iIxAQznC~9w/1EGRCXxGvHuj5wxn6h3eXA
 """
 
+def create_parser(manifest, selected=None):
+    """Returns the argument parser, with the full sub-parser of the selected Service class and, for the other
+    services, a sub-parser with just their name and help (taken from the manifest, without importing them)."""
+    parser = argparse.ArgumentParser(prog='veracode-cli',
+                                     description='A Command Line Interface for interacting with Veracode Services using a local JSON configuration file to manage the settings that are used. For more information use the readme service.')
+    parser.add_argument("-v", "--vid", type=str, help="API ID for the Veracode Platform user")
+    parser.add_argument("-k", "--vkey", type=str, help="API Key for the Veracode Platform user")
+    parser.add_argument("-s", "--stage", type=str,
+                        help="Stage name to be used to select the activities settings")
+    parser.add_argument("-b", "--branch", type=str,
+                        help="Branch name to be used to select configuration settings")
+    parser.add_argument("-c", "--console", action="store_true",
+                        help="Should the output be sent the console. If this is enabled then all other console output will be suppressed")
+    parser.add_argument("-e", "--error", action="store_true",
+                        help="Should the command fail if the veracode-cli.output file contains an error")
+    parser.add_argument("--verbose", action="count", default=0,
+                        help="Show a line for every item (flaw, file, etc.) rather than progress counts")
+    parser.add_argument("--pool_size", type=int, default=10,
+                        help="Number of pooled keep-alive connections to the Veracode API (default 10)")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Don't read or write cached Veracode API responses (~/.veracode/cache)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached Veracode API responses but cache the fresh ones")
+    """ add sub-parsers for each of the services """
+    service_parsers = parser.add_subparsers(dest='service', help='Veracode service description')
+    service_parsers.add_parser('readme', help='show the detailed readme information')
+    for name, entry in manifest.items():
+        if selected is not None and selected.__name__ == entry["class"]:
+            selected().add_parser(service_parsers)
+        else:
+            """ placeholder: the first parse only needs the name, and --help only the help """
+            placeholder = service_parsers.add_parser(name, help=entry["help"], add_help=False)
+            placeholder.add_argument("rest", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
 ########################################################################################################################
 # Main entry point
 #
 def run():
-    try:
-        """ setup the main arugment parser """
-        parser = argparse.ArgumentParser(prog='veracode-cli',
-                                         description='A Command Line Interface for interacting with Veracode Services using a local JSON configuration file to manage the settings that are used. For more information use the readme service.')
-        parser.add_argument("-v", "--vid", type=str, help="API ID for the Veracode Platform user")
-        parser.add_argument("-k", "--vkey", type=str, help="API Key for the Veracode Platform user")
-        parser.add_argument("-s", "--stage", type=str,
-                            help="Stage name to be used to select the activities settings")
-        parser.add_argument("-b", "--branch", type=str,
-                            help="Branch name to be used to select configuration settings")
-        parser.add_argument("-c", "--console", action="store_true",
-                            help="Should the output be sent the console. If this is enabled then all other console output will be suppressed")
-        parser.add_argument("-e", "--error", action="store_true",
-                            help="Should the command fail if the veracode-cli.output file contains an error")
-        """ add sub-parsers for each of the services """
-        service_parsers = parser.add_subparsers(dest='service', help='Veracode service description')
-        readme_parser = service_parsers.add_parser('readme', help='show the detailed readme information')
-        for service_class in Service.services:
-            service_class.add_parser(service_parsers)
-
-        """ parse the command line """
-        args = parser.parse_args()
+    api = None
+    """ parse the command line, with the sub-parser of the selected service (if any). this is done before the try
+        below so that --help and usage errors exit here, rather than being reported as unexpected exceptions """
+    manifest = services.manifest()
+    args, unknown = create_parser(manifest).parse_known_args()
+    if args.service in manifest:
+        args = create_parser(manifest, services.load(args.service, manifest)).parse_args()
+    else:
+        args = create_parser(manifest).parse_args()
 
+    try:
         """ set up the output_data object """
         output_data = {}
 
@@ -146,7 +166,15 @@ def run():
             else:
                 try:
                     """ create the Veracode API instance """
-                    api = VeracodeAPI(None, args.vid, args.vkey)
+                    from helpers.api import VeracodeAPI
+                    from helpers.builds import BuildStates
+                    from helpers.cache import ResponseCache
+                    from helpers.index import NameIndex
+                    cache = None if args.no_cache else ResponseCache(refresh=args.refresh)
+                    index = None if args.no_cache else NameIndex(args.vid, refresh=args.refresh)
+                    builds = None if args.no_cache else BuildStates(args.vid)
+                    api = VeracodeAPI(None, args.vid, args.vkey, pool_size=args.pool_size, cache=cache, index=index,
+                                      builds=builds)
                 except:
                     """ error message about incorrect credentials """
                     print(f'{"exception":10} : Unexpected Exception #001 : {sys.exc_info()[0]}')
@@ -175,6 +203,7 @@ def run():
         """ what Branch are we working on """
         if args.branch is None:
             """ get the current repository"""
+            from git import Repo
             repo = Repo(os.path.curdir)
             if repo.bare:
                 raise VeracodeError("No usable Git Repository found. Unable to identify active branch.")
@@ -257,7 +286,7 @@ def run():
                 print(f'{"context":10} : {context}')
                 print()
             """ load the relevant service class """
-            service = my_import('services.' + args.service + '.' + args.service)
+            service = services.load(args.service, manifest)
             instance = service()
             """ execute the service """
             output_data = instance.execute(args, branch_config, api, context)
@@ -283,14 +312,20 @@ def run():
     finally:
         if not args.console:
             print()
+            """ how much time went on connecting vs talking to the API? """
+            if api is not None:
+                stats = api.get_stats()
+                print(f'{"api":10} : {stats["calls"]} calls over {stats["connections"]} connections, '
+                      f'{stats["handshake_seconds"]}s in handshakes, {stats["request_seconds"]}s in requests')
             """ if there's an error then lets print it out"""
             if "error" in output_data:
                 if output_data["error"] is not None:
                     print(output_data["error"])
 
             """ send the output to veracode-cli.output """
+            from helpers.report_parser import to_json
             with open('veracode-cli.output', 'w') as outfile:
-                json.dump(output_data, outfile, indent=4, sort_keys=True)
+                json.dump(output_data, outfile, indent=4, sort_keys=True, default=to_json)
         """ Always output to the console """
         print(output_data)
         if "error" in output_data:
@@ -302,22 +337,6 @@ def run():
             return 0
 
 
-def get_service(name):
-    kludge = 'services.' + name + '.' + name
-    components = kludge.split('.')
-    mod = __import__(components[0])
-    for comp in components[1:]:
-        mod = getattr(mod, comp)
-    return mod
-
-def my_import(name):
-    components = name.split('.')
-    mod = __import__(components[0])
-    for comp in components[1:]:
-        mod = getattr(mod, comp)
-    return mod
-
-
 def start():
     try:
         return run()
@@ -71,8 +71,8 @@ def run():
         """ add sub-parsers for each of the services """
         service_parsers = parser.add_subparsers(dest='service', help='Veracode service description')
         readme_parser = service_parsers.add_parser('readme', help='show the detailed readme information')
-        for service_class in Service.services:
-            service_class.add_parser(service_parsers)
+        for service_class in services.load_all().values():
+            service_class().add_parser(service_parsers)
 
         """ parse the command line """
         args = parser.parse_args()
@@ -121,7 +121,7 @@ def run():
             if args.service is None:
                 print("No service specified. Unable to proceed")
                 return 1
-            service = my_import('services.' + args.service + '.' + args.service)
+            service = services.load(args.service)
             instance = service()
             """ execute """
             output = instance.execute(args, config, api, previous_output)